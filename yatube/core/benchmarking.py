@@ -0,0 +1,107 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_init
+from django.test.utils import CaptureQueriesContext
+
+BENCHMARKS_DIR = os.path.join(settings.BASE_DIR, 'benchmarks')
+
+
+def percentile(values, share):
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(share * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Measurement:
+    """Накапливает время, запросы к БД и прочитанные строки
+    за серию одинаковых замеров."""
+
+    def __init__(self):
+        self.latencies = []
+        self.queries = []
+        self.rows = []
+        self.extra = {}
+
+    @contextmanager
+    def measure(self, using='default'):
+        rows = [0]
+
+        def count_rows(**kwargs):
+            rows[0] += 1
+
+        post_init.connect(count_rows, weak=False)
+        try:
+            with CaptureQueriesContext(connections[using]) as queries:
+                start = time.perf_counter()
+                yield
+                self.latencies.append(time.perf_counter() - start)
+        finally:
+            post_init.disconnect(count_rows)
+        self.queries.append(len(queries))
+        self.rows.append(rows[0])
+
+    def summary(self):
+        summary = {
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 3),
+            'p95_ms': round(percentile(self.latencies, 0.95) * 1000, 3),
+            'queries': max(self.queries, default=0),
+            'rows_read': max(self.rows, default=0),
+        }
+        summary.update(self.extra)
+        return summary
+
+
+def benchmark_path(name):
+    return os.path.join(BENCHMARKS_DIR, name)
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(results, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
+
+
+def find_regressions(results, baseline, tolerance, exact=(), skip=(),
+                     metrics=None):
+    """Сравнивает результаты с базовыми.
+
+    Метрики из `exact` не должны расти вовсе, остальные
+    могут вырасти не больше чем на долю `tolerance`. Метрики из `skip`
+    не сравниваются; `metrics`, если задано, ограничивает сравнение.
+    """
+    regressions = []
+    for scale, cases in results.items():
+        for case, values in cases.items():
+            base = baseline.get(scale, {}).get(case)
+            if base is None:
+                continue
+            for metric, value in values.items():
+                expected = base.get(metric)
+                if (
+                    expected is None
+                    or metric in skip
+                    or (metrics is not None and metric not in metrics)
+                ):
+                    continue
+                limit = expected if metric in exact else (
+                    expected * (1 + tolerance)
+                )
+                if value > limit:
+                    regressions.append(
+                        f'{scale}/{case}: {metric} {expected} -> {value}'
+                    )
+    return regressions
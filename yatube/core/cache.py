@@ -0,0 +1,381 @@
+"""Двухуровневый кэш: LRU в памяти процесса поверх общего SQLite-файла.
+
+L1 — ограниченный OrderedDict в памяти процесса, L2 — файл SQLite,
+общий для всех процессов хоста. Каждая запись в L2 добавляет строку
+в журнал инвалидаций; процессы не чаще INVALIDATION_INTERVAL секунд
+читают новые строки журнала и вытесняют эти ключи из своего L1.
+Дополнительно запись живет в L1 не дольше L1_TIMEOUT секунд.
+"""
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core import metrics
+from core.db.pragmas import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache_entry ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE TABLE IF NOT EXISTS cache_invalidation ('
+    ' seq INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' key TEXT NOT NULL, created REAL NOT NULL)',
+)
+STORE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+# Ключ в журнале инвалидаций, означающий полную очистку.
+CLEAR_ALL = '*'
+# Сколько хранить журнал инвалидаций и как часто чистить L2.
+INVALIDATION_RETENTION = 3600
+PRUNE_PROBABILITY = 0.001
+
+
+class SQLiteStore:
+    """Общий для процессов L2 в файле SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        connection = self.connection()
+        for statement in SCHEMA:
+            connection.execute(statement)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, isolation_level=None)
+            apply_pragmas(connection, STORE_PRAGMAS)
+            self.local.connection = connection
+        return connection
+
+    def get_many(self, keys, now):
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection().execute(
+            'SELECT key, value, expires FROM cache_entry '
+            f'WHERE key IN ({placeholders})',
+            list(keys),
+        )
+        return {
+            key: (value, expires) for key, value, expires in rows
+            if expires is None or expires > now
+        }
+
+    def write(self, entries=(), deleted=(), clear=False, only_new=False):
+        """Пишет и удаляет ключи одной транзакцией.
+
+        Возвращает номера добавленных строк журнала инвалидаций
+        и список реально записанных ключей.
+        """
+        connection = self.connection()
+        now = time.time()
+        written = []
+        invalidated = list(deleted)
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if clear:
+                connection.execute('DELETE FROM cache_entry')
+                invalidated = [CLEAR_ALL]
+            for key, value, expires in entries:
+                if only_new and self.get_many([key], now):
+                    continue
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache_entry (key, value, expires) '
+                    'VALUES (?, ?, ?)',
+                    (key, value, expires),
+                )
+                written.append(key)
+                invalidated.append(key)
+            for key in deleted:
+                connection.execute(
+                    'DELETE FROM cache_entry WHERE key = ?', (key,)
+                )
+            seqs = []
+            for key in invalidated:
+                cursor = connection.execute(
+                    'INSERT INTO cache_invalidation (key, created) '
+                    'VALUES (?, ?)',
+                    (key, now),
+                )
+                seqs.append(cursor.lastrowid)
+            if random.random() < PRUNE_PROBABILITY:
+                self.prune(connection, now)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return seqs, written
+
+    def incr(self, key, delta, now):
+        """Атомарно увеличивает числовое значение; None, если ключа нет."""
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            entry = self.get_many([key], now).get(key)
+            if entry is None:
+                connection.execute('COMMIT')
+                return None, None
+            value = pickle.loads(entry[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            cursor = connection.execute(
+                'INSERT INTO cache_invalidation (key, created) VALUES (?, ?)',
+                (key, now),
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return value, cursor.lastrowid
+
+    def touch(self, key, expires, now):
+        cursor = self.connection().execute(
+            'UPDATE cache_entry SET expires = ? '
+            'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (expires, key, now),
+        )
+        return cursor.rowcount > 0
+
+    def last_seq(self):
+        row = self.connection().execute(
+            'SELECT max(seq) FROM cache_invalidation'
+        ).fetchone()
+        return row[0] or 0
+
+    def invalidations_since(self, seq):
+        return self.connection().execute(
+            'SELECT seq, key FROM cache_invalidation WHERE seq > ? '
+            'ORDER BY seq',
+            (seq,),
+        ).fetchall()
+
+    def prune(self, connection, now):
+        connection.execute(
+            'DELETE FROM cache_entry WHERE expires <= ?', (now,)
+        )
+        connection.execute(
+            'DELETE FROM cache_invalidation WHERE created < ?',
+            (now - INVALIDATION_RETENTION,),
+        )
+
+
+class LocalCache:
+    """L1: LRU процесса и состояние чтения журнала инвалидаций."""
+
+    def __init__(self, store, max_entries, max_age, interval):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.interval = interval
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.own_seqs = set()
+        self.last_seq = store.last_seq()
+        self.last_sync = time.monotonic()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, expires, now):
+        l1_expires = now + self.max_age
+        if expires is not None:
+            l1_expires = min(l1_expires, expires)
+        with self.lock:
+            self.entries[key] = (value, l1_expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def remember_own(self, seqs):
+        with self.lock:
+            self.own_seqs.update(seqs)
+
+    def sync(self):
+        """Вытесняет ключи, измененные другими процессами."""
+        now = time.monotonic()
+        if now - self.last_sync < self.interval:
+            return
+        with self.lock:
+            if now - self.last_sync < self.interval:
+                return
+            self.last_sync = now
+            last_seq = self.last_seq
+        rows = self.store.invalidations_since(last_seq)
+        with self.lock:
+            for seq, key in rows:
+                self.last_seq = max(self.last_seq, seq)
+                if seq in self.own_seqs:
+                    self.own_seqs.discard(seq)
+                elif key == CLEAR_ALL:
+                    self.entries.clear()
+                else:
+                    self.entries.pop(key, None)
+
+
+# L1 и L2 общие для всех потоков процесса, ключ — LOCATION.
+_local_caches = {}
+_local_caches_lock = threading.Lock()
+
+
+class TwoTierCache(BaseCache):
+    """Кэш-бэкенд Django. Параметры OPTIONS:
+
+    L1_MAX_ENTRIES — размер LRU в памяти процесса;
+    L1_TIMEOUT — максимальное время жизни записи в L1, сек;
+    INVALIDATION_INTERVAL — как часто читать журнал инвалидаций, сек.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        with _local_caches_lock:
+            local = _local_caches.get(location)
+            if local is None:
+                local = _local_caches[location] = LocalCache(
+                    SQLiteStore(location),
+                    max_entries=options.get('L1_MAX_ENTRIES', 1000),
+                    max_age=options.get('L1_TIMEOUT', 60),
+                    interval=options.get('INVALIDATION_INTERVAL', 0.5),
+                )
+        self._local = local
+        self._store = local.store
+
+    def _count(self, tier, value=1):
+        if value:
+            metrics.inc('yatube_cache_tier_lookups_total', value, tier=tier)
+
+    def _lookup(self, keys):
+        """Ищет ключи сначала в L1, затем одним запросом в L2."""
+        self._local.sync()
+        now = time.time()
+        found = {}
+        for key in keys:
+            value = self._local.get(key, now)
+            if value is not None:
+                found[key] = value
+        self._count('l1_hit', len(found))
+        missing = [key for key in keys if key not in found]
+        from_store = self._store.get_many(missing, now)
+        for key, (value, expires) in from_store.items():
+            self._local.set(key, value, expires, now)
+            found[key] = value
+        self._count('l2_hit', len(from_store))
+        self._count('miss', len(missing) - len(from_store))
+        return found
+
+    def _write(self, entries=(), deleted=(), clear=False, only_new=False):
+        seqs, written = self._store.write(entries, deleted, clear, only_new)
+        self._local.remember_own(seqs)
+        if clear:
+            self._local.discard(list(self._local.entries))
+        self._local.discard(deleted)
+        now = time.time()
+        written = set(written)
+        for key, value, expires in entries:
+            if key in written:
+                self._local.set(key, value, expires, now)
+        return written
+
+    def _entry(self, key, value, timeout, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return (
+            key,
+            pickle.dumps(value, self.pickle_protocol),
+            self.get_backend_timeout(timeout),
+        )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self._lookup([key]).get(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        found = self._lookup(list(made))
+        return {made[key]: pickle.loads(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([self._entry(key, value, timeout, version)])
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        entry = self._entry(key, value, timeout, version)
+        return bool(self._write([entry], only_new=True))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([
+            self._entry(key, value, timeout, version)
+            for key, value in data.items()
+        ])
+        return []
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(deleted=[key])
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        self._write(deleted=made)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._local.discard([key])
+        return self._store.touch(
+            key, self.get_backend_timeout(timeout), time.time()
+        )
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value, seq = self._store.incr(key, delta, time.time())
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        self._local.remember_own([seq])
+        self._local.discard([key])
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self._lookup([key])
+
+    def clear(self):
+        self._write(clear=True)
+
+    def stats(self):
+        """Размер L1 процесса; счетчики попаданий — в core.metrics."""
+        return {'l1_entries': len(self._local.entries)}
@@ -0,0 +1,40 @@
+"""SQLite с PRAGMA для каждого соединения и режимом транзакций.
+
+В OPTIONS дополнительно к параметрам sqlite3.connect() принимаются:
+  pragmas — словарь PRAGMA, выполняемых при каждом подключении;
+  transaction_mode — DEFERRED, IMMEDIATE или EXCLUSIVE для BEGIN,
+  с которого начинается atomic(). IMMEDIATE сразу берет блокировку
+  на запись, и ожидание укладывается в busy_timeout, а не падает
+  с "database is locked" при попытке повысить блокировку.
+"""
+from django.db.backends.sqlite3 import base
+
+from core.db.pragmas import apply_pragmas
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        if (
+            self.transaction_mode is not None
+            and self.transaction_mode.upper() not in TRANSACTION_MODES
+        ):
+            raise ValueError(
+                f'Недопустимый transaction_mode: {self.transaction_mode}'
+            )
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+            return
+        self.cursor().execute(f'BEGIN {self.transaction_mode.upper()}')
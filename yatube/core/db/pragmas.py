@@ -0,0 +1,11 @@
+import re
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA из словаря {имя: значение} на соединении sqlite3."""
+    for name, value in pragmas.items():
+        if not PRAGMA_NAME.match(name):
+            raise ValueError(f'Недопустимое имя PRAGMA: {name}')
+        connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,62 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+
+class RoutingState:
+    """Куда читать в рамках текущего запроса."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+# Вне запроса (команды, shell) состояние не задано и все идет в default.
+_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+def start_request(pinned):
+    state = RoutingState(pinned)
+    return state, _state.set(state)
+
+
+def finish_request(token):
+    _state.reset(token)
+
+
+class ReplicaRouter:
+    """Читает модели из REPLICA_ROUTED_APPS с реплик DATABASE_REPLICAS.
+
+    Запись всегда идет в default. После первой записи запрос
+    до конца читает из default, а PrimaryPinMiddleware закрепляет
+    за пользователем default еще на REPLICA_PIN_SECONDS.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (
+            state is None
+            or state.pinned
+            or not settings.DATABASE_REPLICAS
+            or model._meta.app_label not in settings.REPLICA_ROUTED_APPS
+        ):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
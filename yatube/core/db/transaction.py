@@ -0,0 +1,50 @@
+import functools
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked_error(error):
+    return any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def retry_on_locked(func):
+    """Повторяет вызов, если SQLite не дождался блокировки на запись.
+
+    Число попыток и начальная пауза задаются SQLITE_LOCK_RETRIES и
+    SQLITE_LOCK_RETRY_DELAY, пауза удваивается с каждой попыткой.
+    Подходит только для кода, который до ошибки ничего не успел
+    записать, например для транзакции целиком.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        delay = settings.SQLITE_LOCK_RETRY_DELAY
+        for attempt in range(settings.SQLITE_LOCK_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if (
+                    not is_locked_error(error)
+                    or attempt == settings.SQLITE_LOCK_RETRIES
+                ):
+                    raise
+            time.sleep(delay)
+            delay *= 2
+    return wrapper
+
+
+@contextmanager
+def atomic_on(*aliases):
+    """Транзакция на каждой из баз aliases (повторы пропускаются).
+
+    Нужна, когда строка пишется в шард, а сигналы ее сохранения — в
+    основную базу: повтор после блокировки должен откатить обе части.
+    """
+    with ExitStack() as stack:
+        for alias in dict.fromkeys(aliases):
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
@@ -0,0 +1,144 @@
+"""Сбор времени и счетчиков в рамках одного запроса.
+
+Статистика текущего запроса хранится в contextvar, поэтому замеры
+из разных потоков не смешиваются. install() оборачивает разбор URL,
+рендеринг шаблонов и методы кэша, чтобы они попадали в статистику.
+"""
+import contextvars
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.backends.django import Template
+from django.urls.resolvers import URLResolver
+from django.utils.module_loading import import_string
+
+CACHE_READ_METHODS = ('get', 'get_many')
+CACHE_WRITE_METHODS = (
+    'set', 'add', 'set_many', 'delete', 'delete_many', 'incr', 'decr',
+)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    """Длительности (в секундах) и счетчики одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_name = None
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.active = set()
+
+    def add(self, metric, duration, count=1):
+        self.durations[metric] += duration
+        self.counts[metric] += count
+
+    def incr(self, counter, value=1):
+        self.counts[counter] += value
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        parts = []
+        for metric, duration in self.durations.items():
+            part = f'{metric};dur={duration * 1000:.2f}'
+            if metric in ('db', 'cache'):
+                part += f';desc="{self.counts[metric]} calls"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+def start():
+    """Начинает сбор статистики, возвращает ее и токен для finish()."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timer(metric):
+    """Добавляет время выполнения блока к метрике текущего запроса.
+
+    Вложенные замеры одной метрики не суммируются повторно.
+    """
+    stats = _current.get()
+    if stats is None or metric in stats.active:
+        yield
+        return
+    stats.active.add(metric)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.active.discard(metric)
+        stats.add(metric, time.perf_counter() - started)
+
+
+def timed(metric):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(metric):
+                return func(*args, **kwargs)
+        wrapper.instrumented = True
+        return wrapper
+    return decorator
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """Обертка для connection.execute_wrapper()."""
+    with timer('db'):
+        return execute(sql, params, many, context)
+
+
+def count_cache_read(stats, method, args, kwargs, result):
+    if method == 'get_many':
+        keys = args[0] if args else kwargs['keys']
+        hits = len(result)
+        misses = len(keys) - hits
+    else:
+        default = args[1] if len(args) > 1 else kwargs.get('default')
+        hits = int(result is not default)
+        misses = 1 - hits
+    stats.incr('cache_hits', hits)
+    stats.incr('cache_misses', misses)
+
+
+def instrument_cache_method(cls, name):
+    method = getattr(cls, name)
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None or 'cache' in stats.active:
+            return method(self, *args, **kwargs)
+        with timer('cache'):
+            result = method(self, *args, **kwargs)
+        if name in CACHE_READ_METHODS:
+            count_cache_read(stats, name, args, kwargs, result)
+        return result
+    wrapper.instrumented = True
+    setattr(cls, name, wrapper)
+
+
+def install():
+    """Однократно подключает замеры к Django. Повторный вызов безопасен."""
+    if getattr(URLResolver.resolve, 'instrumented', False):
+        return
+    URLResolver.resolve = timed('resolve')(URLResolver.resolve)
+    Template.render = timed('template')(Template.render)
+    for config in settings.CACHES.values():
+        cls = import_string(config['BACKEND'])
+        for name in CACHE_READ_METHODS + CACHE_WRITE_METHODS:
+            if not getattr(getattr(cls, name), 'instrumented', False):
+                instrument_cache_method(cls, name)
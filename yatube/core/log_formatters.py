@@ -0,0 +1,22 @@
+import json
+import logging
+
+# Атрибуты, которые есть у любой записи лога.
+STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Пишет запись лога одной JSON-строкой вместе с полями из extra."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        data.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in STANDARD_ATTRS
+        )
+        return json.dumps(data, ensure_ascii=False, default=str)
@@ -0,0 +1,146 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmarking import benchmark_path, save_results
+from core.db.pragmas import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' text TEXT NOT NULL,'
+    ' pub_date REAL NOT NULL,'
+    ' author_id INTEGER NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE INDEX post_author ON post (author_id)',
+)
+FEED_QUERY = (
+    'SELECT id, text, author_id FROM post '
+    'ORDER BY pub_date DESC LIMIT 10 OFFSET ?'
+)
+
+PROFILES = {
+    'before': {'pragmas': {}, 'begin': 'BEGIN'},
+    'after': {'pragmas': settings.SQLITE_PRAGMAS, 'begin': 'BEGIN IMMEDIATE'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность читателей и писателей SQLite '
+        'с настройками по умолчанию и с SQLITE_PRAGMAS и BEGIN IMMEDIATE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--output', default=benchmark_path('sqlite_concurrency.json')
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.populate(path, options['rows'])
+                results[name] = self.run_profile(path, profile, options)
+            self.stdout.write(f'{name}: {results[name]}')
+        save_results(options['output'], results)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def connect(self, path, pragmas):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, pragmas)
+        return connection
+
+    def populate(self, path, rows):
+        connection = sqlite3.connect(path, isolation_level=None)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        rng = random.Random(0)
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (text, pub_date, author_id) VALUES (?, ?, ?)',
+            (
+                ('x' * rng.randint(50, 1000), num, rng.randint(1, 500))
+                for num in range(rows)
+            ),
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] += 1
+
+    def reader(self, path, profile, seed):
+        rng = random.Random(seed)
+        connection = self.connect(path, profile['pragmas'])
+        while time.monotonic() < self.deadline:
+            try:
+                connection.execute(
+                    FEED_QUERY, (rng.randint(0, 1000),)
+                ).fetchall()
+                self.count('reads')
+            except sqlite3.OperationalError:
+                self.count('errors')
+        connection.close()
+
+    def writer(self, path, profile, seed):
+        """Транзакция чтение-запись, как у get_or_create."""
+        rng = random.Random(seed)
+        connection = self.connect(path, profile['pragmas'])
+        while time.monotonic() < self.deadline:
+            author_id = rng.randint(1, 500)
+            try:
+                connection.execute(profile['begin'])
+                connection.execute(
+                    'SELECT count(*) FROM post WHERE author_id = ?',
+                    (author_id,),
+                ).fetchone()
+                connection.execute(
+                    'INSERT INTO post (text, pub_date, author_id) '
+                    'VALUES (?, ?, ?)',
+                    ('y' * 200, time.time(), author_id),
+                )
+                connection.execute('COMMIT')
+                self.count('writes')
+            except sqlite3.OperationalError:
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+                self.count('errors')
+        connection.close()
+
+    def run_profile(self, path, profile, options):
+        self.deadline = time.monotonic() + options['seconds']
+        self.counters = {'reads': 0, 'writes': 0, 'errors': 0}
+        self.lock = threading.Lock()
+        threads = [
+            threading.Thread(target=self.reader, args=(path, profile, num))
+            for num in range(options['readers'])
+        ] + [
+            threading.Thread(
+                target=self.writer, args=(path, profile, 1000 + num)
+            )
+            for num in range(options['writers'])
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        return {
+            'reads_per_s': round(self.counters['reads'] / elapsed, 1),
+            'writes_per_s': round(self.counters['writes'] / elapsed, 1),
+            'errors': self.counters['errors'],
+        }
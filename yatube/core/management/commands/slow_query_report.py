@@ -0,0 +1,72 @@
+import glob
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import fingerprint
+
+
+class Command(BaseCommand):
+    help = (
+        'Сводка журнала медленных запросов, сгруппированная '
+        'по нормализованному SQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log',
+            default=os.path.join(settings.LOGS_DIR, 'slow_queries.log'),
+            help='Путь к журналу; ротированные копии читаются тоже.'
+        )
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--order-by', choices=('total', 'count', 'max'), default='total'
+        )
+
+    def handle(self, *args, **options):
+        groups = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0,
+            'views': Counter(), 'origins': Counter(), 'plan': None,
+        })
+        for record in self.read_records(options['log']):
+            group = groups[fingerprint(record['sql'])]
+            duration = record['duration_ms']
+            group['count'] += 1
+            group['total'] += duration
+            group['max'] = max(group['max'], duration)
+            group['views'][record.get('view_name')] += 1
+            group['origins'][record.get('origin')] += 1
+            group['plan'] = record.get('plan') or group['plan']
+
+        ordered = sorted(
+            groups.items(),
+            key=lambda item: item[1][options['order_by']],
+            reverse=True,
+        )
+        for sql, group in ordered[:options['limit']]:
+            self.stdout.write(
+                f'{group["count"]} раз, всего {group["total"]:.1f} мс, '
+                f'среднее {group["total"] / group["count"]:.1f} мс, '
+                f'максимум {group["max"]:.1f} мс'
+            )
+            self.stdout.write(f'  {sql}')
+            view, _ = group['views'].most_common(1)[0]
+            origin, _ = group['origins'].most_common(1)[0]
+            self.stdout.write(f'  view: {view}, источник: {origin}')
+            for line in group['plan'] or ():
+                self.stdout.write(f'    {line}')
+
+    def read_records(self, path):
+        paths = sorted(glob.glob(f'{glob.escape(path)}.*'), reverse=True)
+        if os.path.exists(path):
+            paths.append(path)
+        for log_path in paths:
+            with open(log_path, encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
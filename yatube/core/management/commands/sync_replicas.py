@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в локальные реплики '
+        'из DATABASE_REPLICAS через backup API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять синхронизацию каждые N секунд.'
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Страниц за шаг копирования; между шагами писатели '
+                 'основной базы не блокируются.'
+        )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        replicas = [
+            settings.DATABASES[alias] for alias in settings.DATABASE_REPLICAS
+        ]
+        for config in [primary] + replicas:
+            if not config['ENGINE'].endswith('sqlite3'):
+                raise CommandError(
+                    'sync_replicas работает только с SQLite; реплики других '
+                    'СУБД синхронизируются средствами самой СУБД.'
+                )
+        while True:
+            for replica in replicas:
+                self.sync(primary['NAME'], replica['NAME'], options['pages'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, source_path, target_path, pages):
+        started = time.perf_counter()
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target, pages=pages)
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(
+            f'{target_path}: {time.perf_counter() - started:.2f} с'
+        )
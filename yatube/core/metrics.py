@@ -0,0 +1,232 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс копит счетчики и гистограммы в памяти и периодически
+сбрасывает снимок в свой файл в METRICS_DIR. Эндпоинт /metrics
+складывает снимки всех процессов хоста, поэтому значения корректно
+суммируются между воркерами. Файлы завершившихся процессов остаются,
+чтобы счетчики не уменьшались. Процесс, созданный fork (gunicorn
+--preload), начинает с пустых метрик и пишет в свой файл.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+HELP = {
+    'yatube_requests_total': ('counter', 'Обработанные запросы.'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса.'
+    ),
+    'yatube_db_queries_total': ('counter', 'Запросы к БД.'),
+    'yatube_db_duration_seconds_total': (
+        'counter', 'Суммарное время запросов к БД.'
+    ),
+    'yatube_cache_hits_total': ('counter', 'Попадания в кэш.'),
+    'yatube_cache_misses_total': ('counter', 'Промахи кэша.'),
+    'yatube_cache_tier_lookups_total': (
+        'counter', 'Обращения к уровням двухуровневого кэша.'
+    ),
+    'yatube_thumbnail_duration_seconds': (
+        'histogram', 'Время генерации миниатюр.'
+    ),
+    'yatube_queue_depth': ('gauge', 'Длина очередей фоновой обработки.'),
+    'yatube_rate_limited_total': (
+        'counter', 'Запросы, отклоненные ограничением частоты.'
+    ),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+_gauges = {}
+_last_flush = 0.0
+
+
+def _new_snapshot_name():
+    return f'metrics-{os.getpid()}-{int(time.time())}.json'
+
+
+_snapshot_name = _new_snapshot_name()
+
+
+def _after_fork():
+    # Снимок родителя уже лежит в его файле: потомок начинает с нуля.
+    global _lock, _last_flush, _snapshot_name
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+    _last_flush = 0.0
+    _snapshot_name = _new_snapshot_name()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(
+        (label, str(value)) for label, value in labels.items()
+    ))
+
+
+def inc(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Добавляет наблюдение в гистограмму."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                'buckets': list(buckets),
+                'counts': [0] * len(buckets),
+                'sum': 0.0,
+                'count': 0,
+            }
+        for index, bound in enumerate(histogram['buckets']):
+            if value <= bound:
+                histogram['counts'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def register_gauge(name, func, **labels):
+    """Регистрирует функцию, значение которой читается при сборе метрик.
+
+    Gauge вычисляется в процессе, обслуживающем /metrics, и не
+    суммируется между процессами.
+    """
+    _gauges[_key(name, labels)] = func
+
+
+def observe_request(stats, method, status):
+    """Записывает итоги запроса из core.instrumentation.RequestStats."""
+    view = stats.view_name or 'unresolved'
+    inc('yatube_requests_total', view=view, method=method, status=status)
+    observe(
+        'yatube_request_duration_seconds',
+        stats.durations.get('total', 0.0),
+        view=view,
+    )
+    inc('yatube_db_queries_total', stats.counts.get('db', 0), view=view)
+    inc(
+        'yatube_db_duration_seconds_total',
+        stats.durations.get('db', 0.0),
+        view=view,
+    )
+    inc('yatube_cache_hits_total', stats.counts.get('cache_hits', 0),
+        view=view)
+    inc('yatube_cache_misses_total', stats.counts.get('cache_misses', 0),
+        view=view)
+    flush()
+
+
+def _snapshot():
+    with _lock:
+        return {
+            'counters': [
+                [name, list(labels), value]
+                for (name, labels), value in _counters.items()
+            ],
+            'histograms': [
+                [name, list(labels), histogram]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+
+
+def flush(force=False):
+    """Сбрасывает снимок процесса на диск не чаще METRICS_FLUSH_INTERVAL."""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = os.path.join(settings.METRICS_DIR, _snapshot_name)
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(_snapshot(), file)
+    os.replace(temp_path, path)
+
+
+def collect():
+    """Суммирует снимки всех процессов."""
+    flush(force=True)
+    counters = defaultdict(float)
+    histograms = {}
+    pattern = os.path.join(settings.METRICS_DIR, 'metrics-*.json')
+    for path in glob.glob(pattern):
+        try:
+            with open(path, encoding='utf-8') as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in snapshot['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, histogram in snapshot['histograms']:
+            key = name, tuple(map(tuple, labels))
+            total = histograms.setdefault(key, {
+                'buckets': histogram['buckets'],
+                'counts': [0] * len(histogram['buckets']),
+                'sum': 0.0,
+                'count': 0,
+            })
+            for index, count in enumerate(histogram['counts']):
+                total['counts'][index] += count
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    gauges = {key: func() for key, func in list(_gauges.items())}
+    return counters, histograms, gauges
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def render():
+    """Все метрики в текстовом формате Prometheus 0.0.4."""
+    counters, histograms, gauges = collect()
+    series = defaultdict(list)
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), value in sorted(gauges.items()):
+        series[name].append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), histogram in sorted(histograms.items()):
+        lines = series[name]
+        for bound, count in zip(histogram['buckets'], histogram['counts']):
+            lines.append(
+                f'{name}_bucket{_format_labels(labels, le=bound)} {count}'
+            )
+        lines.append(
+            f'{name}_bucket{_format_labels(labels, le="+Inf")} '
+            f'{histogram["count"]}'
+        )
+        lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+        lines.append(
+            f'{name}_count{_format_labels(labels)} {histogram["count"]}'
+        )
+    output = []
+    for name in sorted(series):
+        metric_type, description = HELP.get(name, ('untyped', ''))
+        output.append(f'# HELP {name} {description}')
+        output.append(f'# TYPE {name} {metric_type}')
+        output.extend(series[name])
+    return '\n'.join(output) + '\n'
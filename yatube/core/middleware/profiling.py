@@ -0,0 +1,59 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import time
+
+from django.conf import settings
+
+
+class ProfilingMiddleware:
+    """Профилирует отдельный запрос через cProfile.
+
+    Запрос профилируется, если сотрудник передал заголовок
+    PROFILING_HEADER или параметр PROFILING_QUERY_PARAM, либо случайно
+    с вероятностью PROFILING_SAMPLE_RATE. Результат сохраняется
+    в PROFILING_DIR/<имя view>/ в виде .prof и текстовой сводки.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = settings.PROFILING_HEADER
+        self.query_param = settings.PROFILING_QUERY_PARAM
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.directory = settings.PROFILING_DIR
+        self.top_n = settings.PROFILING_TOP_N
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        self.save(request, profiler)
+        return response
+
+    def should_profile(self, request):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        requested = (
+            self.header in request.META
+            or self.query_param in request.GET
+        )
+        return requested and request.user.is_staff
+
+    def save(self, request, profiler):
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        directory = os.path.join(self.directory, view_name.replace(':', '.'))
+        os.makedirs(directory, exist_ok=True)
+        name = f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{id(request)}'
+        path = os.path.join(directory, name)
+        profiler.dump_stats(f'{path}.prof')
+
+        summary = io.StringIO()
+        summary.write(f'{request.method} {request.get_full_path()}\n')
+        stats = pstats.Stats(profiler, stream=summary)
+        stats.strip_dirs().sort_stats('cumulative').print_stats(self.top_n)
+        with open(f'{path}.txt', 'w', encoding='utf-8') as file:
+            file.write(summary.getvalue())
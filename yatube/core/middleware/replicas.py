@@ -0,0 +1,35 @@
+from django.conf import settings
+
+from core.db import routers
+
+
+class PrimaryPinMiddleware:
+    """Обеспечивает чтение собственных записей при работе с репликами.
+
+    Небезопасные методы и запросы с cookie REPLICA_PIN_COOKIE читают
+    из default. Если запрос что-то записал, cookie ставится
+    на REPLICA_PIN_SECONDS, пока реплики не догонят основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        state, token = routers.start_request(pinned)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.finish_request(token)
+        if state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
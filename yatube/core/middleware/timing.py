@@ -0,0 +1,69 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import instrumentation, metrics
+
+logger = logging.getLogger('yatube.timing')
+
+
+class ServerTimingMiddleware:
+    """Замеряет разбор URL, view, запросы к БД, шаблоны и кэш.
+
+    Итоги отдаются в заголовке Server-Timing, пишутся в лог
+    yatube.timing с именем view и, если METRICS_ENABLED, попадают
+    в метрики core.metrics. Middleware должна стоять первой,
+    чтобы total охватывал весь запрос.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrumentation.install()
+
+    def __call__(self, request):
+        stats, token = instrumentation.start()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(
+                        instrumentation.db_execute_wrapper
+                    ))
+                response = self.get_response(request)
+        finally:
+            instrumentation.finish(token)
+        finished = time.perf_counter()
+        if hasattr(request, 'view_started'):
+            stats.add('view', finished - request.view_started)
+        stats.add('total', finished - stats.started)
+        response['Server-Timing'] = stats.server_timing()
+        self.log(request, response, stats)
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(
+                stats, request.method, response.status_code
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_started = time.perf_counter()
+        stats = instrumentation.current()
+        if stats is not None:
+            stats.view_name = request.resolver_match.view_name
+
+    def log(self, request, response, stats):
+        logger.info(
+            '%s %s %s',
+            stats.view_name, request.method, response.status_code,
+            extra={
+                'view_name': stats.view_name,
+                'method': request.method,
+                'status': response.status_code,
+                'timings_ms': {
+                    metric: round(duration * 1000, 3)
+                    for metric, duration in stats.durations.items()
+                },
+                'counts': dict(stats.counts),
+            },
+        )
@@ -0,0 +1,125 @@
+"""Ограничение частоты запросов корзиной токенов в общем кэше.
+
+Корзина хранится как GCRA: в кэше лежит "теоретическое время прибытия"
+(TAT) в миллисекундах. Каждый запрос атомарно сдвигает его на интервал
+между токенами через cache.incr; если TAT ушел вперед больше, чем
+на емкость корзины, запрос отклоняется и сдвиг откатывается. Это та же
+корзина токенов, но за одно атомарное обращение к кэшу и без БД.
+Если у view несколько корзин (пользователь, IP) и одна отклоняет запрос,
+токены, уже взятые из остальных, возвращаются: отклоненный запрос
+не расходует лимит.
+
+Лимиты задаются в RATE_LIMITS по имени view:
+    {'post_create': {'user': '10/m', 'ip': '30/m'}}
+'N/период' — емкость корзины и скорость пополнения, период — s, m, h, d.
+"""
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.shortcuts import render
+
+from core import metrics
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take(key, rate, now=None):
+    """Берет токен из корзины key; возвращает 0 или сколько секунд
+    ждать до следующего токена."""
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    capacity, period = parse_rate(rate)
+    interval = period * 1000 // capacity
+    tolerance = interval * capacity
+    # TAT не уходит дальше now + period, поэтому ключ, не тронутый
+    # два периода, описывает полную корзину и может истечь.
+    timeout = period * 2
+    now = int((time.time() if now is None else now) * 1000)
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:
+        # Корзины нет или ключ истек: корзина полная.
+        if cache.add(key, now + interval, timeout):
+            return 0
+        tat = cache.incr(key, interval)
+    if tat <= now + interval:
+        # Корзина простаивала и полна: не копим токены сверх емкости.
+        cache.set(key, now + interval, timeout)
+        return 0
+    if tat - now > tolerance:
+        cache.decr(key, interval)
+        wait = (tat - now - tolerance) / 1000
+    else:
+        wait = 0
+    # incr не продлевает ключ, а истечь раньше TAT он не должен.
+    cache.touch(key, timeout)
+    return wait
+
+
+def refund(key, rate):
+    """Возвращает в корзину key токен, взятый take."""
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    capacity, period = parse_rate(rate)
+    try:
+        cache.decr(key, period * 1000 // capacity)
+    except ValueError:
+        # Ключ истек: корзина и так полная.
+        pass
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def check(request, name):
+    """Проверяет все корзины view; возвращает время ожидания или 0."""
+    limits = settings.RATE_LIMITS.get(name, {})
+    identities = {'ip': client_ip(request)}
+    if request.user.is_authenticated:
+        identities['user'] = request.user.pk
+    taken = []
+    for scope, rate in limits.items():
+        if scope not in identities:
+            continue
+        key = f'ratelimit:{name}:{scope}:{identities[scope]}'
+        wait = take(key, rate)
+        if wait:
+            metrics.inc('yatube_rate_limited_total', view=name, scope=scope)
+            for taken_key, taken_rate in taken:
+                refund(taken_key, taken_rate)
+            return wait
+        taken.append((key, rate))
+    return 0
+
+
+def too_many_requests(request, wait):
+    response = render(
+        request, 'core/429.html', {'retry_after': wait}, status=429
+    )
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def rate_limit(name, methods=('POST',)):
+    """Ограничивает запросы к view по лимитам RATE_LIMITS[name].
+
+    GET форм не ограничивается: лимитируется только отправка.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATE_LIMIT_ENABLED and request.method in methods:
+                wait = check(request, name)
+                if wait:
+                    return too_many_requests(request, math.ceil(wait))
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
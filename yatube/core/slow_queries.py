@@ -0,0 +1,99 @@
+"""Журнал медленных SQL-запросов.
+
+Обертка execute_wrapper ставится на каждое новое соединение с БД
+и пишет в лог yatube.slow_queries запросы дольше
+SLOW_QUERY_THRESHOLD_MS вместе с планом выполнения.
+"""
+import contextvars
+import logging
+import os
+import re
+import time
+import traceback
+
+from django.conf import settings
+from django.db import DatabaseError, NotSupportedError
+
+from core import instrumentation
+
+logger = logging.getLogger('yatube.slow_queries')
+
+_explaining = contextvars.ContextVar('explaining_query', default=False)
+
+# Файлы, которые не считаются источником запроса.
+IGNORED_FILES = (__file__, instrumentation.__file__)
+
+FINGERPRINT_RULES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE), 'IN (...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def fingerprint(sql):
+    """Нормализует SQL: литералы и параметры заменяются на ?."""
+    for pattern, replacement in FINGERPRINT_RULES:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def query_origin():
+    """Ближайший к запросу кадр стека из кода проекта."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if (
+            filename.startswith(settings.BASE_DIR)
+            and filename not in IGNORED_FILES
+        ):
+            path = os.path.relpath(filename, settings.BASE_DIR)
+            return f'{path}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    token = _explaining.set(True)
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+    except (DatabaseError, NotSupportedError):
+        return None
+    finally:
+        _explaining.reset(token)
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS:
+        stats = instrumentation.current()
+        plan = None
+        if settings.SLOW_QUERY_EXPLAIN and not many:
+            plan = explain(context['connection'], sql, params)
+        logger.warning(
+            'slow query %.1f ms', duration_ms,
+            extra={
+                'duration_ms': round(duration_ms, 3),
+                'sql': sql,
+                'params': None if many else params,
+                'database': context['connection'].alias,
+                'view_name': stats.view_name if stats else None,
+                'origin': query_origin(),
+                'plan': plan,
+            },
+        )
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_query_wrapper)
@@ -0,0 +1,23 @@
+from django.test import SimpleTestCase
+
+from core.benchmarking import find_regressions
+
+BASELINE = {'1000': {'index': {'p50_ms': 10, 'queries': 5}}}
+RESULTS = {'1000': {'index': {'p50_ms': 20, 'queries': 7}}}
+
+
+class FindRegressionsTests(SimpleTestCase):
+    def test_skip_and_metrics_split_checks(self):
+        """skip убирает метрики из проверки, metrics оставляет только
+        перечисленные."""
+        self.assertEqual(
+            find_regressions(
+                RESULTS, BASELINE, 0.25, exact=('queries',),
+                skip=('p50_ms',),
+            ),
+            ['1000/index: queries 5 -> 7'],
+        )
+        self.assertEqual(
+            find_regressions(RESULTS, BASELINE, 0.25, metrics=('p50_ms',)),
+            ['1000/index: p50_ms 10 -> 20'],
+        )
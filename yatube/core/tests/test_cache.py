@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .. import cache as two_tier
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.process_cache()
+
+    def process_cache(self):
+        """Кэш так, как его видит отдельный процесс: со своим L1."""
+        with mock.patch.object(two_tier, '_local_caches', {}):
+            return two_tier.TwoTierCache(
+                self.location,
+                {'OPTIONS': {'INVALIDATION_INTERVAL': 0, 'L1_MAX_ENTRIES': 3}},
+            )
+
+    def count_tiers(self, func):
+        with mock.patch.object(two_tier.metrics, 'inc') as inc:
+            func()
+        counts = {}
+        for call in inc.call_args_list:
+            tier = call[1]['tier']
+            counts[tier] = counts.get(tier, 0) + call[0][1]
+        return counts
+
+    def test_get_set_delete(self):
+        """Базовые операции работают как у любого кэш-бэкенда."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertTrue(self.cache.add('other', 2))
+        self.assertEqual(self.cache.incr('other', 3), 5)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get_many(['key', 'other']), {'other': 5})
+
+    def test_tiers_are_counted(self):
+        """Повторное чтение попадает в L1, чужой процесс читает из L2."""
+        self.cache.set('key', 'value')
+        self.assertEqual(
+            self.count_tiers(lambda: self.cache.get('key')), {'l1_hit': 1}
+        )
+        other = self.process_cache()
+        self.assertEqual(
+            self.count_tiers(lambda: other.get('key')), {'l2_hit': 1}
+        )
+        self.assertEqual(
+            self.count_tiers(lambda: other.get('missing')), {'miss': 1}
+        )
+
+    def test_other_process_write_invalidates_l1(self):
+        """Запись в другом процессе вытесняет ключ из L1."""
+        self.cache.set('key', 'old')
+        self.assertEqual(self.cache.get('key'), 'old')
+        other = self.process_cache()
+        other.set('key', 'new')
+        self.assertEqual(self.cache.get('key'), 'new')
+        other.clear()
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_l1_is_bounded(self):
+        """L1 хранит не больше L1_MAX_ENTRIES записей."""
+        for num in range(10):
+            self.cache.set(f'key{num}', num)
+        self.assertEqual(self.cache.stats()['l1_entries'], 3)
+        self.assertEqual(self.cache.get('key0'), 0)
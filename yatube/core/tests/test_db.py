@@ -0,0 +1,43 @@
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..db.transaction import retry_on_locked
+
+
+class SQLiteBackendTests(TransactionTestCase):
+    def test_atomic_begins_immediate_transaction(self):
+        """atomic() начинается с BEGIN IMMEDIATE."""
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                connection.cursor().execute('SELECT 1')
+        self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+
+
+class RetryOnLockedTests(TestCase):
+    def test_retries_locked_database(self):
+        """Вызов повторяется, пока база заблокирована."""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Прочие ошибки БД пробрасываются сразу."""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            raise OperationalError('no such table: posts_post')
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR)
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_metrics_contain_view_series(self):
+        """/metrics отдает счетчики и гистограммы по имени view."""
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn('# TYPE yatube_requests_total counter', content)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"}',
+            content,
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', content)
+
+    def test_metrics_are_summed_across_processes(self):
+        """Снимки других процессов суммируются со своими."""
+        snapshot = {
+            'counters': [[
+                'yatube_requests_total',
+                [['method', 'GET'], ['status', '200'], ['view', 'other']],
+                5,
+            ]],
+            'histograms': [],
+        }
+        path = os.path.join(TEMP_METRICS_DIR, 'metrics-1-1.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(snapshot, file)
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertIn(
+            'yatube_requests_total{method="GET",status="200",'
+            'view="other"} 5.0',
+            response.content.decode(),
+        )
+
+    def test_forked_workers_keep_own_snapshots(self):
+        """Процесс после fork пишет снимок в свой файл и не повторяет
+        счетчики родителя."""
+        metrics.inc('yatube_test_total', view='parent')
+        metrics.flush(force=True)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                metrics.inc('yatube_test_total', view='child')
+                metrics.flush(force=True)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        content = self.guest_client.get(reverse('metrics')).content.decode()
+        self.assertIn('yatube_test_total{view="parent"} 1.0', content)
+        self.assertIn('yatube_test_total{view="child"} 1.0', content)
+
+    def test_metrics_forbidden_for_other_hosts(self):
+        """Посторонним адресам /metrics недоступен."""
+        response = self.guest_client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+        )
+        self.assertEqual(response.status_code, 403)
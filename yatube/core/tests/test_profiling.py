@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR)
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='HasNoName')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def setUp(self):
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+        self.profile_dir = os.path.join(TEMP_PROFILING_DIR, 'posts.index')
+
+    def test_staff_request_is_profiled(self):
+        """Запрос сотрудника с параметром профилирования сохраняет
+        .prof и текстовую сводку в каталог view."""
+        client = Client()
+        client.force_login(self.staff)
+        response = client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertEqual(response.status_code, 200)
+        extensions = sorted(
+            os.path.splitext(name)[1]
+            for name in os.listdir(self.profile_dir)
+        )
+        self.assertEqual(extensions, ['.prof', '.txt'])
+
+    def test_non_staff_request_is_not_profiled(self):
+        """Параметр профилирования от обычного пользователя
+        игнорируется."""
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:index'), HTTP_X_PROFILE='1')
+        self.assertFalse(os.path.exists(self.profile_dir))
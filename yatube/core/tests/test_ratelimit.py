@@ -0,0 +1,81 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+from ..ratelimit import take
+
+User = get_user_model()
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_burst_then_refill(self):
+        """Корзина отдает емкость сразу, затем по токену за интервал."""
+        for _ in range(3):
+            self.assertEqual(take('bucket', '3/m', now=1000), 0)
+        self.assertEqual(take('bucket', '3/m', now=1000), 20)
+        self.assertEqual(take('bucket', '3/m', now=1010), 10)
+        self.assertEqual(take('bucket', '3/m', now=1020), 0)
+        self.assertEqual(take('bucket', '3/m', now=1020), 20)
+
+    def test_idle_bucket_does_not_overfill(self):
+        """Простой не копит токенов больше емкости."""
+        take('bucket', '2/m', now=1000)
+        for _ in range(2):
+            self.assertEqual(take('bucket', '2/m', now=5000), 0)
+        self.assertGreater(take('bucket', '2/m', now=5000), 0)
+
+
+@override_settings(RATE_LIMITS={'add_comment': {'user': '2/h'}})
+class RateLimitViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_limit_returns_429(self):
+        """Сверх лимита комментарий не создается, ответ 429."""
+        url = reverse('posts:add_comment', args=(self.post.id,))
+        for _ in range(2):
+            response = self.client.post(url, {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, 302)
+        response = self.client.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1800')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_other_user_has_own_bucket(self):
+        """Лимит пользователя не касается других пользователей."""
+        url = reverse('posts:add_comment', args=(self.post.id,))
+        for _ in range(3):
+            self.client.post(url, {'text': 'Комментарий'})
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        response = other.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(
+        RATE_LIMITS={'add_comment': {'ip': '2/h', 'user': '1/h'}}
+    )
+    def test_rejected_request_keeps_other_buckets(self):
+        """Запрос, отклоненный одной корзиной, не расходует другие."""
+        url = reverse('posts:add_comment', args=(self.post.id,))
+        self.client.post(url, {'text': 'Комментарий'})
+        for _ in range(3):
+            response = self.client.post(url, {'text': 'Комментарий'})
+            self.assertEqual(response.status_code, 429)
+        other = Client()
+        other.force_login(User.objects.create_user(username='other'))
+        response = other.post(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
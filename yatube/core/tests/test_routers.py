@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..db import routers
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+
+    def read_db(self, model):
+        return self.router.db_for_read(model)
+
+    def test_reads_outside_request_use_primary(self):
+        """Вне запроса чтение идет в основную базу."""
+        self.assertIsNone(self.read_db(Post))
+
+    def test_feed_reads_use_replica(self):
+        """В запросе посты читаются с реплики, пользователи — нет."""
+        state, token = routers.start_request(pinned=False)
+        try:
+            self.assertEqual(self.read_db(Post), 'replica')
+            self.assertIsNone(self.read_db(User))
+        finally:
+            routers.finish_request(token)
+
+    def test_reads_after_write_use_primary(self):
+        """После записи запрос читает из основной базы."""
+        state, token = routers.start_request(pinned=False)
+        try:
+            self.assertEqual(self.router.db_for_write(Post), 'default')
+            self.assertIsNone(self.read_db(Post))
+        finally:
+            routers.finish_request(token)
+        self.assertTrue(state.wrote)
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class PrimaryPinMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def test_write_sets_pin_cookie(self):
+        """После комментария пользователь закрепляется за основной базой."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', args=(self.post.id,)),
+            {'text': 'Комментарий'},
+        )
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_follow_sets_pin_cookie(self):
+        """Подписка сырым SQL тоже закрепляет за основной базой."""
+        author = User.objects.create_user(username='author')
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow', args=(author.username,))
+        )
+        self.assertIn('primary_pin', response.cookies)
+
+    def test_read_does_not_set_pin_cookie(self):
+        """Чтение ленты не закрепляет за основной базой."""
+        response = Client().get(reverse('posts:index'))
+        self.assertNotIn('primary_pin', response.cookies)
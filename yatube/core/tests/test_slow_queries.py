@@ -0,0 +1,51 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..slow_queries import fingerprint
+
+
+class SlowQueryLogTests(TestCase):
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_query_is_logged_with_plan(self):
+        """Запрос дольше порога пишется в журнал с view,
+        источником и планом выполнения."""
+        cache.clear()
+        with self.assertLogs('yatube.slow_queries', 'WARNING') as logs:
+            Client().get(reverse('posts:index'))
+        record = next(
+            record for record in logs.records
+            if 'posts_post' in record.sql
+        )
+        self.assertEqual(record.view_name, 'posts:index')
+        self.assertTrue(record.origin.startswith('posts'))
+        self.assertTrue(record.plan)
+
+    def test_fingerprint_replaces_literals(self):
+        """Литералы и списки IN нормализуются."""
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3)"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...)',
+        )
+
+    def test_report_groups_by_fingerprint(self):
+        """Отчет суммирует запросы с одинаковым отпечатком."""
+        records = [
+            {'sql': 'SELECT 1 FROM t WHERE id = %s', 'duration_ms': 120},
+            {'sql': 'SELECT 1 FROM t WHERE id = 5', 'duration_ms': 180},
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'slow.log')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.writelines(
+                    json.dumps(record) + '\n' for record in records
+                )
+            out = StringIO()
+            call_command('slow_query_report', log=path, stdout=out)
+        self.assertIn('2 раз, всего 300.0 мс', out.getvalue())
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_response_has_server_timing(self):
+        """Ответ содержит разбивку времени по этапам запроса."""
+        response = self.guest_client.get(
+            reverse('posts:profile', kwargs={'username': 'auth'})
+        )
+        metrics = {
+            part.split(';')[0]
+            for part in response['Server-Timing'].split(', ')
+        }
+        self.assertTrue(
+            {'resolve', 'view', 'db', 'template', 'total'} <= metrics
+        )
+
+    def test_timing_is_logged_with_view_name(self):
+        """В лог пишется имя view и замеры."""
+        with self.assertLogs('yatube.timing', 'INFO') as logs:
+            self.guest_client.get(reverse('posts:index'))
+        record = logs.records[-1]
+        self.assertEqual(record.view_name, 'posts:index')
+        self.assertIn('cache', record.timings_ms)
@@ -0,0 +1,23 @@
+import time
+
+from sorl.thumbnail.base import ThumbnailBackend
+
+from core import metrics
+
+
+class TimedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, замеряющий генерацию миниатюр."""
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        started = time.perf_counter()
+        try:
+            super()._create_thumbnail(
+                source_image, geometry_string, options, thumbnail
+            )
+        finally:
+            metrics.observe(
+                'yatube_thumbnail_duration_seconds',
+                time.perf_counter() - started,
+                geometry=geometry_string,
+            )
@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from core import metrics as metrics_registry
+
 
 def page_not_found(request, exception):
     return render(
@@ -16,3 +20,13 @@ def server_error(request):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики для Prometheus, доступные только с METRICS_ALLOWED_IPS."""
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics_registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
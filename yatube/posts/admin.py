@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
 
-from .models import Comment, Follow, Group, Post
+from . import purge
+from .models import Comment, Follow, Group, Post, PurgeTask, User
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -12,15 +14,50 @@ class FollowAdmin(admin.ModelAdmin):
     list_editable = ('author',)
 
 
-class PostAdmin(admin.ModelAdmin):
+class SoftDeleteAdmin(admin.ModelAdmin):
+    """Удаление скрывает объект и ставит фоновую очистку posts.purge."""
+
+    soft_delete = None
+
+    def get_deleted_objects(self, objs, request):
+        # Зависимые строки удалятся в фоне, перечислять их долго.
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        self.soft_delete(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.soft_delete(obj)
+
+
+class PostAdmin(SoftDeleteAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
     list_editable = ('group',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    soft_delete = staticmethod(purge.delete_post)
+
+
+class GroupAdmin(SoftDeleteAdmin):
+    soft_delete = staticmethod(purge.delete_group)
+
+
+class PurgingUserAdmin(SoftDeleteAdmin, UserAdmin):
+    soft_delete = staticmethod(purge.delete_user)
+
+
+class PurgeTaskAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'object_id', 'stage', 'removed', 'created',
+                    'finished')
+    list_filter = ('kind', 'finished')
 
 
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(Follow, FollowAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
+admin.site.register(PurgeTask, PurgeTaskAdmin)
+admin.site.unregister(User)
+admin.site.register(User, PurgingUserAdmin)
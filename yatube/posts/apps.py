@@ -1,5 +1,43 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from core import metrics
+        from posts import (
+            archive, comment_queue, follows, group_stats, post_cache, purge,
+            trending,
+        )
+        from posts.models import Comment, Follow, Group, Post, User
+
+        post_save.connect(post_cache.post_changed, sender=Post)
+        post_delete.connect(post_cache.post_changed, sender=Post)
+        post_save.connect(post_cache.group_changed, sender=Group)
+        pre_delete.connect(post_cache.group_changed, sender=Group)
+        post_save.connect(post_cache.author_changed, sender=User)
+        pre_save.connect(group_stats.post_saving, sender=Post)
+        post_save.connect(group_stats.post_saved, sender=Post)
+        post_delete.connect(group_stats.post_deleted, sender=Post)
+        post_save.connect(archive.post_saved, sender=Post)
+        post_delete.connect(archive.post_deleted, sender=Post)
+        post_save.connect(group_stats.group_changed, sender=Group)
+        post_delete.connect(group_stats.group_changed, sender=Group)
+        post_save.connect(follows.follow_saved, sender=Follow)
+        post_delete.connect(follows.follow_deleted, sender=Follow)
+        post_save.connect(comment_queue.comment_changed, sender=Comment)
+        post_delete.connect(comment_queue.comment_changed, sender=Comment)
+        post_save.connect(trending.comment_created, sender=Comment)
+        post_delete.connect(trending.post_deleted, sender=Post)
+        metrics.register_gauge(
+            'yatube_queue_depth', purge.pending_count, queue='purge'
+        )
+        if settings.COMMENT_INGESTION == 'queued':
+            metrics.register_gauge(
+                'yatube_queue_depth', comment_queue.depth, queue='comments'
+            )
@@ -0,0 +1,144 @@
+"""Архив лент по датам: число постов за день ведется при записи.
+
+Для каждого дня хранится число постов в общей ленте, в ленте
+сообщества и в ленте автора (DailyPostCount). Создание, удаление поста
+и его перенос в другое сообщество правят несколько строк, поэтому
+списки годов, месяцев и дней с числом постов собираются по счетчикам,
+а не агрегатом по posts_post. Сами посты периода выбираются по
+индексам (group, pub_date) и (author, pub_date).
+"""
+import datetime
+
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth, TruncYear
+from django.utils import timezone
+
+from . import sharding
+from .follows import table
+from .models import ColdPost, DailyPostCount, Post
+
+TRUNC = {'year': TruncYear, 'month': TruncMonth}
+
+
+def post_scopes(group_id, author_id):
+    scopes = [('all', 0), ('author', author_id)]
+    if group_id is not None:
+        scopes.append(('group', group_id))
+    return scopes
+
+
+def change(scopes, pub_date, delta):
+    """Прибавляет delta к счетчикам scopes за день pub_date."""
+    counts = table(DailyPostCount)
+    day = connection.ops.adapt_datefield_value(timezone.localdate(pub_date))
+    rows = [(scope, key, day) for scope, key in scopes]
+    # Как и posts.group_stats, без savepoint внутри сохранения поста.
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        if delta > 0:
+            # Одна вставка на все счетчики поста.
+            cursor.execute(
+                f'INSERT INTO {counts} (scope, key, day, posts) VALUES '
+                + ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+                + ' ON CONFLICT (scope, key, day) DO UPDATE SET '
+                f'posts = {counts}.posts + excluded.posts',
+                [value for row in rows for value in row + (delta,)],
+            )
+            return
+        cursor.executemany(
+            f'UPDATE {counts} SET posts = posts - %s '
+            'WHERE scope = %s AND key = %s AND day = %s',
+            [(-delta,) + row for row in rows],
+        )
+        cursor.executemany(
+            f'DELETE FROM {counts} '
+            'WHERE scope = %s AND key = %s AND day = %s AND posts = 0',
+            rows,
+        )
+
+
+def post_saved(sender, instance, created=False, **kwargs):
+    if created:
+        change(
+            post_scopes(instance.group_id, instance.author_id),
+            instance.pub_date, 1,
+        )
+        return
+    # Прежнее сообщество запомнил posts.group_stats.post_saving.
+    old_group_id = instance._saved_group_id
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id is not None:
+        change([('group', old_group_id)], instance.pub_date, -1)
+    if instance.group_id is not None:
+        change([('group', instance.group_id)], instance.pub_date, 1)
+
+
+def post_deleted(sender, instance, **kwargs):
+    if instance.deleted_at is not None:
+        return
+    change(
+        post_scopes(instance.group_id, instance.author_id),
+        instance.pub_date, -1,
+    )
+
+
+def period_bounds(year, month=None, day=None):
+    """Первый день периода и первый день следующего.
+
+    ValueError, если такой даты нет.
+    """
+    if day is not None:
+        start = datetime.date(year, month, day)
+        return start, start + datetime.timedelta(days=1)
+    if month is not None:
+        start = datetime.date(year, month, 1)
+        if month == 12:
+            return start, datetime.date(year + 1, 1, 1)
+        return start, datetime.date(year, month + 1, 1)
+    return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+
+
+def periods(scope, key, kind, start=None, end=None):
+    """[(первый день периода, число постов)] по годам, месяцам или
+    дням (kind) из счетчиков ленты, за [start, end), если заданы."""
+    rows = DailyPostCount.objects.filter(scope=scope, key=key)
+    if start is not None:
+        rows = rows.filter(day__gte=start, day__lt=end)
+    if kind == 'day':
+        return list(rows.order_by('day').values_list('day', 'posts'))
+    return list(
+        rows.annotate(period=TRUNC[kind]('day')).values('period').annotate(
+            total=Sum('posts')
+        ).order_by('period').values_list('period', 'total')
+    )
+
+
+def aware(day):
+    """Начало дня в текущем часовом поясе для сравнения с pub_date."""
+    return timezone.make_aware(
+        datetime.datetime.combine(day, datetime.time())
+    )
+
+
+def rebuild():
+    """Пересчитывает все счетчики по постам, включая архивные."""
+    counts = {}
+    for posts in sharding.everywhere(Post.objects.all()) + [
+        ColdPost.objects.all()
+    ]:
+        for group_id, author_id, pub_date in posts.values_list(
+            'group_id', 'author_id', 'pub_date'
+        ).iterator():
+            day = timezone.localdate(pub_date)
+            for scope, key in post_scopes(group_id, author_id):
+                counts[scope, key, day] = counts.get((scope, key, day), 0) + 1
+    with transaction.atomic():
+        DailyPostCount.objects.all().delete()
+        DailyPostCount.objects.bulk_create(
+            (
+                DailyPostCount(scope=scope, key=key, day=day, posts=posts)
+                for (scope, key, day), posts in counts.items()
+            ),
+            batch_size=500,
+        )
@@ -0,0 +1,202 @@
+"""Архив старых постов: горячая таблица posts_post и холодная ColdPost.
+
+Почти все чтения приходятся на посты последних недель, поэтому посты
+старше COLD_POSTS_AFTER_DAYS команда move_cold_posts переносит вместе
+с комментариями в ColdPost и ColdComment основной БД. Перенос идет
+пакетами: INSERT ... SELECT и DELETE по списку id в одной короткой
+транзакции на пакет, так что posts_post и его индексы остаются
+небольшими, а прерванный перенос просто продолжается следующим
+запуском. Мягко удаленные посты не переносятся, их удалит posts.purge.
+
+Архив один, в основной базе. Посты других шардов (posts.sharding)
+копируются в него и только потом удаляются из шарда, так что перенос,
+прерванный между этими шагами, безопасно повторить.
+
+id постов и комментариев сохраняются (AUTOINCREMENT в SQLite не выдает
+их повторно), поэтому get_post и записи posts.post_cache находят
+архивный пост по прежнему id, а ленты (post_cache.ShardedFeed с cold)
+сливают архив с горячими постами. Счетчики сообществ и архива по датам
+учитывают архивные посты как прежде. Перед правкой, удалением или
+комментарием restore возвращает пост из архива в шард автора; если
+пост по-прежнему старый, следующий перенос снова отправит его в архив.
+"""
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from core.db.transaction import atomic_on
+
+from . import sharding
+from .comment_queue import invalidate_comments
+from .follows import table
+from .models import ColdComment, ColdPost, Comment, Post, TrendingScore
+from .post_cache import invalidate_posts, post_scopes
+
+
+def columns(model):
+    return ', '.join(
+        connection.ops.quote_name(field.column)
+        for field in model._meta.concrete_fields
+    )
+
+
+def copy(model, rows):
+    """Строки model с полями, взятыми из rows."""
+    names = [field.attname for field in model._meta.concrete_fields]
+    return [
+        model(**{name: getattr(row, name) for name in names})
+        for row in rows
+    ]
+
+
+def move_from_shard(alias, before, batch_size):
+    posts = list(
+        Post.objects.using(alias).filter(pub_date__lt=before).order_by(
+            'pub_date'
+        )[:batch_size]
+    )
+    if not posts:
+        return []
+    ids = [post.pk for post in posts]
+    comments = Comment.objects.using(alias).filter(
+        post_id__in=ids
+    ).order_by()
+    with transaction.atomic():
+        ColdPost.objects.bulk_create(
+            copy(ColdPost, posts), ignore_conflicts=True
+        )
+        ColdComment.objects.bulk_create(
+            copy(ColdComment, comments), ignore_conflicts=True
+        )
+        TrendingScore.objects.filter(post_id__in=ids).delete()
+    with transaction.atomic(using=alias):
+        sharding.delete_rows(alias, Comment, 'post_id', ids)
+        sharding.delete_rows(alias, Post, 'id', ids)
+    return [(post.pk, post.group_id, post.author_id) for post in posts]
+
+
+def move(before, batch_size, alias=DEFAULT_DB_ALIAS):
+    """Переносит в архив до batch_size старейших постов шарда alias,
+    опубликованных раньше before; возвращает число перенесенных
+    постов."""
+    if alias == DEFAULT_DB_ALIAS:
+        rows = move_from_default(before, batch_size)
+    else:
+        rows = move_from_shard(alias, before, batch_size)
+    ids = [post_id for post_id, _, _ in rows]
+    invalidate_posts(ids, [
+        key for _, group_id, author_id in rows
+        for key in post_scopes(group_id, author_id)
+    ])
+    invalidate_comments(ids)
+    return len(ids)
+
+
+def move_from_default(before, batch_size):
+    with transaction.atomic():
+        rows = list(
+            Post.objects.filter(pub_date__lt=before).order_by(
+                'pub_date'
+            ).values_list('pk', 'group_id', 'author_id')[:batch_size]
+        )
+        if not rows:
+            return []
+        ids = [post_id for post_id, _, _ in rows]
+        in_ids = ', '.join(['%s'] * len(ids))
+        post_columns, comment_columns = columns(ColdPost), columns(
+            ColdComment
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table(ColdPost)} ({post_columns}) '
+                f'SELECT {post_columns} FROM {table(Post)} '
+                f'WHERE id IN ({in_ids})',
+                ids,
+            )
+            cursor.execute(
+                f'INSERT INTO {table(ColdComment)} ({comment_columns}) '
+                f'SELECT {comment_columns} FROM {table(Comment)} '
+                f'WHERE post_id IN ({in_ids})',
+                ids,
+            )
+            # Напрямую, без сигналов удаления: пост не исчез, и счетчики
+            # posts.group_stats и posts.archive трогать нельзя.
+            for model, column in (
+                (Comment, 'post_id'),
+                (TrendingScore, 'post_id'),
+                (Post, 'id'),
+            ):
+                cursor.execute(
+                    f'DELETE FROM {table(model)} WHERE {column} IN ({in_ids})',
+                    ids,
+                )
+    return rows
+
+
+def get_post(post_id):
+    """Пост по id из posts_post или из архива; None, если его нет."""
+    post = sharding.get_post(post_id)
+    if post is None:
+        post = ColdPost.objects.filter(pk=post_id).first()
+    return post
+
+
+def comments(post_id):
+    """Комментарии архивного поста, новые первыми."""
+    return list(
+        ColdComment.objects.filter(post_id=post_id).select_related(
+            'author'
+        ).only('text', 'created', 'author__username')
+    )
+
+
+def insert_rows(alias, model, names, rows):
+    """INSERT без сигналов; строки, которые уже есть, пропускаются."""
+    if not rows:
+        return
+    quote = connections[alias].ops.quote_name
+    with connections[alias].cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({", ".join(quote(name) for name in names)}) '
+            f'VALUES ({", ".join(["%s"] * len(names))}) '
+            'ON CONFLICT DO NOTHING',
+            rows,
+        )
+
+
+def restore(post_id):
+    """Возвращает архивный пост с комментариями в posts_post шарда
+    автора; False, если в архиве его нет.
+
+    Счетчики не меняются: архивные посты в них уже учтены.
+    """
+    author_id = ColdPost.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True
+    ).first()
+    if author_id is None:
+        return False
+    alias = sharding.author_shard(author_id)
+    # У архивных моделей те же столбцы, что у Post и Comment.
+    post_names, comment_names = (
+        [field.attname for field in model._meta.concrete_fields]
+        for model in (ColdPost, ColdComment)
+    )
+    with atomic_on(DEFAULT_DB_ALIAS, alias):
+        post = list(ColdPost.objects.filter(pk=post_id).values_list(
+            *post_names
+        ))
+        if not post:
+            return False
+        insert_rows(alias, Post, post_names, post)
+        insert_rows(alias, Comment, comment_names, list(
+            ColdComment.objects.filter(post_id=post_id).order_by(
+            ).values_list(*comment_names)
+        ))
+        with connection.cursor() as cursor:
+            for model, column in ((ColdComment, 'post_id'), (ColdPost, 'id')):
+                cursor.execute(
+                    f'DELETE FROM {table(model)} WHERE {column} = %s',
+                    [post_id],
+                )
+    invalidate_posts([post_id])
+    invalidate_comments([post_id])
+    return True
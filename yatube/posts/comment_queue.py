@@ -0,0 +1,204 @@
+"""Буферизованный прием комментариев.
+
+В режиме COMMENT_INGESTION = 'queued' add_comment не пишет в БД,
+а кладет комментарий в локальную очередь — файл SQLite
+COMMENT_QUEUE_PATH с synchronous=FULL, так что принятый комментарий
+переживает падение процесса. Команда flush_comments переносит очередь
+в posts_comment пакетами через bulk_create и сбрасывает кэш
+комментариев один раз на пост за пакет. Автор видит свои еще не
+перенесенные комментарии сразу: post_detail подмешивает их из очереди.
+
+У каждого комментария из очереди есть ingest_key, поэтому повторный
+перенос после падения между коммитом в БД и удалением из очереди
+не создает дублей.
+"""
+import datetime
+import sqlite3
+import threading
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from core.db.pragmas import apply_pragmas
+
+from . import sharding, trending
+from .models import Comment, User
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS comment_queue ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+    ' ingest_key TEXT NOT NULL, post_id INTEGER NOT NULL,'
+    ' author_id INTEGER NOT NULL, text TEXT NOT NULL, created REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS comment_queue_post_author'
+    ' ON comment_queue (post_id, author_id)',
+)
+QUEUE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+_local = threading.local()
+
+
+def connection():
+    """Соединение с файлом очереди, свое у каждого потока."""
+    path = settings.COMMENT_QUEUE_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        conn = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(conn, QUEUE_PRAGMAS)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        connections[path] = conn
+    return connections[path]
+
+
+def comments_key(post_id):
+    return f'post_comments:{post_id}'
+
+
+def invalidate_comments(post_ids):
+    cache.delete_many([comments_key(post_id) for post_id in post_ids])
+
+
+def post_comments(post_id, alias=None):
+    """Комментарии поста из кэша, новые первыми.
+
+    alias — база поста, по умолчанию шард по его id (posts.sharding).
+    """
+    key = comments_key(post_id)
+    comments = cache.get(key)
+    if comments is None:
+        alias = sharding.id_shard(post_id) if alias is None else alias
+        comments = sharding.on_shard(
+            Comment.objects.filter(post_id=post_id), alias
+        )
+        if sharding.joins_users(comments.db):
+            comments = comments.select_related('author').only(
+                'text', 'created', 'author__username'
+            )
+        else:
+            comments = comments.only(
+                'text', 'created', 'author'
+            ).prefetch_related(
+                Prefetch('author', User.objects.only('username'))
+            )
+        comments = list(comments)
+        cache.set(key, comments, settings.COMMENT_CACHE_TIMEOUT)
+    return comments
+
+
+def comment_changed(sender, instance, **kwargs):
+    """Комментарии, сохраненные поштучно (режим 'direct', админка)."""
+    invalidate_comments([instance.post_id])
+
+
+def enqueue(post_id, author_id, text):
+    connection().execute(
+        'INSERT INTO comment_queue'
+        ' (ingest_key, post_id, author_id, text, created)'
+        ' VALUES (?, ?, ?, ?, ?)',
+        (uuid.uuid4().hex, post_id, author_id, text,
+         timezone.now().timestamp()),
+    )
+
+
+class PendingComment:
+    """Еще не перенесенный в БД комментарий автора."""
+
+    pending = True
+
+    def __init__(self, author, text, created):
+        self.author = author
+        self.text = text
+        self.created = created
+
+
+def pending(post_id, author):
+    """Комментарии author к посту, ждущие переноса, новые первыми."""
+    rows = connection().execute(
+        'SELECT text, created FROM comment_queue'
+        ' WHERE post_id = ? AND author_id = ? ORDER BY id DESC',
+        (post_id, author.pk),
+    )
+    return [
+        PendingComment(author, text, from_timestamp(created))
+        for text, created in rows
+    ]
+
+
+def from_timestamp(value):
+    return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+
+
+def depth():
+    return connection().execute(
+        'SELECT count(*) FROM comment_queue'
+    ).fetchone()[0]
+
+
+def flush(batch_size):
+    """Переносит до batch_size старейших комментариев в БД; возвращает
+    число обработанных записей очереди."""
+    queue = connection()
+    rows = queue.execute(
+        'SELECT id, ingest_key, post_id, author_id, text, created'
+        ' FROM comment_queue ORDER BY id LIMIT ?',
+        (batch_size,),
+    ).fetchall()
+    if not rows:
+        return 0
+    comments = [
+        Comment(
+            ingest_key=ingest_key,
+            post_id=post_id,
+            author_id=author_id,
+            text=text,
+            created=from_timestamp(created),
+        )
+        for _, ingest_key, post_id, author_id, text, created in rows
+    ]
+    with transaction.atomic():
+        # Пост могли удалить, пока комментарий ждал в очереди.
+        shards = sharding.locate({comment.post_id for comment in comments})
+        comments = [
+            comment for comment in comments if comment.post_id in shards
+        ]
+        by_shard = defaultdict(list)
+        for comment in comments:
+            by_shard[sharding.primary(shards[comment.post_id])].append(
+                comment
+            )
+        inserted = []
+        for alias, shard_comments in by_shard.items():
+            # Записи, перенесенные до падения, уже учтены в trending.
+            done = set(Comment.objects.using(alias).filter(ingest_key__in=[
+                comment.ingest_key for comment in shard_comments
+            ]).values_list('ingest_key', flat=True))
+            shard_comments = [
+                comment for comment in shard_comments
+                if comment.ingest_key not in done
+            ]
+            for comment in shard_comments:
+                sharding.assign_id(comment)
+            with transaction.atomic(using=alias):
+                Comment.objects.using(alias).bulk_create(
+                    shard_comments, ignore_conflicts=True
+                )
+            inserted += shard_comments
+        trending.record(
+            [comment.post_id for comment in inserted], 'comment'
+        )
+    queue.execute(
+        'DELETE FROM comment_queue WHERE id <= ?', (rows[-1][0],)
+    )
+    invalidate_comments({comment.post_id for comment in comments})
+    return len(rows)
@@ -0,0 +1,212 @@
+"""Подписки: запись одним оператором и кэш подписок пользователя.
+
+Подписка — INSERT ... ON CONFLICT DO NOTHING, отписка — DELETE по паре
+(user_id, author_id). По rowcount видно, изменилось ли что-нибудь;
+счетчики FollowStats правятся в той же транзакции. База для записи
+берется у роутеров, как и для ORM: иначе запрос с подпиской не закрепился
+бы за основной базой (core.db.routers) и читал бы подписки с реплики.
+
+Для каждого пользователя в кэше лежит отсортированный массив id
+авторов (array('I'), 4 байта на подписку), поэтому даже тысячи
+подписок занимают несколько килобайт, а проверка — бинарный поиск.
+После подписки и отписки массив удаляется из кэша и перечитывается
+при следующем обращении: правка на месте теряла бы одновременные
+изменения.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, router, transaction
+from django.db.models import Count
+
+from . import sharding
+from .models import Follow, FollowStats, Post
+from .post_cache import invalidate, invalidate_follow_feed
+
+
+def table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def write_connection(model):
+    return connections[router.db_for_write(model)]
+
+
+def followed_key(user_id):
+    return f'followed_ids:{user_id}'
+
+
+def load_followed_ids(user_id):
+    return array('I', Follow.objects.filter(user_id=user_id).order_by(
+        'author_id'
+    ).values_list('author_id', flat=True))
+
+
+def followed_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    key = followed_key(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = load_followed_ids(user_id)
+        cache.set(key, ids, settings.FOLLOW_CACHE_TIMEOUT)
+    return ids
+
+
+def contains(ids, author_id):
+    index = bisect_left(ids, author_id)
+    return index < len(ids) and ids[index] == author_id
+
+
+def is_following(user, author_ids):
+    """Те из author_ids, на которых подписан user, одним обращением
+    к кэшу."""
+    if not user.is_authenticated:
+        return set()
+    ids = followed_ids(user.pk)
+    return {author_id for author_id in author_ids if contains(ids, author_id)}
+
+
+def update_counters(user_id, author_ids, delta):
+    if not author_ids:
+        return
+    stats = table(FollowStats)
+    with write_connection(FollowStats).cursor() as cursor:
+        if delta > 0:
+            cursor.executemany(
+                f'INSERT INTO {stats} (user_id, followers, following) '
+                'VALUES (%s, %s, %s) ON CONFLICT (user_id) DO UPDATE SET '
+                f'followers = {stats}.followers + excluded.followers, '
+                f'following = {stats}.following + excluded.following',
+                [(author_id, delta, 0) for author_id in author_ids]
+                + [(user_id, 0, delta * len(author_ids))],
+            )
+        else:
+            # Только UPDATE: при удалении пользователя его строки
+            # счетчиков удаляются вместе с ним и создавать их нельзя.
+            cursor.executemany(
+                f'UPDATE {stats} SET followers = followers - %s '
+                'WHERE user_id = %s',
+                [(-delta, author_id) for author_id in author_ids],
+            )
+            cursor.execute(
+                f'UPDATE {stats} SET following = following - %s '
+                'WHERE user_id = %s',
+                (-delta * len(author_ids), user_id),
+            )
+
+
+def changed(user_id):
+    invalidate([followed_key(user_id)])
+    invalidate_follow_feed(user_id)
+
+
+def write(user_id, author_ids, sql):
+    """Выполняет sql для каждой пары и возвращает id авторов,
+    для которых строка действительно вставилась или удалилась."""
+    done = []
+    with write_connection(Follow).cursor() as cursor:
+        for author_id in author_ids:
+            cursor.execute(sql, (user_id, author_id))
+            if cursor.rowcount:
+                done.append(author_id)
+    return done
+
+
+def follow_many(user_id, author_ids):
+    """Подписывает на авторов; возвращает id новых подписок.
+
+    Подписка на себя и повторная подписка молча пропускаются.
+    Все id должны принадлежать существующим пользователям.
+    """
+    author_ids = sorted(set(author_ids) - {user_id})
+    if not author_ids:
+        return []
+    with transaction.atomic():
+        added = write(
+            user_id,
+            author_ids,
+            f'INSERT INTO {table(Follow)} (user_id, author_id) '
+            'VALUES (%s, %s) ON CONFLICT DO NOTHING',
+        )
+        update_counters(user_id, added, 1)
+    if added:
+        changed(user_id)
+    return added
+
+
+def unfollow_many(user_id, author_ids):
+    """Отписывает от авторов; возвращает id удаленных подписок."""
+    author_ids = sorted(set(author_ids))
+    if not author_ids:
+        return []
+    with transaction.atomic():
+        removed = write(
+            user_id,
+            author_ids,
+            f'DELETE FROM {table(Follow)} '
+            'WHERE user_id = %s AND author_id = %s',
+        )
+        update_counters(user_id, removed, -1)
+    if removed:
+        changed(user_id)
+    return removed
+
+
+def follow(user_id, author_id):
+    """Подписка; True, если ее раньше не было."""
+    return bool(follow_many(user_id, [author_id]))
+
+
+def unfollow(user_id, author_id):
+    """Отписка; True, если подписка была."""
+    return bool(unfollow_many(user_id, [author_id]))
+
+
+def follow_group_authors(user_id, group):
+    """Подписывает на всех авторов постов группы."""
+    author_ids = {
+        author_id
+        for posts in sharding.everywhere(Post.objects.filter(group=group))
+        for author_id in posts.order_by().values_list(
+            'author_id', flat=True
+        ).distinct()
+    }
+    return follow_many(user_id, list(author_ids))
+
+
+def follow_counts(user_id):
+    """Число подписчиков и подписок пользователя."""
+    stats = FollowStats.objects.filter(user_id=user_id).values_list(
+        'followers', 'following'
+    ).first()
+    return stats or (0, 0)
+
+
+def rebuild_follow_stats():
+    """Пересчитывает FollowStats по всем подпискам."""
+    stats = {}
+    for field, counter in (('author_id', 'followers'),
+                           ('user_id', 'following')):
+        rows = Follow.objects.values_list(field).annotate(
+            count=Count('pk')
+        ).order_by()
+        for user_id, count in rows.iterator():
+            row = stats.setdefault(user_id, FollowStats(user_id=user_id))
+            setattr(row, counter, count)
+    with transaction.atomic():
+        FollowStats.objects.all().delete()
+        FollowStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+def follow_saved(sender, instance, created=False, **kwargs):
+    """Подписки, созданные через ORM (админка, фикстуры)."""
+    if created:
+        update_counters(instance.user_id, [instance.author_id], 1)
+        changed(instance.user_id)
+
+
+def follow_deleted(sender, instance, **kwargs):
+    update_counters(instance.user_id, [instance.author_id], -1)
+    changed(instance.user_id)
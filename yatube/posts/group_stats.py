@@ -0,0 +1,171 @@
+"""Счетчики сообществ для каталога: посты, авторы, последний пост.
+
+Счетчики правятся при создании и удалении поста и при переносе поста
+в другое сообщество, поэтому каталогу не нужен GROUP BY по постам.
+Число разных авторов ведется через GroupAuthor — число постов автора
+в сообществе: первый пост автора увеличивает счетчик авторов,
+удаление последнего уменьшает. Время последнего поста при удалении
+пересчитывается индексированным max(pub_date) по всем шардам
+(posts.sharding) и архиву только если удаляется самый свежий пост
+сообщества.
+
+Отрисованный каталог кэшируется до изменения счетчиков или сообществ.
+"""
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from . import sharding
+from .follows import table
+from .models import ColdPost, GroupAuthor, GroupStats, Post
+from .post_cache import version
+
+DIRECTORY_VERSION_KEY = 'group_directory_version'
+
+
+def directory_version():
+    return version(DIRECTORY_VERSION_KEY)
+
+
+def invalidate_directory():
+    cache.delete(DIRECTORY_VERSION_KEY)
+
+
+def post_added(group_id, author_id, pub_date):
+    authors, stats = table(GroupAuthor), table(GroupStats)
+    pub_date = connection.ops.adapt_datetimefield_value(pub_date)
+    # Обычно вызывается внутри транзакции сохранения поста: savepoint
+    # там лишь добавил бы два запроса, ошибка и так откатит сохранение.
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {authors} (group_id, author_id, posts) '
+            'VALUES (%s, %s, 1) ON CONFLICT (group_id, author_id) '
+            f'DO UPDATE SET posts = {authors}.posts + 1',
+            (group_id, author_id),
+        )
+        # Автор новый, если это его первый пост в сообществе.
+        cursor.execute(
+            f'INSERT INTO {stats} (group_id, posts, authors, last_post) '
+            'SELECT %s, 1, CASE WHEN posts = 1 THEN 1 ELSE 0 END, %s '
+            f'FROM {authors} WHERE group_id = %s AND author_id = %s '
+            'ON CONFLICT (group_id) DO UPDATE SET '
+            f'posts = {stats}.posts + 1, '
+            f'authors = {stats}.authors + excluded.authors, '
+            f'last_post = CASE WHEN {stats}.last_post IS NULL '
+            f'OR excluded.last_post > {stats}.last_post '
+            f'THEN excluded.last_post ELSE {stats}.last_post END',
+            (group_id, pub_date, group_id, author_id),
+        )
+    invalidate_directory()
+
+
+def last_post(group_id):
+    """Время последнего поста сообщества по всем шардам и архиву."""
+    dates = [
+        posts.filter(group_id=group_id).aggregate(
+            last=Max('pub_date')
+        )['last']
+        for posts in sharding.everywhere(Post.objects.all()) + [
+            ColdPost.objects.all()
+        ]
+    ]
+    return max([date for date in dates if date is not None], default=None)
+
+
+def post_removed(group_id, author_id, pub_date):
+    """Вызывается, когда поста уже нет в сообществе."""
+    authors, stats = table(GroupAuthor), table(GroupStats)
+    with transaction.atomic(savepoint=False), connection.cursor() as cursor:
+        # Только UPDATE и DELETE: при удалении сообщества его строки
+        # удаляются вместе с ним и создавать их нельзя.
+        cursor.execute(
+            f'UPDATE {authors} SET posts = posts - 1 '
+            'WHERE group_id = %s AND author_id = %s',
+            (group_id, author_id),
+        )
+        cursor.execute(
+            f'DELETE FROM {authors} '
+            'WHERE group_id = %s AND author_id = %s AND posts = 0',
+            (group_id, author_id),
+        )
+        gone_author = cursor.rowcount
+        cursor.execute(
+            f'UPDATE {stats} SET posts = posts - 1, '
+            'authors = authors - %s WHERE group_id = %s',
+            (gone_author, group_id),
+        )
+        if GroupStats.objects.filter(
+            group_id=group_id, last_post__lte=pub_date
+        ).exists():
+            GroupStats.objects.filter(group_id=group_id).update(
+                last_post=last_post(group_id)
+            )
+    invalidate_directory()
+
+
+def post_saving(sender, instance, update_fields=None, **kwargs):
+    """Запоминает прежнее сообщество редактируемого поста для
+    post_saved здесь и в posts.archive."""
+    if instance._state.adding or (
+        update_fields is not None and 'group' not in update_fields
+    ):
+        instance._saved_group_id = instance.group_id
+        return
+    instance._saved_group_id = Post.objects.using(
+        sharding.primary(instance._state.db)
+    ).filter(pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+def post_saved(sender, instance, created=False, **kwargs):
+    old_group_id = None if created else instance._saved_group_id
+    if old_group_id == instance.group_id:
+        return
+    if old_group_id is not None:
+        post_removed(old_group_id, instance.author_id, instance.pub_date)
+    if instance.group_id is not None:
+        post_added(instance.group_id, instance.author_id, instance.pub_date)
+
+
+def post_deleted(sender, instance, **kwargs):
+    # Мягко удаленный пост убран из счетчиков при скрытии.
+    if instance.group_id is not None and instance.deleted_at is None:
+        post_removed(instance.group_id, instance.author_id, instance.pub_date)
+
+
+def group_changed(sender, instance, **kwargs):
+    invalidate_directory()
+
+
+def rebuild():
+    """Пересчитывает все счетчики по постам, включая архивные."""
+    stats = {}
+    authors = {}
+    for posts in sharding.everywhere(Post.objects.all()) + [
+        ColdPost.objects.all()
+    ]:
+        rows = posts.filter(group__isnull=False).values(
+            'group_id', 'author_id'
+        ).annotate(posts=Count('pk'), last_post=Max('pub_date')).order_by()
+        for row in rows.iterator():
+            group = stats.setdefault(
+                row['group_id'], GroupStats(group_id=row['group_id'])
+            )
+            author = authors.get((row['group_id'], row['author_id']))
+            if author is None:
+                author = authors[row['group_id'], row['author_id']] = (
+                    GroupAuthor(
+                        group_id=row['group_id'],
+                        author_id=row['author_id'],
+                    )
+                )
+                group.authors += 1
+            author.posts += row['posts']
+            group.posts += row['posts']
+            if group.last_post is None or row['last_post'] > group.last_post:
+                group.last_post = row['last_post']
+    with transaction.atomic():
+        GroupAuthor.objects.all().delete()
+        GroupStats.objects.all().delete()
+        GroupAuthor.objects.bulk_create(authors.values(), batch_size=500)
+        GroupStats.objects.bulk_create(stats.values(), batch_size=500)
+    invalidate_directory()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.models import RENDERED_FIELDS, Post, render_post_text
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет отрендеренные поля текста у постов, сохраненных '
+        'до их появления или вставленных в обход Post.save().'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать все посты, а не только незаполненные.'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.order_by('pk').only('pk', 'text')
+        if not options['all']:
+            posts = posts.filter(Q(text_html='') | Q(preview_html=''))
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(
+                posts.filter(pk__gt=last_pk)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            for post in batch:
+                for name, value in render_post_text(post.text).items():
+                    setattr(post, name, value)
+            Post.objects.bulk_update(batch, RENDERED_FIELDS)
+            last_pk = batch[-1].pk
+            total += len(batch)
+            self.stdout.write(f'Обработано постов: {total}')
+        self.stdout.write(self.style.SUCCESS(f'Готово, постов: {total}'))
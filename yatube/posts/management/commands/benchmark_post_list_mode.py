@@ -0,0 +1,90 @@
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+
+from core.benchmarking import Measurement, benchmark_path, save_results
+from posts.models import RENDERED_FIELDS, Post, render_post_text
+
+from . import benchmark_views
+
+LIST_VIEWS = ('index', 'group_posts', 'profile', 'follow_index')
+MODES = ('full', 'excerpt')
+
+
+class Command(benchmark_views.Command):
+    help = (
+        'Сравнивает размер ответа и время рендера лент в режимах '
+        'POST_LIST_MODE full и excerpt на данных с длинными постами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=2000)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--long-share', type=float, default=0.3,
+            help='Доля постов, которые станут длинными.'
+        )
+        parser.add_argument(
+            '--long-chars', type=int, default=20000,
+            help='Длина длинного поста в символах.'
+        )
+        parser.add_argument(
+            '--output', default=benchmark_path('post_list_mode.json')
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.populate(options['size'], options['seed'])
+            self.lengthen_posts(options['long_share'], options['long_chars'])
+            reader, cases = self.cases()
+            client = Client()
+            client.force_login(reader)
+            results = {
+                mode: self.run_mode(mode, client, cases, options)
+                for mode in MODES
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        save_results(options['output'], results)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def lengthen_posts(self, share, chars):
+        """Делает каждый N-й пост длинным, повторяя его абзацы."""
+        if share <= 0:
+            return
+        step = max(1, round(1 / share))
+        posts = list(Post.objects.order_by('pk').only('pk', 'text'))[::step]
+        for post in posts:
+            paragraphs = '\n\n'.join([post.text] * (chars // len(post.text)))
+            post.text = paragraphs[:chars]
+            for name, value in render_post_text(post.text).items():
+                setattr(post, name, value)
+        Post.objects.bulk_update(
+            posts, ('text', *RENDERED_FIELDS), batch_size=500
+        )
+
+    def run_mode(self, mode, client, cases, options):
+        results = {}
+        with override_settings(POST_LIST_MODE=mode):
+            for name, method, url, data in cases:
+                if name not in LIST_VIEWS:
+                    continue
+                measurement = Measurement()
+                for _ in range(options['iterations']):
+                    cache.clear()
+                    with measurement.measure():
+                        response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{name}: статус ответа {response.status_code}'
+                        )
+                    measurement.extra['response_bytes'] = len(
+                        response.content
+                    )
+                results[name] = measurement.summary()
+                self.stdout.write(f'{mode} {name}: {results[name]}')
+        return results
@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmarking import benchmark_path, save_results
+from core.db.pragmas import apply_pragmas
+from posts.sharding import BUCKETS
+
+SCHEMA = (
+    'CREATE TABLE post ('
+    ' id INTEGER PRIMARY KEY,'
+    ' text TEXT NOT NULL,'
+    ' pub_date REAL NOT NULL,'
+    ' author_id INTEGER NOT NULL)',
+    'CREATE INDEX post_pub_date ON post (pub_date)',
+    'CREATE INDEX post_author_date ON post (author_id, pub_date)',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет пропускную способность записи постов в зависимости '
+        'от числа шардов posts.sharding: писатели — отдельные процессы '
+        'со своими соединениями — пишут в файл шарда автора, id '
+        'выдаются блоками из общей последовательности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--shards', default='1,2,4',
+            help='Числа шардов через запятую.'
+        )
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--authors', type=int, default=1000)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--output', default=benchmark_path('sharding.json')
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for count in [int(num) for num in options['shards'].split(',')]:
+            with tempfile.TemporaryDirectory() as directory:
+                paths = [
+                    os.path.join(directory, f'shard_{num}.sqlite3')
+                    for num in range(count)
+                ]
+                for path in paths:
+                    self.create(path)
+                results[str(count)] = self.run_shards(paths, options)
+            self.stdout.write(f'{count}: {results[str(count)]}')
+        save_results(options['output'], results)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def create(self, path):
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.close()
+
+    def run_shards(self, paths, options):
+        # Процессы, а не потоки: в потоках GIL выстраивает писателей
+        # в очередь, и замер не показывает выигрыша от шардов.
+        context = multiprocessing.get_context('fork')
+        seq = context.Value('q', 0)
+        counters = context.Array('q', 2)
+        deadline = time.monotonic() + options['seconds']
+        workers = [
+            context.Process(target=writer, args=(
+                paths, options['authors'], deadline, num, seq, counters,
+            ))
+            for num in range(options['writers'])
+        ]
+        started = time.monotonic()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+        writes, errors = counters
+        return {
+            'writes_per_s': round(writes / elapsed, 1),
+            'errors': errors,
+        }
+
+
+def next_id(seq, ids):
+    """Следующий id из блока писателя; новый блок берется из общей
+    последовательности seq. Здесь она в памяти: один запрос к ее файлу
+    на POST_ID_BLOCK_SIZE постов в замер не входит."""
+    if not ids:
+        with seq.get_lock():
+            start = seq.value
+            seq.value += settings.POST_ID_BLOCK_SIZE
+        ids.extend(range(start + settings.POST_ID_BLOCK_SIZE, start, -1))
+    return ids.pop()
+
+
+def writer(paths, authors, deadline, seed, seq, counters):
+    rng = random.Random(seed)
+    connections = []
+    for path in paths:
+        connection = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+        connections.append(connection)
+    ids = []
+    writes = errors = 0
+    while time.monotonic() < deadline:
+        author_id = rng.randint(1, authors)
+        bucket = author_id % BUCKETS
+        connection = connections[bucket % len(connections)]
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute(
+                'INSERT INTO post (id, text, pub_date, author_id) '
+                'VALUES (?, ?, ?, ?)',
+                (next_id(seq, ids) * BUCKETS + bucket, 'y' * 200,
+                 time.time(), author_id),
+            )
+            connection.execute('COMMIT')
+            writes += 1
+        except sqlite3.OperationalError:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            errors += 1
+    for connection in connections:
+        connection.close()
+    with counters.get_lock():
+        counters[0] += writes
+        counters[1] += errors
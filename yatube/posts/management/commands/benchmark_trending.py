@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.test.utils import setup_databases, teardown_databases
+
+from core.benchmarking import Measurement, benchmark_path, save_results
+from posts import trending
+from posts.models import Comment, Post
+
+from . import benchmark_views
+
+
+class Command(benchmark_views.Command):
+    help = (
+        'Сравнивает ленту популярного из posts.trending с наивным '
+        'GROUP BY по комментариям за окно и замеряет цену записи события.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000',
+            help='Количество постов в наборах данных через запятую.'
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--window-days', type=int, default=7,
+            help='Окно наивного запроса, дни.'
+        )
+        parser.add_argument(
+            '--deep-page', type=int, default=10,
+            help='Номер страницы для замера глубокого курсора.'
+        )
+        parser.add_argument(
+            '--output', default=benchmark_path('trending.json')
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = {
+                str(size): self.run_size(size, options) for size in sizes
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+        save_results(options['output'], results)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+
+    def run_size(self, size, options):
+        self.populate(size, options['seed'])
+        # Сгенерированные комментарии вставлены без сигналов и датированы
+        # концом набора данных: от него и отсчитывается рейтинг.
+        now = Comment.objects.aggregate(last=Max('created'))['last']
+        trending.rebuild(now=now.timestamp())
+        since = now - timedelta(days=options['window_days'])
+        per_page = settings.POSTS_PER_PAGE
+        cursor = None
+        for _ in range(options['deep_page'] - 1):
+            cursor = trending.page(cursor, per_page)[1]
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:100])
+        cases = (
+            ('naive_group_by', lambda: list(
+                Post.objects.annotate(
+                    engagement=Count(
+                        'comments', filter=Q(comments__created__gte=since)
+                    )
+                ).filter(engagement__gt=0).order_by(
+                    '-engagement', '-pk'
+                ).values_list('pk', flat=True)[:per_page]
+            )),
+            ('trending_first_page', lambda: trending.page(None, per_page)),
+            ('trending_deep_page', lambda: trending.page(cursor, per_page)),
+            ('record_comment', lambda: trending.record(
+                [post_ids[len(measurement.latencies) % len(post_ids)]],
+                'comment', now=now.timestamp(),
+            )),
+        )
+        results = {}
+        for name, func in cases:
+            measurement = Measurement()
+            for _ in range(options['iterations']):
+                with measurement.measure():
+                    func()
+            results[name] = measurement.summary()
+            self.stdout.write(f'{size} {name}: {results[name]}')
+        return results
@@ -0,0 +1,170 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from core.benchmarking import (Measurement, benchmark_path,
+                               find_regressions, load_results, save_results)
+from posts.models import Group, Post, User
+
+DEFAULT_BASELINE = benchmark_path('views_baseline.json')
+DEFAULT_OUTPUT = benchmark_path('views_latest.json')
+# Задержка зависит от машины, поэтому по умолчанию только выводится.
+LATENCY_METRICS = ('p50_ms', 'p95_ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку, число запросов, прочитанные строки и размер '
+        'ответа основных view на сгенерированных данных разного объема.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000',
+            help='Количество постов в наборах данных через запятую.'
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кэш перед каждым запросом.'
+        )
+        parser.add_argument('--output', default=DEFAULT_OUTPUT)
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост задержки, строк и размера ответа.'
+        )
+        parser.add_argument(
+            '--check-latency', action='store_true',
+            help='Считать рост задержки регрессией, а не только выводить.'
+        )
+        parser.add_argument(
+            '--update-baseline', action='store_true',
+            help='Записать результаты как новые базовые.'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = {
+                str(size): self.run_scale(size, options) for size in sizes
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        save_results(options['output'], results)
+        self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['update_baseline']:
+            save_results(options['baseline'], results)
+            self.stdout.write('Базовые результаты обновлены.')
+            return
+        try:
+            baseline = load_results(options['baseline'])
+        except FileNotFoundError:
+            self.stdout.write('Базовые результаты не найдены.')
+            return
+        skip = () if options['check_latency'] else LATENCY_METRICS
+        regressions = find_regressions(
+            results, baseline, options['tolerance'], exact=('queries',),
+            skip=skip,
+        )
+        if skip:
+            for slower in find_regressions(
+                results, baseline, options['tolerance'], metrics=skip
+            ):
+                self.stdout.write(
+                    self.style.WARNING(f'Задержка выросла: {slower}')
+                )
+        if regressions:
+            raise CommandError(
+                'Обнаружены регрессии:\n' + '\n'.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Регрессий не обнаружено.'))
+
+    def populate(self, size, seed):
+        call_command('flush', interactive=False, verbosity=0)
+        call_command(
+            'generate_load_data',
+            users=max(10, size // 20),
+            groups=max(2, size // 500),
+            posts=size,
+            comments=size * 2,
+            follows=size // 2,
+            seed=seed,
+            end_date='2022-08-16',
+            stdout=self.stdout if self.verbosity > 1 else StringIO(),
+        )
+
+    def cases(self):
+        """Запросы для замера: имя, метод, URL, данные формы."""
+        author = User.objects.annotate(
+            posts_count=Count('posts')
+        ).order_by('-posts_count').first()
+        reader = User.objects.annotate(
+            follows_count=Count('follower')
+        ).order_by('-follows_count').first()
+        group = Group.objects.annotate(
+            posts_count=Count('posts')
+        ).order_by('-posts_count').first()
+        post = Post.objects.filter(author=author).first()
+        return reader, (
+            ('index', 'get', reverse('posts:index'), None),
+            (
+                'group_posts', 'get',
+                reverse('posts:group_list', args=(group.slug,)), None,
+            ),
+            (
+                'profile', 'get',
+                reverse('posts:profile', args=(author.username,)), None,
+            ),
+            (
+                'post_detail', 'get',
+                reverse('posts:post_detail', args=(post.id,)), None,
+            ),
+            ('follow_index', 'get', reverse('posts:follow_index'), None),
+            (
+                'post_create', 'post', reverse('posts:post_create'),
+                {'text': 'Пост из бенчмарка', 'group': group.id},
+            ),
+            (
+                'add_comment', 'post',
+                reverse('posts:add_comment', args=(post.id,)),
+                {'text': 'Комментарий из бенчмарка'},
+            ),
+        )
+
+    def run_scale(self, size, options):
+        self.verbosity = options['verbosity']
+        self.populate(size, options['seed'])
+        reader, cases = self.cases()
+        client = Client()
+        client.force_login(reader)
+        results = {}
+        # Замеряются view, а не лимиты: с --warm-cache корзины не
+        # очищаются, и post_create упирался бы в RATE_LIMITS.
+        with override_settings(RATE_LIMIT_ENABLED=False):
+            for name, method, url, data in cases:
+                measurement = Measurement()
+                for _ in range(options['iterations']):
+                    if not options['warm_cache']:
+                        cache.clear()
+                    with measurement.measure():
+                        response = getattr(client, method)(url, data)
+                    if response.status_code >= 400:
+                        raise CommandError(
+                            f'{name}: статус ответа {response.status_code}'
+                        )
+                    measurement.extra['response_bytes'] = len(
+                        response.content
+                    )
+                results[name] = measurement.summary()
+                self.stdout.write(f'{size} {name}: {results[name]}')
+        return results
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Сжимает рейтинг популярных постов: переносит точку отсчета '
+        'на текущий момент и удаляет затухшие рейтинги. Запускать '
+        'периодически, например раз в час.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать рейтинги по всем комментариям.'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            trending.rebuild()
+            self.stdout.write('Рейтинги пересчитаны.')
+            return
+        deleted = trending.compact()
+        self.stdout.write(f'Удалено затухших рейтингов: {deleted}')
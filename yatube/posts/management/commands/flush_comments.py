@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит комментарии из локальной очереди в БД пакетами '
+        '(режим COMMENT_INGESTION = "queued").'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.COMMENT_FLUSH_BATCH_SIZE,
+            help='Сколько комментариев переносить одной транзакцией.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться после опустошения очереди.'
+        )
+        parser.add_argument(
+            '--interval', type=float,
+            default=settings.COMMENT_FLUSH_INTERVAL,
+            help='Пауза между проверками очереди при --loop, секунды.'
+        )
+
+    def drain(self, batch_size):
+        flushed = 0
+        while True:
+            count = comment_queue.flush(batch_size)
+            flushed += count
+            if count < batch_size:
+                return flushed
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            flushed = self.drain(options['batch_size'])
+            self.stdout.write(f'Перенесено комментариев: {flushed}')
+            return
+        while True:
+            self.drain(options['batch_size'])
+            time.sleep(options['interval'])
@@ -0,0 +1,322 @@
+import itertools
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import archive, follows, group_stats, sharding, trending
+from posts.models import (RENDERED_FIELDS, Comment, Follow, Group, Post,
+                          User, render_post_text)
+
+TEXT_POOL_SIZE = 2000
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для `size` элементов."""
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, size + 1):
+        total += 1.0 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def next_id(model):
+    # Мягко удаленные строки скрыты менеджером objects, но id заняты.
+    return (
+        model._base_manager.aggregate(max_id=Max('pk'))['max_id'] or 0
+    ) + 1
+
+
+def bulk_insert(model, columns, rows, batch_size,
+                shard=lambda row: DEFAULT_DB_ALIAS):
+    """Быстрая вставка готовых кортежей в таблицу модели.
+
+    В обход ORM: bulk_create перезаписывает поля с auto_now_add,
+    а нам нужны заранее посчитанные даты публикации. `shard(row)`
+    выбирает базу строки (posts.sharding), по умолчанию — основная.
+    """
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)),
+    )
+    inserted = 0
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        by_shard = defaultdict(list)
+        for row in batch:
+            by_shard[shard(row)].append(row)
+        for alias, shard_rows in by_shard.items():
+            with transaction.atomic(using=alias):
+                with connections[alias].cursor() as cursor:
+                    cursor.executemany(sql, shard_rows)
+        inserted += len(batch)
+    return inserted
+
+
+def id_factory(model, count):
+    """Функция make_id(num, key) для count новых строк. При шардах id
+    берутся из общей последовательности posts.sharding, а корзину
+    задает key — author_id поста или post_id комментария; иначе id идут
+    подряд после последнего id основной базы."""
+    if sharding.enabled():
+        start = sharding.reserve(model, count)
+        return lambda num, key: (
+            (start + num) * sharding.BUCKETS + key % sharding.BUCKETS
+        )
+    start = next_id(model)
+    return lambda num, key: start + num
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочного тестирования: '
+        'пользователей, группы, посты, комментарии и подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=5000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Одинаковый seed дает одинаковые данные.'
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель распределения Ципфа для авторов постов.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределены даты публикации.'
+        )
+        parser.add_argument(
+            '--end-date', default=None,
+            help='Дата последней публикации (YYYY-MM-DD), '
+                 'по умолчанию сегодня.'
+        )
+        parser.add_argument(
+            '--group-ratio', type=float, default=0.6,
+            help='Доля постов, привязанных к группе.'
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--locale', default='ru_RU')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker(options['locale'])
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        self.end = self.get_end_datetime(options['end_date'])
+        self.span = timedelta(days=options['days'])
+
+        for alias in sharding.shards():
+            shard = connections[alias]
+            if shard.vendor == 'sqlite' and not shard.in_atomic_block:
+                with shard.cursor() as cursor:
+                    cursor.execute('PRAGMA synchronous = OFF')
+
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        user_ids = self.create_users(options['users'], options['password'])
+        group_ids = self.create_groups(options['groups'])
+        self.text_pool = [
+            self.fake.paragraph(nb_sentences=5)
+            for _ in range(TEXT_POOL_SIZE)
+        ]
+        self.sentence_pool = [
+            self.fake.sentence() for _ in range(TEXT_POOL_SIZE)
+        ]
+        post_ids = self.create_posts(
+            options['posts'], user_ids, group_ids,
+            options['zipf'], options['group_ratio'],
+        )
+        group_stats.rebuild()
+        archive.rebuild()
+        self.create_comments(
+            options['comments'], user_ids, post_ids, options['zipf']
+        )
+        trending.rebuild()
+        self.create_follows(options['follows'], user_ids, options['zipf'])
+        follows.rebuild_follow_stats()
+
+    def get_end_datetime(self, end_date):
+        if end_date is None:
+            day = timezone.now().date()
+        else:
+            day = datetime.strptime(end_date, '%Y-%m-%d').date()
+        return timezone.make_aware(
+            datetime.combine(day, time.min), timezone.utc
+        )
+
+    def report(self, model, count):
+        self.stdout.write(
+            f'{model._meta.verbose_name_plural}: {count}'
+        )
+
+    def create_users(self, count, password):
+        first_id = next_id(User)
+        password = make_password(password)
+        users = []
+        for num in range(count):
+            users.append(User(
+                id=first_id + num,
+                username=f'{self.fake.user_name()}{first_id + num}',
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                password=password,
+            ))
+        User.objects.bulk_create(users)
+        self.report(User, count)
+        return list(range(first_id, first_id + count))
+
+    def create_groups(self, count):
+        first_id = next_id(Group)
+        groups = [
+            Group(
+                id=first_id + num,
+                title=self.fake.sentence(nb_words=3)[:200],
+                slug=f'group-{first_id + num}',
+                description=self.fake.paragraph(),
+            )
+            for num in range(count)
+        ]
+        Group.objects.bulk_create(groups)
+        self.report(Group, count)
+        return list(range(first_id, first_id + count))
+
+    def post_rows(self, count, user_ids, group_ids, exponent, group_ratio):
+        rng = self.rng
+        authors = list(user_ids)
+        rng.shuffle(authors)
+        cum_weights = zipf_cum_weights(len(authors), exponent)
+        step = self.span / max(count, 1)
+        start = self.end - self.span
+        for num in range(count):
+            author_id = rng.choices(authors, cum_weights=cum_weights)[0]
+            group_id = None
+            if group_ids and rng.random() < group_ratio:
+                group_id = rng.choice(group_ids)
+            text = '\n'.join(
+                rng.choice(self.text_pool)
+                for _ in range(rng.randint(1, 4))
+            )
+            pub_date = start + step * (num + rng.random())
+            rendered = render_post_text(text)
+            yield (
+                text,
+                *(rendered[name] for name in RENDERED_FIELDS),
+                connection.ops.adapt_datetimefield_value(pub_date),
+                author_id,
+                group_id,
+                '',
+            )
+
+    def create_posts(self, count, user_ids, group_ids, exponent,
+                     group_ratio):
+        """Посты в шардах их авторов; возвращает их id по порядку
+        дат публикации."""
+        columns = (
+            'id', 'text', *RENDERED_FIELDS, 'pub_date', 'author_id',
+            'group_id', 'image',
+        )
+        author = columns.index('author_id')
+        make_id = id_factory(Post, count)
+        post_ids = []
+
+        def rows():
+            for num, row in enumerate(self.post_rows(
+                count, user_ids, group_ids, exponent, group_ratio
+            )):
+                post_ids.append(make_id(num, row[author - 1]))
+                yield (post_ids[-1], *row)
+
+        bulk_insert(
+            Post,
+            columns,
+            rows(),
+            self.batch_size,
+            shard=lambda row: sharding.author_shard(row[author]),
+        )
+        self.report(Post, count)
+        return post_ids
+
+    def comment_rows(self, count, user_ids, post_ids, exponent):
+        rng = self.rng
+        if not post_ids:
+            return
+        cum_weights = zipf_cum_weights(len(post_ids), exponent)
+        # Номер поста по порядку дат: комментарий не старше поста.
+        indexes = list(range(len(post_ids)))
+        rng.shuffle(indexes)
+        step = self.span / max(len(post_ids), 1)
+        start = self.end - self.span
+        for _ in range(count):
+            index = rng.choices(indexes, cum_weights=cum_weights)[0]
+            created = start + step * (index + rng.random())
+            yield (
+                post_ids[index],
+                rng.choice(user_ids),
+                rng.choice(self.sentence_pool),
+                connection.ops.adapt_datetimefield_value(created),
+            )
+
+    def create_comments(self, count, user_ids, post_ids, exponent):
+        """Комментарии в шардах их постов."""
+        make_id = id_factory(Comment, count)
+        inserted = bulk_insert(
+            Comment,
+            ('id', 'post_id', 'author_id', 'text', 'created'),
+            (
+                (make_id(num, row[0]), *row)
+                for num, row in enumerate(self.comment_rows(
+                    count, user_ids, post_ids, exponent
+                ))
+            ),
+            self.batch_size,
+            shard=lambda row: sharding.id_shard(row[1]),
+        )
+        self.report(Comment, inserted)
+
+    def follow_rows(self, count, user_ids, exponent):
+        rng = self.rng
+        authors = list(user_ids)
+        rng.shuffle(authors)
+        cum_weights = zipf_cum_weights(len(authors), exponent)
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+        count = min(count, len(user_ids) * (len(user_ids) - 1))
+        max_attempts = count * 20
+        while count and max_attempts:
+            max_attempts -= 1
+            pair = (
+                rng.choice(user_ids),
+                rng.choices(authors, cum_weights=cum_weights)[0],
+            )
+            if pair[0] == pair[1] or pair in existing:
+                continue
+            existing.add(pair)
+            count -= 1
+            yield pair
+
+    def create_follows(self, count, user_ids, exponent):
+        inserted = bulk_insert(
+            Follow,
+            ('user_id', 'author_id'),
+            self.follow_rows(count, user_ids, exponent),
+            self.batch_size,
+        )
+        self.report(Follow, inserted)
@@ -0,0 +1,50 @@
+import csv
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует подписки из CSV со столбцами follower,author '
+        '(имена пользователей) пакетами на подписчика.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--unfollow', action='store_true',
+            help='Удалить перечисленные подписки вместо добавления.'
+        )
+
+    def handle(self, *args, **options):
+        with open(options['path'], encoding='utf-8', newline='') as file:
+            pairs = [
+                (row['follower'], row['author'])
+                for row in csv.DictReader(file)
+            ]
+        usernames = {name for pair in pairs for name in pair}
+        ids = dict(
+            User.objects.filter(username__in=usernames).values_list(
+                'username', 'pk'
+            )
+        )
+        unknown = usernames - ids.keys()
+        if unknown:
+            raise CommandError(
+                'Неизвестные пользователи: ' + ', '.join(sorted(unknown))
+            )
+        authors = defaultdict(list)
+        for follower, author in pairs:
+            authors[ids[follower]].append(ids[author])
+        write = follows.unfollow_many if options['unfollow'] else (
+            follows.follow_many
+        )
+        changed = sum(
+            len(write(user_id, author_ids))
+            for user_id, author_ids in authors.items()
+        )
+        self.stdout.write(f'Изменено подписок: {changed} из {len(pairs)}')
@@ -0,0 +1,228 @@
+import itertools
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import resolve, reverse
+
+from core.benchmarking import percentile
+from posts.models import Post, User
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Доли трафика по типам запросов.
+TRAFFIC_MIX = (
+    ('index', 0.80),
+    ('profile', 0.075),
+    ('post_detail', 0.075),
+    ('post_create', 0.025),
+    ('add_comment', 0.025),
+)
+
+
+class Stats:
+    """Задержки, ошибки и гистограмма по одному имени URL."""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.histogram = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+
+    def add(self, latency, ok):
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+        latency_ms = latency * 1000
+        for index, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if latency_ms <= bound:
+                break
+        else:
+            index = len(HISTOGRAM_BUCKETS_MS)
+        self.histogram[index] += 1
+
+    def summary(self):
+        count = len(self.latencies)
+        labels = [f'<={bound}ms' for bound in HISTOGRAM_BUCKETS_MS]
+        labels.append(f'>{HISTOGRAM_BUCKETS_MS[-1]}ms')
+        return {
+            'requests': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 4) if count else 0,
+            'p50_ms': round(percentile(self.latencies, 0.5) * 1000, 2),
+            'p95_ms': round(percentile(self.latencies, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 0.99) * 1000, 2),
+            'histogram': dict(zip(labels, self.histogram)),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочное тестирование запущенного сервера: смесь анонимных '
+        'чтений и авторизованных записей в несколько потоков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль пользователей для пишущих запросов.'
+        )
+        parser.add_argument(
+            '--sample', type=int, default=100,
+            help='Сколько авторов и постов взять из базы для запросов.'
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--json', dest='json_path', default=None)
+
+    def handle(self, *args, **options):
+        self.base_url = options['base_url']
+        self.password = options['password']
+        self.timeout = options['timeout']
+        self.local = threading.local()
+        self.logins = itertools.count()
+        rng = random.Random(options['seed'])
+
+        usernames = list(
+            User.objects.filter(posts__isnull=False).distinct()
+            .values_list('username', flat=True)[:options['sample']]
+        )
+        post_ids = list(
+            Post.objects.values_list('id', flat=True)[:options['sample']]
+        )
+        if not usernames or not post_ids:
+            raise CommandError(
+                'В базе нет постов, запустите generate_load_data.'
+            )
+        self.writers = usernames
+        kinds, weights = zip(*TRAFFIC_MIX)
+        plan = [
+            self.build_request(kind, rng, usernames, post_ids)
+            for kind in rng.choices(kinds, weights, k=options['requests'])
+        ]
+
+        stats = defaultdict(Stats)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for view_name, latency, ok in executor.map(self.send, plan):
+                stats[view_name].add(latency, ok)
+        elapsed = time.perf_counter() - start
+
+        report = {
+            'requests': len(plan),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(plan) / elapsed, 2),
+            'views': {
+                name: view_stats.summary()
+                for name, view_stats in sorted(stats.items())
+            },
+        }
+        self.print_report(report)
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def build_request(self, kind, rng, usernames, post_ids):
+        """Возвращает (метод, путь, данные, нужна ли авторизация)."""
+        if kind == 'index':
+            return 'get', reverse('posts:index'), None, False
+        if kind == 'profile':
+            path = reverse('posts:profile', args=(rng.choice(usernames),))
+            return 'get', path, None, False
+        if kind == 'post_detail':
+            post_id = rng.choice(post_ids)
+            path = reverse('posts:post_detail', args=(post_id,))
+            return 'get', path, None, False
+        if kind == 'post_create':
+            data = {'text': f'Пост нагрузочного теста {rng.random()}'}
+            return 'post', reverse('posts:post_create'), data, True
+        path = reverse('posts:add_comment', args=(rng.choice(post_ids),))
+        data = {'text': f'Комментарий нагрузочного теста {rng.random()}'}
+        return 'post', path, data, True
+
+    def session(self, authorized):
+        """Сессия текущего потока: анонимная или с выполненным входом."""
+        name = 'authorized' if authorized else 'anonymous'
+        session = getattr(self.local, name, None)
+        if session is None:
+            session = requests.Session()
+            if authorized:
+                self.login(session)
+            setattr(self.local, name, session)
+        return session
+
+    def login(self, session):
+        username = self.writers[next(self.logins) % len(self.writers)]
+        url = urljoin(self.base_url, reverse('users:login'))
+        session.get(url, timeout=self.timeout)
+        response = session.post(
+            url,
+            data={
+                'username': username,
+                'password': self.password,
+                'csrfmiddlewaretoken': session.cookies.get('csrftoken'),
+            },
+            headers={'Referer': url},
+            allow_redirects=False,
+            timeout=self.timeout,
+        )
+        if response.status_code != 302:
+            raise CommandError(f'Не удалось войти как {username}.')
+
+    def send(self, planned):
+        method, path, data, authorized = planned
+        view_name = resolve(path).view_name
+        url = urljoin(self.base_url, path)
+        headers = {}
+        try:
+            session = self.session(authorized)
+        except (requests.RequestException, CommandError):
+            return view_name, 0.0, False
+        start = time.perf_counter()
+        try:
+            if method == 'post':
+                data = dict(data)
+                data['csrfmiddlewaretoken'] = session.cookies.get('csrftoken')
+                headers['Referer'] = url
+            response = session.request(
+                method, url, data=data, headers=headers,
+                allow_redirects=False, timeout=self.timeout,
+            )
+            ok = response.status_code < 400 and not (
+                response.headers.get('Location', '').startswith(
+                    reverse('users:login')
+                )
+            )
+        except requests.RequestException:
+            ok = False
+        return view_name, time.perf_counter() - start, ok
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'Запросов: {report["requests"]}, '
+            f'время: {report["elapsed_s"]} с, '
+            f'пропускная способность: {report["throughput_rps"]} rps'
+        )
+        for name, summary in report['views'].items():
+            self.stdout.write(
+                f'{name}: {summary["requests"]} запросов, '
+                f'ошибки {summary["error_rate"]:.2%}, '
+                f'p50 {summary["p50_ms"]} мс, '
+                f'p95 {summary["p95_ms"]} мс, '
+                f'p99 {summary["p99_ms"]} мс'
+            )
+            self.stdout.write(
+                '  ' + ' '.join(
+                    f'{bucket}:{count}'
+                    for bucket, count in summary['histogram'].items()
+                    if count
+                )
+            )
@@ -0,0 +1,48 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.db.transaction import retry_on_locked
+from posts import cold_storage, sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит старые посты с комментариями из posts_post всех '
+        'шардов в архив короткими пакетами; прерванный перенос продолжается '
+        'следующим запуском.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.COLD_POSTS_AFTER_DAYS,
+            help='Переносить посты старше стольких дней.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=settings.COLD_POSTS_BATCH_SIZE,
+            help='Сколько постов переносить одной транзакцией.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=settings.COLD_POSTS_PAUSE,
+            help='Пауза между пакетами, секунды.'
+        )
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        batch_size = options['batch_size']
+        move = retry_on_locked(cold_storage.move)
+        moved = 0
+        for alias in sharding.shards():
+            while True:
+                count = move(before, batch_size, alias)
+                moved += count
+                if count:
+                    self.stdout.write(f'Перенесено постов: {moved}')
+                if count < batch_size:
+                    break
+                time.sleep(options['pause'])
+        self.stdout.write(f'Всего перенесено в архив: {moved}')
@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import purge
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет скрытых пользователей, сообщества и посты вместе с '
+        'зависимыми строками короткими пакетами и сообщает о ходе работы.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+            help='Сколько строк удалять одной транзакцией.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=settings.PURGE_PAUSE,
+            help='Пауза между пакетами, секунды.'
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а ждать новые задачи.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=settings.PURGE_INTERVAL,
+            help='Период проверки новых задач при --loop, секунды.'
+        )
+
+    def report(self, task, removed):
+        self.stdout.write(
+            f'{task}: этап {task.stage}, удалено {removed}, '
+            f'всего {task.removed}'
+        )
+
+    def run_pending(self, options):
+        done = 0
+        for task in purge.pending_tasks():
+            purge.run(
+                task, options['batch_size'], options['pause'], self.report
+            )
+            self.stdout.write(f'{task}: удаление завершено')
+            done += 1
+        return done
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            done = self.run_pending(options)
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        while True:
+            self.run_pending(options)
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты с комментариями в шарды их авторов после смены '
+        'POST_SHARDS короткими пакетами. Выводимый из работы шард должен '
+        'оставаться в DATABASES, пока перенос не закончится.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.PURGE_BATCH_SIZE,
+            help='Сколько постов переносить за шаг.'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=settings.PURGE_PAUSE,
+            help='Пауза между шагами, секунды.'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        for alias in settings.DATABASES:
+            if alias in settings.DATABASE_REPLICAS:
+                continue
+            moved = 0
+            while True:
+                count = sharding.rebalance(alias, batch_size)
+                moved += count
+                if count < batch_size:
+                    break
+                self.stdout.write(f'{alias}: перенесено {moved}')
+                time.sleep(options['pause'])
+            self.stdout.write(f'{alias}: перенесено постов {moved}')
+            total += moved
+        self.stdout.write(f'Всего перенесено: {total}')
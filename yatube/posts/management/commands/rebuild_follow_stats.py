@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import follows
+from posts.models import FollowStats
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики подписчиков и подписок (FollowStats) '
+        'по таблице подписок, например после загрузки подписок в обход '
+        'posts.follows.'
+    )
+
+    def handle(self, *args, **options):
+        follows.rebuild_follow_stats()
+        self.stdout.write(
+            f'Пересчитано счетчиков: {FollowStats.objects.count()}'
+        )
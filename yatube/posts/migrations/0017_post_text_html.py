@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:36
+
+from django.db import migrations, models
+
+from posts.models import render_post_text
+
+
+def render_text(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    fields = ('text_html', 'excerpt')
+    posts = []
+    for post in Post.objects.only('pk', 'text').iterator():
+        rendered = render_post_text(post.text)
+        for name in fields:
+            setattr(post, name, rendered[name])
+        posts.append(post)
+        if len(posts) == 500:
+            Post.objects.bulk_update(posts, fields)
+            posts = []
+    Post.objects.bulk_update(posts, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_auto_20220816_0116'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=30, verbose_name='Отрывок'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='text_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML текста'),
+        ),
+        migrations.RunPython(render_text, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+from posts.models import render_post_text
+
+
+def render_preview(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    fields = ('preview_html', 'preview_truncated')
+    posts = []
+    for post in Post.objects.only('pk', 'text').iterator():
+        rendered = render_post_text(post.text)
+        for name in fields:
+            setattr(post, name, rendered[name])
+        posts.append(post)
+        if len(posts) == 500:
+            Post.objects.bulk_update(posts, fields)
+            posts = []
+    Post.objects.bulk_update(posts, fields)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_post_text_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='preview_html',
+            field=models.TextField(blank=True, editable=False, verbose_name='HTML начала текста'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='preview_truncated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Текст обрезан'),
+        ),
+        migrations.RunPython(render_preview, migrations.RunPython.noop),
+    ]
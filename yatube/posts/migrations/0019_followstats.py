@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_follow_stats(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    FollowStats = apps.get_model('posts', 'FollowStats')
+    stats = {}
+    for user_id, author_id in Follow.objects.values_list(
+        'user_id', 'author_id'
+    ).iterator():
+        stats.setdefault(author_id, [0, 0])[0] += 1
+        stats.setdefault(user_id, [0, 0])[1] += 1
+    FollowStats.objects.bulk_create(
+        FollowStats(user_id=user_id, followers=followers, following=following)
+        for user_id, (followers, following) in stats.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0018_post_preview_html'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FollowStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='follow_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчики')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписки')),
+            ],
+            options={
+                'verbose_name': 'Счетчики подписок',
+                'verbose_name_plural': 'Счетчики подписок',
+            },
+        ),
+        migrations.RunPython(fill_follow_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:52
+
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_trending(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    TrendingEpoch = apps.get_model('posts', 'TrendingEpoch')
+    TrendingScore = apps.get_model('posts', 'TrendingScore')
+    now = time.time()
+    TrendingEpoch.objects.create(pk=1, epoch=now)
+    scores = defaultdict(float)
+    for post_id, created in Comment.objects.values_list(
+        'post_id', 'created'
+    ).iterator():
+        scores[post_id] += settings.TRENDING_WEIGHTS['comment'] * 2 ** (
+            (created.timestamp() - now) / settings.TRENDING_HALF_LIFE
+        )
+    TrendingScore.objects.bulk_create(
+        TrendingScore(post_id=post_id, score=score)
+        for post_id, score in scores.items()
+        if score >= settings.TRENDING_MIN_SCORE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_comment_ingest_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingEpoch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.FloatField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='posts.Post')),
+                ('score', models.FloatField(default=0, verbose_name='Рейтинг')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг поста',
+                'verbose_name_plural': 'Рейтинги постов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['score', 'post'], name='trending_score_idx'),
+        ),
+        migrations.RunPython(fill_trending, migrations.RunPython.noop),
+    ]
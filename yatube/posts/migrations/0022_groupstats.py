@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    GroupAuthor = apps.get_model('posts', 'GroupAuthor')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    stats = {}
+    rows = Post.objects.filter(group__isnull=False).values(
+        'group_id', 'author_id'
+    ).annotate(posts=Count('pk'), last_post=Max('pub_date')).order_by()
+    authors = []
+    for row in rows.iterator():
+        authors.append(GroupAuthor(
+            group_id=row['group_id'],
+            author_id=row['author_id'],
+            posts=row['posts'],
+        ))
+        group = stats.setdefault(
+            row['group_id'], GroupStats(group_id=row['group_id'])
+        )
+        group.posts += row['posts']
+        group.authors += 1
+        if group.last_post is None or row['last_post'] > group.last_post:
+            group.last_post = row['last_post']
+    GroupAuthor.objects.bulk_create(authors, batch_size=500)
+    GroupStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0021_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Посты')),
+                ('authors', models.PositiveIntegerField(default=0, verbose_name='Авторы')),
+                ('last_post', models.DateTimeField(blank=True, null=True, verbose_name='Последний пост')),
+            ],
+            options={
+                'verbose_name': 'Счетчики сообщества',
+                'verbose_name_plural': 'Счетчики сообществ',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group')),
+            ],
+            options={
+                'unique_together': {('group', 'author')},
+            },
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
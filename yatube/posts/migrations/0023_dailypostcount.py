@@ -0,0 +1,69 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:57
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_daily_post_counts(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    DailyPostCount = apps.get_model('posts', 'DailyPostCount')
+    counts = {}
+    for group_id, author_id, pub_date in Post.objects.values_list(
+        'group_id', 'author_id', 'pub_date'
+    ).iterator():
+        day = timezone.localdate(pub_date)
+        scopes = [('all', 0), ('author', author_id)]
+        if group_id is not None:
+            scopes.append(('group', group_id))
+        for scope, key in scopes:
+            counts[scope, key, day] = counts.get((scope, key, day), 0) + 1
+    DailyPostCount.objects.bulk_create(
+        (
+            DailyPostCount(scope=scope, key=key, day=day, posts=posts)
+            for (scope, key, day), posts in counts.items()
+        ),
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_groupstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPostCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('all', 'Все посты'), ('group', 'Сообщество'), ('author', 'Автор')], max_length=6)),
+                ('key', models.PositiveIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('posts', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Постов за день',
+                'verbose_name_plural': 'Постов за день',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date'], name='post_group_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date'], name='post_author_date_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailypostcount',
+            unique_together={('scope', 'key', 'day')},
+        ),
+        migrations.RunPython(
+            fill_daily_post_counts, migrations.RunPython.noop
+        ),
+    ]
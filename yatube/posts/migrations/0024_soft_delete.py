@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_dailypostcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeTask',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('group', 'Группа'), ('post', 'Пост')], max_length=5, verbose_name='Что удаляется')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id объекта')),
+                ('stage', models.CharField(blank=True, max_length=20, verbose_name='Этап')),
+                ('removed', models.PositiveIntegerField(default=0, verbose_name='Удалено строк')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+            ],
+            options={
+                'verbose_name': 'Фоновое удаление',
+                'verbose_name_plural': 'Фоновые удаления',
+                'ordering': ('pk',),
+            },
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0024_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdPost',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField(verbose_name='Текст поста')),
+                ('text_html', models.TextField(blank=True, verbose_name='HTML текста')),
+                ('excerpt', models.CharField(blank=True, max_length=30, verbose_name='Отрывок')),
+                ('preview_html', models.TextField(blank=True, verbose_name='HTML начала текста')),
+                ('preview_truncated', models.BooleanField(default=False, verbose_name='Текст обрезан')),
+                ('pub_date', models.DateTimeField()),
+                ('image', models.ImageField(blank=True, upload_to='posts/', verbose_name='Картинка')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cold_posts', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cold_posts', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Архивный пост',
+                'verbose_name_plural': 'Архивные посты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ColdComment',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('text', models.TextField()),
+                ('created', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cold_comments', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.ColdPost')),
+            ],
+            options={
+                'verbose_name': 'Архивный комментарий',
+                'verbose_name_plural': 'Архивные комментарии',
+                'ordering': ('-created',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='coldpost',
+            index=models.Index(fields=['pub_date'], name='coldpost_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0025_cold_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comment',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='comments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='author',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='posts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='group',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='Группа, к которой будет относиться пост', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='posts', to='posts.Group', verbose_name='Группа'),
+        ),
+        migrations.AlterField(
+            model_name='trendingscore',
+            name='post',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='trending', serialize=False, to='posts.Post'),
+        ),
+    ]
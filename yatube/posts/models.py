@@ -1,18 +1,58 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.template.defaultfilters import linebreaksbr
+from django.utils.text import Truncator
 
 User = get_user_model()
 
+EXCERPT_LENGTH = 30
+PREVIEW_LENGTH = 500
+RENDERED_FIELDS = ('text_html', 'excerpt', 'preview_html', 'preview_truncated')
+
+
+def render_post_text(text):
+    """Поля RENDERED_FIELDS для текста поста, как их выводят шаблоны."""
+    preview = Truncator(text).chars(PREVIEW_LENGTH)
+    return {
+        'text_html': linebreaksbr(text, autoescape=True),
+        'excerpt': Truncator(text).chars(EXCERPT_LENGTH),
+        'preview_html': linebreaksbr(preview, autoescape=True),
+        'preview_truncated': preview != text,
+    }
+
+
+class LiveManager(models.Manager):
+    """Менеджер без мягко удаленных записей (см. posts.purge)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
         help_text='Текст нового поста'
     )
+    text_html = models.TextField('HTML текста', blank=True, editable=False)
+    excerpt = models.CharField(
+        'Отрывок',
+        max_length=EXCERPT_LENGTH,
+        blank=True,
+        editable=False,
+    )
+    preview_html = models.TextField(
+        'HTML начала текста', blank=True, editable=False
+    )
+    preview_truncated = models.BooleanField(
+        'Текст обрезан', default=False, editable=False
+    )
     pub_date = models.DateTimeField(auto_now_add=True)
+    # Пост может лежать в шарде без пользователей и сообществ
+    # (posts.sharding), поэтому внешние ключи не проверяются базой.
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='posts',
     )
     group = models.ForeignKey(
@@ -20,6 +60,7 @@ class Post(models.Model):
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_constraint=False,
         related_name='posts',
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
@@ -31,19 +72,53 @@ class Post(models.Model):
         help_text='Загрузите сюда Ваше изображение'
     )
 
+    # Время мягкого удаления: пост скрыт и ждет posts.purge.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    # Пост из posts_post, а не из архива ColdPost.
+    archived = False
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        from .sharding import place  # sharding импортирует модели
+        shard = place(self)
+        if shard is not None:
+            kwargs.update(force_insert=True, using=shard)
+        for name, value in render_post_text(self.text).items():
+            setattr(self, name, value)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *RENDERED_FIELDS}
+        super().save(*args, **kwargs)
+
 
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=50, unique=True)
     description = models.TextField()
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Группа'
@@ -62,16 +137,32 @@ class Comment(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
+        db_constraint=False,
         related_name='comments',
     )
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
+    # Ключ комментария из очереди posts.comment_queue: повторный перенос
+    # той же записи не создает дубль.
+    ingest_key = models.CharField(
+        max_length=32,
+        unique=True,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
+    def save(self, *args, **kwargs):
+        from .sharding import place  # sharding импортирует модели
+        shard = place(self)
+        if shard is not None:
+            kwargs.update(force_insert=True, using=shard)
+        super().save(*args, **kwargs)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -97,3 +188,205 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'
+
+
+class FollowStats(models.Model):
+    """Счетчики подписок пользователя, их ведет posts.follows."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='follow_stats',
+    )
+    followers = models.PositiveIntegerField('Подписчики', default=0)
+    following = models.PositiveIntegerField('Подписки', default=0)
+
+    class Meta:
+        verbose_name = 'Счетчики подписок'
+        verbose_name_plural = 'Счетчики подписок'
+
+
+class TrendingScore(models.Model):
+    """Затухающий рейтинг вовлеченности поста, его ведет posts.trending.
+
+    Пост может лежать в шарде (posts.sharding), поэтому связь не
+    проверяется базой, а рейтинг удаляет posts.purge при скрытии поста.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        primary_key=True,
+        related_name='trending',
+    )
+    score = models.FloatField('Рейтинг', default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['score', 'post'], name='trending_score_idx'),
+        ]
+        verbose_name = 'Рейтинг поста'
+        verbose_name_plural = 'Рейтинги постов'
+
+
+class TrendingEpoch(models.Model):
+    """Момент, относительно которого хранятся рейтинги TrendingScore."""
+    epoch = models.FloatField()
+
+
+class GroupStats(models.Model):
+    """Счетчики сообщества, их ведет posts.group_stats."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts = models.PositiveIntegerField('Посты', default=0)
+    authors = models.PositiveIntegerField('Авторы', default=0)
+    last_post = models.DateTimeField('Последний пост', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Счетчики сообщества'
+        verbose_name_plural = 'Счетчики сообществ'
+
+
+class GroupAuthor(models.Model):
+    """Число постов автора в сообществе для счетчика авторов.
+
+    Без внешнего ключа на автора: строку удаляет posts.group_stats
+    вместе с последним постом автора в сообществе, в том числе при
+    удалении самого автора.
+    """
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='+',
+    )
+    posts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('group', 'author')
+
+
+class DailyPostCount(models.Model):
+    """Число постов за день в ленте, их ведет posts.archive.
+
+    Лента задается парой scope и key: ('all', 0) — все посты,
+    ('group', id сообщества), ('author', id автора).
+    """
+    SCOPES = (
+        ('all', 'Все посты'),
+        ('group', 'Сообщество'),
+        ('author', 'Автор'),
+    )
+
+    scope = models.CharField(max_length=6, choices=SCOPES)
+    key = models.PositiveIntegerField(default=0)
+    day = models.DateField()
+    posts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('scope', 'key', 'day')
+        verbose_name = 'Постов за день'
+        verbose_name_plural = 'Постов за день'
+
+
+class PurgeTask(models.Model):
+    """Фоновое удаление скрытого объекта и зависимых строк (posts.purge)."""
+    KINDS = (
+        ('user', 'Пользователь'),
+        ('group', 'Группа'),
+        ('post', 'Пост'),
+    )
+
+    kind = models.CharField('Что удаляется', max_length=5, choices=KINDS)
+    object_id = models.PositiveIntegerField('id объекта')
+    stage = models.CharField('Этап', max_length=20, blank=True)
+    removed = models.PositiveIntegerField('Удалено строк', default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+        verbose_name = 'Фоновое удаление'
+        verbose_name_plural = 'Фоновые удаления'
+
+    def __str__(self) -> str:
+        return f'{self.kind} {self.object_id}'
+
+
+class ColdPost(models.Model):
+    """Старый пост, перенесенный из posts_post (posts.cold_storage).
+
+    Поля и id те же, что у Post, поэтому пост находится по прежнему id.
+    """
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField('Текст поста')
+    text_html = models.TextField('HTML текста', blank=True)
+    excerpt = models.CharField(
+        'Отрывок', max_length=EXCERPT_LENGTH, blank=True
+    )
+    preview_html = models.TextField('HTML начала текста', blank=True)
+    preview_truncated = models.BooleanField('Текст обрезан', default=False)
+    pub_date = models.DateTimeField()
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cold_posts',
+    )
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='cold_posts',
+        verbose_name='Группа',
+    )
+    image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+
+    # Перед правкой или комментарием пост возвращается в posts_post
+    # (posts.cold_storage.restore).
+    archived = True
+
+    class Meta:
+        ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['pub_date'], name='coldpost_pub_date_idx'
+            ),
+        ]
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self) -> str:
+        return self.text[:15]
+
+
+class ColdComment(models.Model):
+    """Комментарий архивного поста, id тот же, что был у Comment."""
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ColdPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cold_comments',
+    )
+    text = models.TextField()
+    created = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
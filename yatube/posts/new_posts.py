@@ -0,0 +1,141 @@
+"""Счетчик новых постов в ленте для long-poll запросов.
+
+Клиент передает курсор самого нового поста на открытой странице —
+pub_date и id — и ждет, пока в ленте не появятся посты новее. id
+не растут со временем (при шардах posts.sharding их выдают блоками
+разные процессы), поэтому сравнивается пара (pub_date, id), и запрос
+идет в каждый шард ленты по индексу pub_date. БД опрашивается только
+после смены версии лент в кэше (post_cache.FEEDS_VERSION_KEY), которая
+меняется при каждом изменении постов. Пока версия прежняя, запрос
+опрашивает только кэш и не держит соединение с БД, но держит поток
+воркера, поэтому ожидание ограничено NEW_POSTS_MAX_WAIT (по умолчанию
+0 — ответ сразу, клиент повторяет запрос через NEW_POSTS_RETRY).
+Ответ содержит версию лент, с которой посчитаны посты; клиент
+возвращает ее в следующем запросе, и если версия не сменилась, ответ
+0 приходит без запроса к БД.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from . import follows, sharding
+from .models import Group, Post, User
+from .post_cache import FEEDS_VERSION_KEY, version
+
+FEEDS = ('index', 'group', 'author', 'follow')
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def feed_querysets(feed, key, user):
+    """Посты ленты по шардам; None, если ленты нет или она
+    недоступна user."""
+    if feed == 'index':
+        return sharding.everywhere(Post.objects.all())
+    if feed == 'group':
+        group_id = Group.objects.filter(slug=key).values_list(
+            'pk', flat=True
+        ).first()
+        if group_id is None:
+            return []
+        return sharding.everywhere(Post.objects.filter(group_id=group_id))
+    if feed == 'author':
+        author_id = User.objects.filter(username=key).values_list(
+            'pk', flat=True
+        ).first()
+        if author_id is None:
+            return []
+        return [sharding.author_posts(author_id)]
+    if feed == 'follow' and user.is_authenticated:
+        author_ids = list(follows.followed_ids(user.pk))
+        return [
+            sharding.on_shard(
+                Post.objects.filter(author_id__in=author_ids), alias
+            )
+            for alias in sharding.author_shards(author_ids)
+        ]
+    return None
+
+
+def format_cursor(pub_date, post_id):
+    delta = pub_date - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + (
+        delta.microseconds
+    )
+    return f'{micros}:{post_id}'
+
+
+def parse_cursor(cursor):
+    """'микросекунды pub_date:id' -> (pub_date, id); '0' — все посты.
+
+    ValueError, если курсор испорчен.
+    """
+    if cursor == '0':
+        return None
+    micros, post_id = cursor.split(':')
+    return (
+        EPOCH + datetime.timedelta(microseconds=int(micros)),
+        int(post_id),
+    )
+
+
+def latest_cursor(page_obj):
+    """Курсор самого нового поста первой страницы ленты или None."""
+    if page_obj.number != 1:
+        return None
+    posts = [(post.pub_date, post.id) for post in page_obj]
+    if not posts:
+        return '0'
+    return format_cursor(*max(posts))
+
+
+def newer(queryset, since):
+    if since is None:
+        return queryset
+    pub_date, post_id = since
+    return queryset.filter(
+        Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=post_id)
+    )
+
+
+def count_new(querysets, since):
+    """Число постов новее since, не больше NEW_POSTS_LIMIT."""
+    count = 0
+    for queryset in querysets:
+        if count >= settings.NEW_POSTS_LIMIT:
+            break
+        count += newer(queryset, since).order_by()[
+            :settings.NEW_POSTS_LIMIT - count
+        ].count()
+    return count
+
+
+def release_connections():
+    # Внутри транзакции (например, в тестах) соединение закрывать нельзя.
+    for alias in sharding.shards():
+        if not connections[alias].in_atomic_block:
+            connections[alias].close()
+
+
+def wait_new(querysets, since, timeout, seen=None):
+    """Ждет до timeout секунд появления постов новее since; возвращает
+    их число и версию лент, с которой оно посчитано. При версии seen
+    новых постов не было, и БД не опрашивается, пока версия прежняя."""
+    deadline = time.monotonic() + timeout
+    while True:
+        current = str(version(FEEDS_VERSION_KEY))
+        if current != seen:
+            count = count_new(querysets, since)
+            if count:
+                return count, current
+            seen = current
+        if time.monotonic() >= deadline:
+            return 0, seen
+        release_connections()
+        while str(version(FEEDS_VERSION_KEY)) == seen:
+            if time.monotonic() >= deadline:
+                return 0, seen
+            time.sleep(settings.NEW_POSTS_POLL_INTERVAL)
@@ -0,0 +1,366 @@
+"""Кэш постов для лент.
+
+Каждый пост хранится в кэше отдельной компактной записью с тем, что
+выводят ленты. Ленты кэшируют только списки id постов для страницы
+и собирают страницу одним cache.get_many, добирая из БД лишь
+отсутствующие в кэше посты. Списки id ключуются версиями лент, в которые
+входит пост: общей (главная лента) и версиями его сообщества и автора.
+Изменение поста сбрасывает только их, и ленты других сообществ
+и авторов остаются в кэше. У ленты подписок одна версия на читателя:
+изменение поста автора сбрасывает ее у всех его подписчиков, так что
+чтение ленты не зависит от числа подписок.
+
+Записи и версии сбрасываются сразу и еще раз после фиксации транзакции:
+иначе параллельный запрос успел бы закэшировать незафиксированное
+прежнее состояние поста.
+"""
+import hashlib
+import heapq
+import logging
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete
+from sorl.thumbnail import get_thumbnail
+
+from . import sharding
+from .models import ColdPost, Follow, Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Версия лент, в которые входят все посты; меняется с любым постом.
+FEEDS_VERSION_KEY = 'feeds_version'
+MODES = ('full', 'excerpt')
+# Меняется вместе с составом записи поста.
+ENTRY_VERSION = 2
+
+
+def post_key(post_id, mode=None):
+    mode = mode or settings.POST_LIST_MODE
+    return f'post:{ENTRY_VERSION}:{mode}:{post_id}'
+
+
+class CachedAuthor:
+    def __init__(self, author_id, username, full_name):
+        self.id = self.pk = author_id
+        self.username = username
+        self.full_name = full_name
+
+    def get_full_name(self):
+        return self.full_name
+
+
+class CachedGroup:
+    def __init__(self, slug, title):
+        self.slug = slug
+        self.title = title
+
+
+class CachedPost:
+    """Пост, собранный из записи кэша; атрибуты повторяют Post
+    в той мере, в какой их используют шаблоны лент."""
+
+    def __init__(self, entry):
+        (
+            self.id, self.pub_date, body_html, self.preview_truncated,
+            author_id, username, full_name, group_slug, group_title,
+            self.image, self.thumbnail_url,
+        ) = entry
+        self.pk = self.id
+        self.text_html = self.preview_html = None
+        if settings.POST_LIST_MODE == 'excerpt':
+            self.preview_html = body_html
+        else:
+            self.text_html = body_html
+        self.author = CachedAuthor(author_id, username, full_name)
+        self.group = None
+        if group_slug is not None:
+            self.group = CachedGroup(group_slug, group_title)
+
+
+def thumbnail_url(image):
+    if not image:
+        return ''
+    try:
+        return get_thumbnail(
+            image, THUMBNAIL_GEOMETRY, **THUMBNAIL_OPTIONS
+        ).url
+    except Exception:
+        # Как и тег {% thumbnail %}, не роняем страницу из-за картинки.
+        logger.exception('Не удалось создать миниатюру %s', image)
+        return ''
+
+
+def body_field():
+    if settings.POST_LIST_MODE == 'excerpt':
+        return 'preview_html'
+    return 'text_html'
+
+
+def entry_rows(queryset):
+    """Поля записей кэша. В шарде без пользователей (posts.sharding)
+    авторы и сообщества дочитываются из основной базы."""
+    if sharding.joins_users(queryset.db):
+        return list(queryset.values_list(
+            'id', 'pub_date', body_field(), 'preview_truncated',
+            'author_id', 'author__username', 'author__first_name',
+            'author__last_name', 'group__slug', 'group__title', 'image',
+        ))
+    rows = list(queryset.values_list(
+        'id', 'pub_date', body_field(), 'preview_truncated', 'author_id',
+        'group_id', 'image',
+    ))
+    authors = {
+        author_id: names for author_id, *names in User.objects.filter(
+            pk__in={row[4] for row in rows}
+        ).values_list('pk', 'username', 'first_name', 'last_name')
+    }
+    groups = {
+        group_id: names for group_id, *names in Group.all_objects.filter(
+            pk__in={row[5] for row in rows}
+        ).values_list('pk', 'slug', 'title')
+    }
+    return [
+        (*row[:5], *authors[row[4]], *groups.get(row[5], (None, None)),
+         row[6])
+        for row in rows if row[4] in authors
+    ]
+
+
+def lookups(missing):
+    yield from sharding.lookups(Post.objects.all(), missing)
+    yield ColdPost.objects.filter(pk__in=list(missing))
+
+
+def fetch_entries(ids):
+    """Записи кэша для постов ids: запрос к шарду поста, а для постов,
+    перенесенных в архив (posts.cold_storage), — еще один."""
+    entries = {}
+    missing = set(ids)
+    for queryset in lookups(missing):
+        if not missing:
+            break
+        for (
+            post_id, pub_date, body_html, preview_truncated, author_id,
+            username, first_name, last_name, group_slug, group_title,
+            image,
+        ) in entry_rows(queryset):
+            missing.discard(post_id)
+            entries[post_key(post_id)] = (
+                post_id, pub_date, body_html, preview_truncated, author_id,
+                username, f'{first_name} {last_name}'.strip(), group_slug,
+                group_title, image, thumbnail_url(image),
+            )
+    return entries
+
+
+def get_posts(ids):
+    """Посты в порядке ids: из кэша, недостающие — одним запросом."""
+    keys = {post_key(post_id): post_id for post_id in ids}
+    entries = cache.get_many(keys)
+    missing = [
+        post_id for key, post_id in keys.items() if key not in entries
+    ]
+    if missing:
+        fetched = fetch_entries(missing)
+        cache.set_many(fetched, settings.POST_CACHE_TIMEOUT)
+        entries.update(fetched)
+    return [CachedPost(entries[key]) for key in keys if key in entries]
+
+
+def version(key):
+    """Версия набора ключей; cache.delete(key) выдает новую."""
+    return cache.get_or_set(key, time.time, None)
+
+
+def versions(keys):
+    """Версии нескольких наборов одним обращением к кэшу."""
+    found = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def scope_key(scope, key):
+    """Ключ версии лент сообщества ('group') или автора ('author')."""
+    return f'feeds_version:{scope}:{key}'
+
+
+def post_scopes(group_id, author_id):
+    """Ключи версий лент, в которые входит пост."""
+    keys = [FEEDS_VERSION_KEY, scope_key('author', author_id)]
+    if group_id is not None:
+        keys.append(scope_key('group', group_id))
+    return keys
+
+
+class CachedFeed:
+    """Лента для Paginator: число постов и id страниц берутся из кэша.
+
+    `name` должно однозначно описывать queryset, например 'group:3',
+    а `versions` — перечислять ключи версий, которые меняются вместе
+    с его постами (по умолчанию FEEDS_VERSION_KEY).
+    """
+
+    def __init__(self, name, queryset, versions=(FEEDS_VERSION_KEY,)):
+        self.name = name
+        self.queryset = queryset
+        self.versions = list(versions)
+
+    def key(self, suffix):
+        stamp = ':'.join(str(value) for value in versions(self.versions))
+        if len(self.versions) > 1:
+            stamp = hashlib.md5(stamp.encode()).hexdigest()
+        return f'feed:{self.name}:{stamp}:{suffix}'
+
+    def count(self):
+        key = self.key('count')
+        count = cache.get(key)
+        if count is None:
+            count = self.total()
+            cache.set(key, count, settings.FEED_CACHE_TIMEOUT)
+        return count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        key = self.key(f'{item.start}:{item.stop}')
+        ids = cache.get(key)
+        if ids is None:
+            ids = self.page_ids(item)
+            cache.set(key, ids, settings.FEED_CACHE_TIMEOUT)
+        return get_posts(ids)
+
+    def total(self):
+        return self.queryset.count()
+
+    def page_ids(self, item):
+        return list(self.queryset.values_list('pk', flat=True)[item])
+
+
+class ShardedFeed(CachedFeed):
+    """Лента по всем шардам posts.sharding или по шардам `shards`.
+
+    `cold` — архивные посты того же отбора (posts.cold_storage): архив
+    сливается с лентой как еще один шард. Число постов — сумма по
+    шардам. Для страницы из каждого шарда читаются первые item.stop
+    постов, и списки сливаются по убыванию pub_date (k-way merge).
+    """
+
+    def __init__(self, name, queryset, shards=None,
+                 versions=(FEEDS_VERSION_KEY,), cold=None):
+        super().__init__(name, queryset, versions)
+        self.shards = sharding.shards() if shards is None else shards
+        self.cold = cold
+
+    def querysets(self):
+        querysets = [
+            sharding.on_shard(self.queryset, alias) for alias in self.shards
+        ]
+        if self.cold is not None:
+            querysets.append(self.cold)
+        return querysets
+
+    def total(self):
+        return sum(queryset.count() for queryset in self.querysets())
+
+    def page_ids(self, item):
+        heads = [
+            list(queryset.order_by('-pub_date', '-pk').values_list(
+                'pub_date', 'pk'
+            )[:item.stop])
+            for queryset in self.querysets()
+        ]
+        merged = heapq.merge(*heads, reverse=True)
+        page = islice(merged, item.start, item.stop)
+        return [post_id for _, post_id in page]
+
+
+def follow_feed_key(user_id):
+    return f'follow_feed_version:{user_id}'
+
+
+def follower_feed_keys(author_ids):
+    """Версии лент подписок всех подписчиков авторов author_ids."""
+    if not author_ids:
+        return []
+    return [
+        follow_feed_key(user_id)
+        for user_id in Follow.objects.filter(
+            author_id__in=set(author_ids)
+        ).values_list('user_id', flat=True).distinct()
+    ]
+
+
+def invalidate(keys):
+    """Удаляет keys сейчас и после фиксации текущей транзакции."""
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_posts(post_ids, scopes=(), authors=()):
+    """Сбрасывает записи постов, версии лент scopes (post_scopes)
+    и лент подписок на авторов authors, у которых появились или
+    пропали посты."""
+    invalidate([
+        post_key(post_id, mode) for post_id in post_ids for mode in MODES
+    ] + list(set(scopes)) + follower_feed_keys(authors))
+
+
+def post_changed(sender, instance, created=False, **kwargs):
+    scopes = post_scopes(instance.group_id, instance.author_id)
+    # Прежнее сообщество запоминает posts.group_stats.post_saving.
+    old_group_id = getattr(instance, '_saved_group_id', None)
+    if old_group_id is not None:
+        scopes.append(scope_key('group', old_group_id))
+    # Ленты подписок хранят только id постов: правка их не меняет.
+    added_or_deleted = created or kwargs['signal'] is post_delete
+    invalidate_posts(
+        [instance.pk], scopes,
+        [instance.author_id] if added_or_deleted else (),
+    )
+
+
+def group_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        invalidate_posts([
+            post_id
+            for posts in [
+                *sharding.everywhere(
+                    Post.objects.filter(group_id=instance.pk)
+                ),
+                ColdPost.objects.filter(group_id=instance.pk),
+            ]
+            for post_id in posts.values_list('pk', flat=True)
+        ])
+
+
+def author_changed(sender, instance, created=False, update_fields=None,
+                   **kwargs):
+    if created or (
+        update_fields is not None
+        and not {'username', 'first_name', 'last_name'} & set(update_fields)
+    ):
+        return
+    invalidate_posts([
+        post_id
+        for posts in (
+            sharding.author_posts(instance.pk),
+            ColdPost.objects.filter(author_id=instance.pk),
+        )
+        for post_id in posts.values_list('pk', flat=True)
+    ])
+
+
+def invalidate_follow_feed(user_id):
+    invalidate([follow_feed_key(user_id)])
@@ -0,0 +1,329 @@
+"""Мягкое удаление и фоновая очистка пользователей, сообществ и постов.
+
+Удаление в запросе только скрывает объект: пост и сообщество получают
+deleted_at и пропадают из менеджера objects, пользователь становится
+неактивным, — и ставит PurgeTask. Команда purge_deleted проходит этапы
+задачи и удаляет зависимые строки пакетами по PURGE_BATCH_SIZE, каждый
+пакет в своей короткой транзакции с паузой PURGE_PAUSE между ними,
+так что блокировка SQLite на запись держится не дольше одного пакета.
+Этап и число удаленных строк сохраняются после каждого пакета: по ним
+видно ход очистки, и прерванная задача продолжается с того же этапа.
+
+Счетчики (posts.group_stats, posts.archive, posts.trending) правятся
+в момент скрытия поста, поэтому обработчики удаления пропускают посты
+с deleted_at.
+"""
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.db.transaction import atomic_on, retry_on_locked
+
+from . import archive, follows, group_stats, sharding
+from .models import (
+    ColdComment, ColdPost, Comment, DailyPostCount, Follow, Group, Post,
+    PurgeTask, TrendingScore,
+)
+from .post_cache import invalidate_posts, post_scopes
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+def hide_post(post):
+    """Скрывает пост и убирает его из счетчиков; False, если он уже
+    скрыт."""
+    alias = sharding.primary(post._state.db)
+    with atomic_on(DEFAULT_DB_ALIAS, alias):
+        if not Post.objects.using(alias).filter(pk=post.pk).update(
+            deleted_at=timezone.now()
+        ):
+            return False
+        if post.group_id is not None:
+            group_stats.post_removed(
+                post.group_id, post.author_id, post.pub_date
+            )
+        archive.change(
+            archive.post_scopes(post.group_id, post.author_id),
+            post.pub_date, -1,
+        )
+        TrendingScore.objects.filter(post_id=post.pk).delete()
+    invalidate_posts(
+        [post.pk], post_scopes(post.group_id, post.author_id),
+        [post.author_id],
+    )
+    return True
+
+
+def delete_post(post):
+    """Скрывает пост и ставит задачу очистки одной транзакцией; при
+    блокировке SQLite транзакция повторяется целиком."""
+    def hide():
+        with atomic_on(DEFAULT_DB_ALIAS, sharding.primary(post._state.db)):
+            if hide_post(post):
+                PurgeTask.objects.create(kind='post', object_id=post.pk)
+
+    retry_on_locked(hide)()
+
+
+def delete_group(group):
+    with transaction.atomic():
+        if Group.objects.filter(pk=group.pk).update(
+            deleted_at=timezone.now()
+        ):
+            PurgeTask.objects.create(kind='group', object_id=group.pk)
+    group_stats.invalidate_directory()
+
+
+def delete_user(user):
+    if not user.is_active:
+        return
+    with transaction.atomic():
+        user.is_active = False
+        user.save(update_fields=['is_active'])
+        PurgeTask.objects.create(kind='user', object_id=user.pk)
+
+
+def batch_ids(queryset, size):
+    return list(queryset.order_by().values_list('pk', flat=True)[:size])
+
+
+def delete_comments(queryset, size):
+    ids = batch_ids(queryset, size)
+    if ids:
+        queryset.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def across_shards(queryset, size, batch):
+    """Выполняет batch(queryset, size) в шардах posts.sharding по
+    очереди, пока не наберется size строк."""
+    done = 0
+    for shard_queryset in sharding.everywhere(queryset):
+        if done == size:
+            break
+        done += batch(shard_queryset, size - done)
+    return done
+
+
+def post_shard(post_id):
+    return sharding.locate([post_id], Post.all_objects.all()).get(post_id)
+
+
+def remove_media(post):
+    """Удаляет картинку поста и ее миниатюры."""
+    if not post.image:
+        return
+    try:
+        delete_thumbnails(post.image)
+    except Exception:
+        logger.exception('Не удалось удалить картинку %s', post.image.name)
+
+
+def delete_posts(posts):
+    if not posts:
+        return 0
+    for post in posts:
+        remove_media(post)
+    Post.all_objects.using(sharding.primary(posts[0]._state.db)).filter(
+        pk__in=[post.pk for post in posts]
+    ).delete()
+    return len(posts)
+
+
+def post_comments(post_id, size):
+    alias = post_shard(post_id)
+    if alias is None:
+        return 0
+    return delete_comments(
+        sharding.on_shard(Comment.objects.filter(post_id=post_id), alias),
+        size,
+    )
+
+
+def post_finish(post_id, size):
+    alias = post_shard(post_id)
+    if alias is None:
+        return 0
+    return delete_posts(list(
+        sharding.on_shard(Post.all_objects.filter(pk=post_id), alias)
+    ))
+
+
+def detach_posts(queryset, size):
+    ids = batch_ids(queryset, size)
+    if ids:
+        queryset.filter(pk__in=ids).update(group=None)
+        # Лента удаляемого сообщества уже недоступна: сбрасываются
+        # только записи постов с его названием.
+        invalidate_posts(ids)
+    return len(ids)
+
+
+def group_detach_posts(group_id, size):
+    return across_shards(
+        Post.all_objects.filter(group_id=group_id), size, detach_posts
+    )
+
+
+def group_detach_cold_posts(group_id, size):
+    return detach_posts(ColdPost.objects.filter(group_id=group_id), size)
+
+
+def group_finish(group_id, size):
+    DailyPostCount.objects.filter(scope='group', key=group_id).delete()
+    deleted, _ = Group.all_objects.filter(pk=group_id).delete()
+    return deleted
+
+
+def user_hide_posts(user_id, size):
+    posts = list(sharding.author_posts(user_id).order_by()[:size])
+    for post in posts:
+        hide_post(post)
+    return len(posts)
+
+
+def user_comments(user_id, size):
+    return across_shards(
+        Comment.objects.filter(author_id=user_id), size, delete_comments
+    )
+
+
+def user_post_comments(user_id, size):
+    return delete_comments(
+        sharding.on_shard(
+            Comment.objects.filter(post__author_id=user_id),
+            sharding.author_shard(user_id),
+        ),
+        size,
+    )
+
+
+def user_posts(user_id, size):
+    return delete_posts(list(
+        sharding.author_posts(user_id, Post.all_objects.all()).order_by()[
+            :size
+        ]
+    ))
+
+
+def user_cold_comments(user_id, size):
+    return delete_comments(
+        ColdComment.objects.filter(author_id=user_id), size
+    )
+
+
+def user_cold_post_comments(user_id, size):
+    return delete_comments(
+        ColdComment.objects.filter(post__author_id=user_id), size
+    )
+
+
+def user_cold_posts(user_id, size):
+    """Архивные посты (posts.cold_storage) вычитаются из счетчиков
+    при удалении: скрытыми они не бывают."""
+    posts = list(ColdPost.objects.filter(author_id=user_id).order_by()[
+        :size
+    ])
+    for post in posts:
+        if post.group_id is not None:
+            group_stats.post_removed(
+                post.group_id, post.author_id, post.pub_date
+            )
+        archive.change(
+            archive.post_scopes(post.group_id, post.author_id),
+            post.pub_date, -1,
+        )
+        remove_media(post)
+    ColdPost.objects.filter(pk__in=[post.pk for post in posts]).delete()
+    invalidate_posts([post.pk for post in posts], [
+        key for post in posts
+        for key in post_scopes(post.group_id, post.author_id)
+    ], [user_id])
+    return len(posts)
+
+
+def user_follows(user_id, size):
+    rows = Follow.objects.filter(
+        Q(user_id=user_id) | Q(author_id=user_id)
+    ).order_by().values_list('user_id', 'author_id')[:size]
+    authors = defaultdict(list)
+    for follower_id, author_id in rows:
+        authors[follower_id].append(author_id)
+    return sum(
+        len(follows.unfollow_many(follower_id, author_ids))
+        for follower_id, author_ids in authors.items()
+    )
+
+
+def user_finish(user_id, size):
+    DailyPostCount.objects.filter(scope='author', key=user_id).delete()
+    deleted, _ = User.objects.filter(pk=user_id).delete()
+    return deleted
+
+
+# Этапы задач по порядку. Каждый этап удаляет не больше size строк за
+# вызов и повторяется, пока удаляет полный пакет; 'finish' удаляет сам
+# объект с оставшимися мелкими зависимостями и выполняется один раз.
+STAGES = {
+    'post': (('comments', post_comments), ('finish', post_finish)),
+    'group': (
+        ('detach_posts', group_detach_posts),
+        ('detach_cold_posts', group_detach_cold_posts),
+        ('finish', group_finish),
+    ),
+    'user': (
+        ('hide_posts', user_hide_posts),
+        ('comments', user_comments),
+        ('post_comments', user_post_comments),
+        ('posts', user_posts),
+        ('cold_comments', user_cold_comments),
+        ('cold_post_comments', user_cold_post_comments),
+        ('cold_posts', user_cold_posts),
+        ('follows', user_follows),
+        ('finish', user_finish),
+    ),
+}
+
+
+def run(task, batch_size=None, pause=None, report=None):
+    """Выполняет задачу до конца, продолжая с сохраненного этапа.
+
+    report(task, removed) вызывается после каждого пакета.
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    pause = settings.PURGE_PAUSE if pause is None else pause
+    stages = STAGES[task.kind]
+    names = [name for name, _ in stages]
+    start = names.index(task.stage) if task.stage in names else 0
+    for name, stage in stages[start:]:
+        task.stage = name
+        while True:
+            removed = retry_on_locked(transaction.atomic(stage))(
+                task.object_id, batch_size
+            )
+            task.removed += removed
+            task.save(update_fields=['stage', 'removed', 'updated'])
+            if report is not None:
+                report(task, removed)
+            if name == 'finish' or removed < batch_size:
+                break
+            time.sleep(pause)
+    task.finished = timezone.now()
+    task.save(update_fields=['finished', 'updated'])
+
+
+def pending_tasks():
+    return PurgeTask.objects.filter(finished__isnull=True)
+
+
+def pending_count():
+    return pending_tasks().count()
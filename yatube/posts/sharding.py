@@ -0,0 +1,334 @@
+"""Шарды постов: строки Post и Comment в нескольких базах по автору.
+
+У SQLite один писатель на файл, поэтому посты и комментарии можно
+разложить по базам POST_SHARDS: автор попадает в одну из BUCKETS
+корзин по author_id, корзина — в шард POST_SHARDS[bucket % N].
+Комментарий лежит в шарде своего поста. Пользователи, сообщества,
+подписки и счетчики остаются в основной базе, поэтому внешние ключи
+постов и комментариев на них не проверяются базой.
+
+id новых постов и комментариев выдаются из общей последовательности
+(файл SQLite POST_ID_SEQUENCE_PATH) блоками по POST_ID_BLOCK_SIZE
+и кодируют корзину: id = seq * BUCKETS + bucket. По id поста сразу
+виден его шард, так что страница поста и профиль читают один шард,
+а ленты собирают страницу слиянием первых постов каждого шарда
+(ShardedFeed в posts.post_cache). Посты, созданные до включения
+шардов или перенесенные rebalance_shards, ищутся по всем шардам,
+если в шарде по id их нет.
+
+С одним шардом 'default' (по умолчанию) роутер ничего не меняет,
+а id выдает сама база.
+"""
+import sqlite3
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Value
+from django.db.models.functions import Mod
+
+from core.db.pragmas import apply_pragmas
+
+from .models import Comment, Post
+
+BUCKETS = 64
+SHARDED_MODELS = ('post', 'comment')
+SEQUENCE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS id_sequence ('
+    ' name TEXT PRIMARY KEY, next INTEGER NOT NULL)'
+)
+SEQUENCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'FULL',
+    'busy_timeout': 5000,
+}
+
+_local = threading.local()
+_lock = threading.Lock()
+_blocks = {}
+
+
+def shards():
+    return settings.POST_SHARDS
+
+
+def enabled():
+    return len(shards()) > 1
+
+
+def bucket_shard(bucket):
+    return shards()[bucket % len(shards())]
+
+
+def author_shard(author_id):
+    return bucket_shard(author_id % BUCKETS)
+
+
+def id_shard(object_id):
+    return bucket_shard(object_id % BUCKETS)
+
+
+def author_shards(author_ids):
+    return {author_shard(author_id) for author_id in author_ids}
+
+
+def joins_users(alias):
+    """Можно ли в запросах к базе alias соединять посты с пользователями
+    и сообществами."""
+    return alias == DEFAULT_DB_ALIAS or alias in settings.DATABASE_REPLICAS
+
+
+def on_shard(queryset, alias):
+    """queryset в базе alias; для основной базы выбор реплики остается
+    за core.db.routers."""
+    if alias == DEFAULT_DB_ALIAS:
+        return queryset
+    return queryset.using(alias)
+
+
+def everywhere(queryset):
+    """queryset в каждом шарде."""
+    return [on_shard(queryset, alias) for alias in shards()]
+
+
+def author_posts(author_id, queryset=None):
+    """Посты автора из его шарда."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    return on_shard(
+        queryset.filter(author_id=author_id), author_shard(author_id)
+    )
+
+
+def by_home_shard(post_ids):
+    """{алиас: id} — шард, на который указывает id поста."""
+    by_shard = defaultdict(list)
+    for post_id in post_ids:
+        by_shard[id_shard(post_id)].append(post_id)
+    return by_shard
+
+
+def lookups(queryset, post_ids):
+    """Запросы для поиска постов post_ids по порядку: сначала в шарде
+    по id, затем во всех шардах. Генератор: второй круг выбирает только
+    не найденные к тому времени id из множества post_ids."""
+    for alias, ids in by_home_shard(post_ids).items():
+        yield on_shard(queryset.filter(pk__in=ids), alias)
+    if enabled():
+        for alias in shards():
+            if post_ids:
+                yield on_shard(queryset.filter(pk__in=list(post_ids)), alias)
+
+
+def locate(post_ids, queryset=None):
+    """Шарды постов post_ids: {id: алиас}."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    missing = set(post_ids)
+    found = {}
+    for lookup in lookups(queryset.order_by(), missing):
+        for post_id in list(lookup.values_list('pk', flat=True)):
+            found[post_id] = lookup.db
+            missing.discard(post_id)
+    return found
+
+
+def get_post(post_id, queryset=None):
+    """Пост по id из его шарда; None, если его нет."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    home = id_shard(post_id)
+    for alias in [home] + [alias for alias in shards() if alias != home]:
+        post = on_shard(queryset.filter(pk=post_id), alias).first()
+        if post is not None:
+            return post
+    return None
+
+
+def misplaced(alias):
+    """Посты базы alias, которые должны лежать в другом шарде."""
+    posts = Post.all_objects.using(alias)
+    if alias not in shards():
+        return posts
+    return posts.annotate(
+        shard=Mod(Mod('author_id', Value(BUCKETS)), Value(len(shards())))
+    ).exclude(shard=shards().index(alias))
+
+
+def delete_rows(alias, model, column, ids):
+    """DELETE без сигналов: строки не удаляются, а переезжают."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE {column} IN ({", ".join(["%s"] * len(ids))})',
+            ids,
+        )
+
+
+def rebalance(alias, size):
+    """Переносит до size постов базы alias с комментариями в шарды
+    их авторов; возвращает число перенесенных постов.
+
+    Сначала строки вставляются в шард автора, потом удаляются из alias,
+    поэтому прерванный перенос повторяется без потерь.
+    """
+    posts = list(misplaced(alias).order_by('pk')[:size])
+    targets = defaultdict(list)
+    for post in posts:
+        targets[author_shard(post.author_id)].append(post)
+    for target, target_posts in targets.items():
+        ids = [post.pk for post in target_posts]
+        comments = list(
+            Comment.objects.using(alias).filter(post_id__in=ids).order_by()
+        )
+        with transaction.atomic(using=target):
+            Post.all_objects.using(target).bulk_create(
+                target_posts, ignore_conflicts=True
+            )
+            Comment.objects.using(target).bulk_create(
+                comments, ignore_conflicts=True
+            )
+        with transaction.atomic(using=alias):
+            delete_rows(alias, Comment, 'post_id', ids)
+            delete_rows(alias, Post, 'id', ids)
+    return len(posts)
+
+
+def sequence_connection():
+    path = settings.POST_ID_SEQUENCE_PATH
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    if path not in connections:
+        conn = sqlite3.connect(path, isolation_level=None)
+        apply_pragmas(conn, SEQUENCE_PRAGMAS)
+        conn.execute(SEQUENCE_SCHEMA)
+        connections[path] = conn
+    return connections[path]
+
+
+def first_seq(model):
+    """Начало последовательности: выше id, уже выданных базами."""
+    last = max(
+        model._base_manager.using(alias).aggregate(last=Max('pk'))['last']
+        or 0
+        for alias in shards()
+    )
+    return last // BUCKETS + 1
+
+
+def reserve(model, size):
+    """Забирает из общей последовательности size номеров; возвращает
+    первый. Отдельное соединение не зависит от транзакций Django."""
+    name = model._meta.label_lower
+    conn = sequence_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT next FROM id_sequence WHERE name = ?', (name,)
+        ).fetchone()
+        start = first_seq(model) if row is None else row[0]
+        conn.execute(
+            'INSERT OR REPLACE INTO id_sequence (name, next) VALUES (?, ?)',
+            (name, start + size),
+        )
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+    return start
+
+
+def next_seq(model):
+    with _lock:
+        start, end = _blocks.get(model, (0, 0))
+        if start == end:
+            start = reserve(model, settings.POST_ID_BLOCK_SIZE)
+            end = start + settings.POST_ID_BLOCK_SIZE
+        _blocks[model] = (start + 1, end)
+    return start
+
+
+def bucket(instance):
+    if isinstance(instance, Comment):
+        return instance.post_id % BUCKETS
+    return instance.author_id % BUCKETS
+
+
+def assign_id(instance):
+    """Выдает id новой строке Post или Comment; True, если выдан."""
+    if instance.pk is not None or not enabled():
+        return False
+    instance.pk = next_seq(type(instance)) * BUCKETS + bucket(instance)
+    return True
+
+
+def primary(alias):
+    """Шард, в который пишут строки, прочитанные из базы alias."""
+    if alias in settings.DATABASE_REPLICAS:
+        return DEFAULT_DB_ALIAS
+    return alias
+
+
+def place(instance):
+    """Шард новой строки Post или Comment, которой выдан id; None, если
+    шарды выключены или строка уже сохранена. id, выданный неудачной
+    попыткой сохранения, остается за строкой при повторе."""
+    if not instance._state.adding or not enabled():
+        return None
+    assign_id(instance)
+    return instance_shard(instance)
+
+
+def instance_shard(instance):
+    if not instance._state.adding:
+        return primary(instance._state.db)
+    if isinstance(instance, Comment):
+        field = Comment._meta.get_field('post')
+        if field.is_cached(instance):
+            return primary(instance.post._state.db)
+        return id_shard(instance.post_id)
+    return author_shard(instance.author_id)
+
+
+class ShardRouter:
+    """Пишет Post и Comment в шард автора, читает из шарда экземпляра.
+
+    Запросы без экземпляра роутер не направляет: код, которому нужны
+    посты всех шардов, выбирает базу сам (on_shard, ShardedFeed).
+    """
+
+    def is_sharded(self, model):
+        return (
+            model._meta.app_label == 'posts'
+            and model._meta.model_name in SHARDED_MODELS
+        )
+
+    def db_for_read(self, model, instance=None, **hints):
+        if instance is None or not self.is_sharded(instance):
+            return None
+        alias = instance._state.db
+        if alias in (None, DEFAULT_DB_ALIAS):
+            return None
+        # Автор и сообщество поста из шарда лежат в основной базе.
+        return alias if self.is_sharded(model) else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, instance=None, **hints):
+        if (
+            not enabled()
+            or instance is None
+            or not self.is_sharded(model)
+            or not self.is_sharded(instance)
+        ):
+            return None
+        alias = instance_shard(instance)
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if self.is_sharded(obj1) or self.is_sharded(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db in settings.DATABASE_REPLICAS:
+            return None
+        return app_label == 'posts' and model_name in SHARDED_MODELS
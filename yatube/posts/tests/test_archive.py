@@ -0,0 +1,130 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import archive
+from ..models import DailyPostCount, Group, Post
+
+User = get_user_model()
+
+
+def moment(*date):
+    return timezone.make_aware(datetime.datetime(*date, 12))
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.dates = [
+            (2021, 12, 31), (2022, 1, 5), (2022, 1, 5), (2022, 3, 1),
+        ]
+        cls.posts = []
+        for num, date in enumerate(cls.dates):
+            post = Post.objects.create(
+                author=cls.author if num % 2 else cls.other,
+                text=f'Пост {num}',
+                group=cls.group if num else None,
+            )
+            # pub_date заполняется при создании, счетчики правятся заново.
+            archive.post_deleted(Post, post)
+            post.pub_date = moment(*date)
+            Post.objects.filter(pk=post.pk).update(pub_date=post.pub_date)
+            archive.post_saved(Post, post, created=True)
+            cls.posts.append(post)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_periods(self):
+        """Годы, месяцы и дни с числом постов берутся из счетчиков."""
+        self.assertEqual(
+            archive.periods('all', 0, 'year'),
+            [(datetime.date(2021, 1, 1), 1), (datetime.date(2022, 1, 1), 3)],
+        )
+        start, end = archive.period_bounds(2022)
+        self.assertEqual(
+            archive.periods('group', self.group.pk, 'month', start, end),
+            [(datetime.date(2022, 1, 1), 2), (datetime.date(2022, 3, 1), 1)],
+        )
+        start, end = archive.period_bounds(2022, 1)
+        with self.assertNumQueries(1):
+            days = archive.periods('author', self.author.pk, 'day',
+                                   start, end)
+        self.assertEqual(days, [(datetime.date(2022, 1, 5), 1)])
+
+    def test_counts_follow_delete_and_group_change(self):
+        """Удаление и перенос поста правят счетчики."""
+        post = self.posts[3]
+        post.group = None
+        post.save()
+        self.assertFalse(DailyPostCount.objects.filter(
+            scope='group', day=datetime.date(2022, 3, 1)
+        ).exists())
+        self.posts[1].delete()
+        self.assertEqual(
+            DailyPostCount.objects.get(
+                scope='all', day=datetime.date(2022, 1, 5)
+            ).posts,
+            1,
+        )
+
+    def test_change_skips_savepoint(self):
+        """Внутри транзакции поста счетчики пишутся одним запросом."""
+        with transaction.atomic(), self.assertNumQueries(1):
+            archive.change(
+                archive.post_scopes(self.group.pk, self.author.pk),
+                moment(2022, 3, 1), 1,
+            )
+
+    def test_rebuild_matches_incremental(self):
+        """Пересчет с нуля дает те же счетчики."""
+        rows = set(DailyPostCount.objects.values_list(
+            'scope', 'key', 'day', 'posts'
+        ))
+        archive.rebuild()
+        self.assertEqual(set(DailyPostCount.objects.values_list(
+            'scope', 'key', 'day', 'posts'
+        )), rows)
+
+    def test_views(self):
+        """Страницы архива показывают периоды и посты периода."""
+        response = self.client.get(reverse('posts:archive'))
+        self.assertEqual(
+            [url for _, _, url in response.context['periods']],
+            [reverse('posts:archive', args=(2021,)),
+             reverse('posts:archive', args=(2022,))],
+        )
+        self.assertIsNone(response.context['page_obj'])
+        response = self.client.get(
+            reverse('posts:group_archive', args=('test-slug', 2022, 1))
+        )
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(
+            [url for _, _, url in response.context['periods']],
+            [reverse('posts:group_archive', args=('test-slug', 2022, 1, 5))],
+        )
+        response = self.client.get(
+            reverse('posts:profile_archive', args=('other', 2021, 12, 31))
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            [self.posts[0].id],
+        )
+        self.assertEqual(response.context['periods'], [])
+        response = self.client.get(
+            reverse('posts:archive', args=(2022, 2, 30))
+        )
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,220 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import archive, cold_storage, group_stats, purge, trending
+from ..models import (
+    ColdComment, ColdPost, Comment, DailyPostCount, Group, GroupStats, Post,
+    TrendingScore
+)
+
+User = get_user_model()
+
+OLD = timezone.make_aware(datetime.datetime(2021, 3, 1, 12))
+
+
+def counters():
+    return (
+        set(DailyPostCount.objects.values_list(
+            'scope', 'key', 'day', 'posts'
+        )),
+        set(GroupStats.objects.values_list(
+            'group_id', 'posts', 'authors', 'last_post'
+        )),
+    )
+
+
+class ColdStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.old = []
+        for num in range(3):
+            post = Post.objects.create(
+                author=self.author, text=f'Старый пост {num}',
+                group=self.group,
+            )
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=OLD + datetime.timedelta(days=num)
+            )
+            self.old.append(post)
+        self.recent = Post.objects.create(
+            author=self.author, text='Новый пост', group=self.group
+        )
+        self.comment = Comment.objects.create(
+            post=self.old[0], author=self.reader, text='Комментарий'
+        )
+        trending.record([self.old[0].pk], 'comment')
+        group_stats.rebuild()
+        archive.rebuild()
+        self.before = timezone.now() - datetime.timedelta(days=30)
+
+    def test_move_keeps_ids_and_counters(self):
+        """Старые посты с комментариями переносятся пакетами под прежними
+        id, счетчики не меняются."""
+        expected = counters()
+        self.assertEqual(cold_storage.move(self.before, 2), 2)
+        self.assertEqual(cold_storage.move(self.before, 2), 1)
+        self.assertEqual(cold_storage.move(self.before, 2), 0)
+        self.assertEqual(
+            set(Post.objects.values_list('pk', flat=True)), {self.recent.pk}
+        )
+        self.assertEqual(
+            set(ColdPost.objects.values_list('pk', flat=True)),
+            {post.pk for post in self.old},
+        )
+        cold_comment = ColdComment.objects.get()
+        self.assertEqual(
+            (cold_comment.pk, cold_comment.post_id, cold_comment.text),
+            (self.comment.pk, self.old[0].pk, 'Комментарий'),
+        )
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(counters(), expected)
+        group_stats.rebuild()
+        archive.rebuild()
+        self.assertEqual(counters(), expected)
+
+    def test_archived_post_resolves_by_id(self):
+        """Страница архивного поста открывается по прежнему id
+        с правкой и комментариями."""
+        cold_storage.move(self.before, 10)
+        post = self.old[0]
+        self.client.force_login(self.author)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Старый пост 0')
+        self.assertContains(response, 'Комментарий')
+        self.assertContains(
+            response, reverse('posts:add_comment', args=(post.pk,))
+        )
+        self.assertContains(
+            response, reverse('posts:post_edit', args=(post.pk,))
+        )
+        self.assertEqual(response.context['posts_qty'], 4)
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:post_edit', args=(post.pk,))
+            ).status_code,
+            200,
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse('posts:post_detail', args=(10 ** 6,))
+            ).status_code,
+            404,
+        )
+
+    def test_comment_restores_post(self):
+        """Комментарий возвращает пост из архива вместе с прежними
+        комментариями, счетчики не меняются."""
+        cold_storage.move(self.before, 10)
+        expected = counters()
+        post = self.old[0]
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': 'Новый комментарий'},
+        )
+        self.assertFalse(ColdPost.objects.filter(pk=post.pk).exists())
+        self.assertFalse(ColdComment.objects.exists())
+        restored = Post.objects.get(pk=post.pk)
+        self.assertEqual(restored.pub_date, OLD)
+        self.assertEqual(
+            set(restored.comments.values_list('pk', 'text')),
+            {(self.comment.pk, 'Комментарий'),
+             (Comment.objects.latest('pk').pk, 'Новый комментарий')},
+        )
+        self.assertEqual(counters(), expected)
+        response = self.client.get(
+            reverse('posts:post_detail', args=(post.pk,))
+        )
+        self.assertContains(response, 'Новый комментарий')
+
+    def test_edit_restores_post(self):
+        """Правка возвращает пост из архива; чужой пост не трогается."""
+        cold_storage.move(self.before, 10)
+        post = self.old[1]
+        url = reverse('posts:post_edit', args=(post.pk,))
+        self.client.force_login(self.reader)
+        self.client.post(url, {'text': 'Чужая правка'})
+        self.assertTrue(ColdPost.objects.filter(pk=post.pk).exists())
+        self.client.force_login(self.author)
+        self.client.post(url, {'text': 'Правка', 'group': self.group.pk})
+        self.assertFalse(ColdPost.objects.filter(pk=post.pk).exists())
+        self.assertEqual(Post.objects.get(pk=post.pk).text, 'Правка')
+        self.assertEqual(cold_storage.move(self.before, 10), 1)
+
+    def test_delete_restores_post(self):
+        """Удаление архивного поста скрывает его и ставит в очередь."""
+        cold_storage.move(self.before, 10)
+        post = self.old[2]
+        self.client.force_login(self.author)
+        self.client.post(reverse('posts:post_delete', args=(post.pk,)))
+        self.assertFalse(ColdPost.objects.filter(pk=post.pk).exists())
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        self.assertTrue(Post.all_objects.filter(pk=post.pk).exists())
+
+    def test_feeds(self):
+        """Ленты и счетчик постов профиля учитывают архивные посты."""
+        cold_storage.move(self.before, 10)
+        expected = [self.recent.pk] + [post.pk for post in reversed(self.old)]
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    [post.pk for post in response.context['page_obj']],
+                    expected,
+                )
+        self.assertEqual(response.context['posts_qty'], 4)
+        response = self.client.get(
+            reverse('posts:group_archive', kwargs={
+                'slug': self.group.slug, 'year': 2021, 'month': 3,
+            })
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [post.pk for post in reversed(self.old)],
+        )
+        self.assertContains(response, 'Старый пост 2')
+
+    def test_purge_user_removes_archived_posts(self):
+        """Удаление пользователя удаляет и его архивные посты."""
+        cold_storage.move(self.before, 10)
+        purge.delete_user(self.author)
+        for task in purge.pending_tasks():
+            purge.run(task, 2, pause=0)
+        self.assertFalse(ColdPost.objects.exists())
+        self.assertFalse(ColdComment.objects.exists())
+        self.assertFalse(DailyPostCount.objects.exists())
+        self.assertFalse(GroupStats.objects.filter(posts__gt=0).exists())
+
+    def test_command(self):
+        """Команда переносит посты старше --days."""
+        out = StringIO()
+        call_command('move_cold_posts', days=30, batch_size=2, pause=0,
+                     stdout=out)
+        self.assertIn('Всего перенесено в архив: 3', out.getvalue())
+        self.assertEqual(ColdPost.objects.count(), 3)
@@ -0,0 +1,89 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from ..management.commands.benchmark_views import (
+    Command as BenchmarkViewsCommand
+)
+from ..models import Comment, Follow, FollowStats, Group, Post, User
+
+
+class GenerateLoadDataTests(TestCase):
+    options = {
+        'users': 20,
+        'groups': 3,
+        'posts': 200,
+        'comments': 100,
+        'follows': 30,
+        'end_date': '2022-08-16',
+        'stdout': StringIO(),
+    }
+
+    def snapshot(self):
+        return list(
+            Post.objects.order_by('id').values_list(
+                'text', 'pub_date', 'author__username', 'group__slug'
+            )
+        )
+
+    def test_creates_requested_rows(self):
+        """Команда создает заданное количество записей."""
+        call_command('generate_load_data', **self.options)
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(Follow.objects.count(), 30)
+        self.assertEqual(
+            sum(FollowStats.objects.values_list('followers', flat=True)), 30
+        )
+
+    def test_same_seed_gives_same_data(self):
+        """Одинаковый seed дает одинаковые данные."""
+        call_command('generate_load_data', seed=7, **self.options)
+        first = self.snapshot()
+        for model in (Follow, Comment, Post, Group, User):
+            model.objects.all().delete()
+        call_command('generate_load_data', seed=7, **self.options)
+        self.assertEqual(first, self.snapshot())
+
+    def test_skips_ids_of_soft_deleted_rows(self):
+        """Повторный запуск не берет id мягко удаленных постов и
+        сообществ."""
+        call_command('generate_load_data', **self.options)
+        for model in (Post, Group):
+            model.objects.filter(
+                pk=model.objects.order_by('-pk').values('pk')[:1]
+            ).update(deleted_at=timezone.now())
+        call_command('generate_load_data', **self.options)
+        self.assertEqual(Post.all_objects.count(), 400)
+        self.assertEqual(Group.all_objects.count(), 6)
+
+
+class BenchmarkViewsTests(TestCase):
+    def test_warm_cache_ignores_rate_limits(self):
+        """С --warm-cache больше 10 повторов post_create не упираются
+        в RATE_LIMITS."""
+        command = BenchmarkViewsCommand(stdout=StringIO())
+        results = command.run_scale(100, {
+            'verbosity': 0, 'seed': 0, 'iterations': 12,
+            'warm_cache': True,
+        })
+        self.assertEqual(results['post_create']['response_bytes'], 0)
+        self.assertEqual(
+            Post.objects.filter(text='Пост из бенчмарка').count(), 12
+        )
+
+
+class BackfillPostHtmlTests(TestCase):
+    def test_fills_missing_html(self):
+        """Команда заполняет пустые text_html и excerpt."""
+        author = User.objects.create_user(username='auth')
+        post = Post.objects.create(author=author, text='Раз\nдва')
+        Post.objects.filter(pk=post.pk).update(text_html='', excerpt='')
+        call_command('backfill_post_html', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Раз<br>два')
+        self.assertEqual(post.excerpt, 'Раз\nдва')
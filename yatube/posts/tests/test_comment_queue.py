@@ -0,0 +1,153 @@
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import metrics
+
+from .. import comment_queue
+from ..models import Comment, Post, TrendingScore
+
+User = get_user_model()
+
+
+@override_settings(COMMENT_INGESTION='queued', RATE_LIMIT_ENABLED=False)
+class CommentQueueTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {num}')
+            for num in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        comment_queue.connection().execute('DELETE FROM comment_queue')
+        self.author_client = self.client_class()
+        self.author_client.force_login(self.user)
+        self.reader_client = self.client_class()
+        self.reader_client.force_login(self.reader)
+
+    def comment(self, post, text):
+        self.author_client.post(
+            reverse('posts:add_comment', args=(post.id,)), {'text': text}
+        )
+
+    def detail(self, client, post):
+        response = client.get(reverse('posts:post_detail', args=(post.id,)))
+        return [comment.text for comment in response.context['comments']]
+
+    def test_comment_is_queued_and_shown_to_author(self):
+        """Комментарий ждет в очереди, но автор видит его сразу."""
+        post = self.posts[0]
+        self.comment(post, 'Из очереди')
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(comment_queue.depth(), 1)
+        self.assertEqual(self.detail(self.author_client, post), ['Из очереди'])
+        self.assertEqual(self.detail(self.reader_client, post), [])
+
+    def test_flush_writes_batch_and_invalidates_once_per_post(self):
+        """Перенос пишет пакет и сбрасывает кэш один раз на пост."""
+        first, second = self.posts
+        self.detail(self.reader_client, first)
+        for num in range(3):
+            self.comment(first, f'Первый {num}')
+        self.comment(second, 'Второй')
+        invalidate = mock.patch.object(
+            comment_queue, 'invalidate_comments',
+            wraps=comment_queue.invalidate_comments,
+        )
+        with CaptureQueriesContext(connection) as queries, invalidate as spy:
+            self.assertEqual(comment_queue.flush(100), 4)
+        inserts = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('INSERT')
+            and '"posts_comment"' in query['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
+        spy.assert_called_once_with({first.id, second.id})
+        self.assertEqual(comment_queue.depth(), 0)
+        self.assertEqual(first.comments.count(), 3)
+        self.assertEqual(
+            self.detail(self.reader_client, first),
+            ['Первый 2', 'Первый 1', 'Первый 0'],
+        )
+        self.assertEqual(
+            self.detail(self.author_client, first),
+            ['Первый 2', 'Первый 1', 'Первый 0'],
+        )
+
+    def test_flush_is_idempotent(self):
+        """Повторный перенос тех же записей не создает дубли и не
+        учитывается в trending второй раз."""
+        post = self.posts[0]
+        self.comment(post, 'Один раз')
+        rows = comment_queue.connection().execute(
+            'SELECT ingest_key, post_id, author_id, text, created'
+            ' FROM comment_queue'
+        ).fetchall()
+        comment_queue.flush(100)
+        comment_queue.connection().executemany(
+            'INSERT INTO comment_queue'
+            ' (ingest_key, post_id, author_id, text, created)'
+            ' VALUES (?, ?, ?, ?, ?)',
+            rows,
+        )
+        score = TrendingScore.objects.get(post=post).score
+        comment_queue.flush(100)
+        self.assertEqual(post.comments.count(), 1)
+        self.assertEqual(TrendingScore.objects.get(post=post).score, score)
+
+    def test_flush_skips_deleted_posts(self):
+        """Комментарии к удаленному посту отбрасываются."""
+        post = Post.objects.create(author=self.user, text='Удаляемый')
+        self.comment(post, 'Опоздал')
+        self.comment(self.posts[0], 'Успел')
+        post.delete()
+        self.assertEqual(comment_queue.flush(100), 2)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)), ['Успел']
+        )
+
+    def test_command_drains_queue_in_batches(self):
+        """flush_comments переносит всю очередь пакетами."""
+        for num in range(5):
+            self.comment(self.posts[0], f'Комментарий {num}')
+        call_command('flush_comments', batch_size=2, stdout=StringIO())
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertEqual(comment_queue.depth(), 0)
+
+    def test_depth_gauge(self):
+        """В режиме 'queued' длина очереди регистрируется как gauge."""
+        self.comment(self.posts[0], 'В очереди')
+        with mock.patch.dict(metrics._gauges, clear=True):
+            apps.get_app_config('posts').ready()
+            gauge = metrics._gauges[
+                metrics._key('yatube_queue_depth', {'queue': 'comments'})
+            ]
+            self.assertEqual(gauge(), 1)
+
+
+class DirectCommentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_direct_comment_invalidates_cached_list(self):
+        """В режиме 'direct' новый комментарий сразу виден всем."""
+        user = User.objects.create_user(username='auth')
+        post = Post.objects.create(author=user, text='Пост')
+        self.assertEqual(comment_queue.post_comments(post.id), [])
+        Comment.objects.create(post=post, author=user, text='Сразу')
+        self.assertEqual(
+            [c.text for c in comment_queue.post_comments(post.id)], ['Сразу']
+        )
@@ -0,0 +1,180 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follows
+from ..follows import followed_ids, is_following
+from ..models import Follow, FollowStats, Group, Post
+
+User = get_user_model()
+
+
+class FollowCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{num}')
+            for num in range(3)
+        ]
+        Follow.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_batch_lookup_uses_one_query(self):
+        """Проверка подписок на несколько авторов — один запрос, затем
+        ни одного."""
+        author_ids = [author.id for author in self.authors]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                is_following(self.user, author_ids), {self.authors[0].id}
+            )
+        with self.assertNumQueries(0):
+            is_following(self.user, author_ids)
+
+    def test_follow_views_reset_cached_set(self):
+        """Подписка и отписка сбрасывают закэшированное множество,
+        и оно перечитывается одним запросом."""
+        followed_ids(self.user.id)
+        author = self.authors[1]
+        self.client.get(reverse('posts:profile_follow', args=(author,)))
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                list(followed_ids(self.user.id)),
+                sorted([self.authors[0].id, author.id]),
+            )
+        self.client.get(
+            reverse('posts:profile_unfollow', args=(self.authors[0],))
+        )
+        self.assertEqual(list(followed_ids(self.user.id)), [author.id])
+
+    def test_feed_cards_show_follow_state(self):
+        """Карточки ленты показывают кнопку подписки на автора."""
+        for author in self.authors[:2]:
+            Post.objects.create(author=author, text='Тестовый пост')
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['following_ids'], {
+            self.authors[0].id
+        })
+        self.assertContains(
+            response,
+            reverse('posts:profile_unfollow', args=(self.authors[0],)),
+        )
+        self.assertContains(
+            response,
+            reverse('posts:profile_follow', args=(self.authors[1],)),
+        )
+
+
+class FollowServiceTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{num}')
+            for num in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_reports_change(self):
+        """Повторная подписка и подписка на себя ничего не меняют."""
+        author = self.authors[0]
+        self.assertTrue(follows.follow(self.user.pk, author.pk))
+        self.assertFalse(follows.follow(self.user.pk, author.pk))
+        self.assertFalse(follows.follow(self.user.pk, self.user.pk))
+        self.assertEqual(self.user.follower.count(), 1)
+        self.assertEqual(follows.follow_counts(author.pk), (1, 0))
+        self.assertEqual(follows.follow_counts(self.user.pk), (0, 1))
+
+    def test_unfollow_is_single_keyed_delete(self):
+        """Отписка — один DELETE по паре пользователь-автор."""
+        author = self.authors[0]
+        follows.follow(self.user.pk, author.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(follows.unfollow(self.user.pk, author.pk))
+        follow_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'posts_follow"' in query['sql']
+        ]
+        self.assertEqual(len(follow_queries), 1)
+        self.assertTrue(follow_queries[0].startswith('DELETE'))
+        self.assertFalse(follows.unfollow(self.user.pk, author.pk))
+        self.assertEqual(follows.follow_counts(author.pk), (0, 0))
+        self.assertEqual(follows.follow_counts(self.user.pk), (0, 0))
+
+    def test_follow_retry_writes_one_row(self):
+        """Блокировка SQLite после записи подписки повторяет всю
+        транзакцию: одна подписка и верные счетчики."""
+        author = self.authors[1]
+        update_counters = follows.update_counters
+        calls = []
+
+        def locked_once(*args):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return update_counters(*args)
+
+        self.client.force_login(self.user)
+        with mock.patch.object(
+            follows, 'update_counters', side_effect=locked_once
+        ):
+            self.client.get(reverse(
+                'posts:profile_follow', args=(author.username,)
+            ))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=author).count(), 1
+        )
+        self.assertEqual(follows.follow_counts(author.pk), (1, 0))
+
+    def test_rebuild_follow_stats(self):
+        """Пересчет счетчиков с нуля дает те же значения."""
+        follows.follow_many(self.user.pk, [a.pk for a in self.authors])
+        follows.follow(self.authors[0].pk, self.authors[1].pk)
+        rows = set(FollowStats.objects.values_list(
+            'user_id', 'followers', 'following'
+        ))
+        FollowStats.objects.all().delete()
+        call_command('rebuild_follow_stats', stdout=StringIO())
+        self.assertEqual(set(FollowStats.objects.values_list(
+            'user_id', 'followers', 'following'
+        )), rows)
+
+    def test_orm_follows_keep_counters(self):
+        """Подписки, созданные и удаленные через ORM, учитываются."""
+        author = self.authors[1]
+        follow = Follow.objects.create(user=self.user, author=author)
+        self.assertEqual(follows.follow_counts(author.pk), (1, 0))
+        follow.delete()
+        self.assertEqual(follows.follow_counts(author.pk), (0, 0))
+
+    def test_follow_group_authors(self):
+        """Подписка на всех авторов группы, кроме себя."""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        for author in self.authors[:2] + [self.user]:
+            Post.objects.create(author=author, text='Пост', group=group)
+        client = Client()
+        client.force_login(self.user)
+        client.get(reverse('posts:group_follow', args=(group.slug,)))
+        self.assertEqual(
+            set(self.user.follower.values_list('author_id', flat=True)),
+            {self.authors[0].pk, self.authors[1].pk},
+        )
+        self.assertEqual(follows.follow_counts(self.user.pk), (0, 2))
@@ -1,18 +1,21 @@
+import os
 import shutil
 import tempfile
+from unittest import mock
 
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from .. import trending
 from ..forms import CommentForm, PostForm
 from ..models import Comment, Group, Post
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -89,6 +92,42 @@ class PostFormTests(TestCase):
             ).exists()
         )
 
+    def test_post_create_retry_keeps_one_image(self):
+        """Повтор записи при блокировке SQLite не сохраняет картинку
+        второй раз."""
+        uploaded = SimpleUploadedFile(
+            name='retry.gif',
+            content=(
+                b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00'
+                b'\xff\x00\x2c\x00\x00\x00\x00\x01\x00\x01\x00'
+                b'\x00\x02\x00\x3b'
+            ),
+            content_type='image/gif'
+        )
+        do_insert = Post._do_insert
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return do_insert(*args, **kwargs)
+
+        with mock.patch.object(
+            Post, '_do_insert', autospec=True, side_effect=locked_once
+        ):
+            self.authorized_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост с повтором', 'image': uploaded},
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(Post.objects.filter(text='Пост с повтором').exists())
+        stored = [
+            name for name in os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+            if name.startswith('retry')
+        ]
+        self.assertEqual(stored, ['retry.gif'])
+
     def test_post_edit(self):
         """При отправке валидной формы с картинкой со страницы
         редактирования поста, происходит изменение поста в базе данных."""
@@ -179,3 +218,25 @@ class CommentFormTests(TestCase):
                     post=CommentFormTests.post
                 ).exists()
             )
+
+    def test_comment_retry_saves_one_comment(self):
+        """Блокировка SQLite после записи комментария повторяет всю
+        транзакцию, и комментарий сохраняется один раз."""
+        upsert = trending.upsert
+        calls = []
+
+        def locked_once(rows):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return upsert(rows)
+
+        with mock.patch.object(trending, 'upsert', side_effect=locked_once):
+            self.authorized_client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                data={'text': 'Комментарий с повтором'},
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            Comment.objects.filter(text='Комментарий с повтором').count(), 1
+        )
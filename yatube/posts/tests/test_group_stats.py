@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import group_stats
+from ..models import Group, GroupAuthor, GroupStats, Post
+
+User = get_user_model()
+
+
+class GroupStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.empty = Group.objects.create(
+            title='Пустая группа',
+            slug='empty',
+            description='Без постов',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, group=None):
+        stats = GroupStats.objects.filter(group=group or self.group).first()
+        if stats is None:
+            return 0, 0, None
+        return stats.posts, stats.authors, stats.last_post
+
+    def post(self, author=None, group=None):
+        return Post.objects.create(
+            author=author or self.author, text='Пост',
+            group=group or self.group,
+        )
+
+    def test_create_and_delete(self):
+        """Создание и удаление постов правят счетчики."""
+        first = self.post()
+        second = self.post()
+        third = self.post(author=self.other)
+        self.assertEqual(self.stats(), (3, 2, third.pub_date))
+        third.delete()
+        self.assertEqual(self.stats(), (2, 1, second.pub_date))
+        first.delete()
+        self.assertEqual(self.stats(), (1, 1, second.pub_date))
+        second.delete()
+        self.assertEqual(self.stats(), (0, 0, None))
+        self.assertFalse(GroupAuthor.objects.exists())
+
+    def test_move_between_groups(self):
+        """Перенос поста в другое сообщество переносит его в счетчиках."""
+        post = self.post()
+        post.group = self.empty
+        post.save()
+        self.assertEqual(self.stats(), (0, 0, None))
+        self.assertEqual(self.stats(self.empty), (1, 1, post.pub_date))
+        post.group = None
+        post.save()
+        self.assertEqual(self.stats(self.empty), (0, 0, None))
+
+    def test_edit_without_group_change_skips_counters(self):
+        """Правка текста не трогает счетчики."""
+        post = self.post()
+        post.text = 'Новый текст'
+        with self.assertNumQueries(1):
+            post.save(update_fields=['text'])
+        with self.assertNumQueries(2):
+            post.save()
+        self.assertEqual(self.stats(), (1, 1, post.pub_date))
+
+    def test_counters_skip_savepoint(self):
+        """Внутри транзакции поста счетчики пишутся двумя запросами
+        без savepoint."""
+        self.post()
+        with transaction.atomic(), self.assertNumQueries(2):
+            group_stats.post_added(
+                self.group.pk, self.author.pk, timezone.now()
+            )
+
+    def test_author_deletion(self):
+        """Удаление автора убирает его из счетчиков."""
+        self.post()
+        self.post(author=self.other)
+        User.objects.get(pk=self.other.pk).delete()
+        self.assertEqual(self.stats()[:2], (1, 1))
+
+    def test_rebuild_matches_incremental(self):
+        """Пересчет с нуля дает те же счетчики."""
+        self.post()
+        self.post(author=self.other)
+        self.post(group=self.empty)
+        expected = [self.stats(), self.stats(self.empty)]
+        group_stats.rebuild()
+        self.assertEqual([self.stats(), self.stats(self.empty)], expected)
+
+    def test_directory(self):
+        """Каталог показывает сообщества со счетчиками и кэшируется
+        до изменения счетчиков."""
+        self.post()
+        url = reverse('posts:group_index')
+        response = self.client.get(url)
+        groups = list(response.context['page_obj'])
+        self.assertEqual(groups, [self.group, self.empty])
+        self.assertContains(response, 'Постов: 1')
+        self.assertContains(response, 'Постов: 0')
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        self.post(author=self.other)
+        response = self.client.get(url)
+        self.assertContains(response, 'Авторов: 2')
@@ -27,6 +27,19 @@ class PostModelTest(TestCase):
         expected_object_name = post.text[:15]
         self.assertEqual(expected_object_name, str(post))
 
+    def test_text_is_rendered_on_save(self):
+        """При сохранении текст экранируется и разбивается на строки."""
+        post = Post.objects.create(
+            author=PostModelTest.user,
+            text='<b>Первая</b>\nвторая строка длинного тестового поста',
+        )
+        self.assertEqual(
+            post.text_html,
+            '&lt;b&gt;Первая&lt;/b&gt;<br>вторая строка длинного '
+            'тестового поста',
+        )
+        self.assertEqual(post.excerpt, '<b>Первая</b>\nвторая строка д…')
+
     def test_labels(self):
         labels = {
             (
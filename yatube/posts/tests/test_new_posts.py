@@ -0,0 +1,142 @@
+import datetime
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import new_posts
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class NewPostsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.first = Post.objects.create(author=cls.author, text='Первый')
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:new_posts')
+
+    def cursor(self, post):
+        return new_posts.format_cursor(post.pub_date, post.id)
+
+    def count(self, **params):
+        params.setdefault('since', self.cursor(self.first))
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['count']
+
+    def test_counts_posts_newer_than_since(self):
+        """Считаются только посты ленты новее since."""
+        Post.objects.create(author=self.author, text='В группе',
+                            group=self.group)
+        Post.objects.create(author=self.reader, text='Без группы')
+        self.assertEqual(self.count(), 2)
+        self.assertEqual(self.count(feed='group', key='test-slug'), 1)
+        self.assertEqual(self.count(feed='author', key='reader'), 1)
+        self.assertEqual(self.count(since=0, feed='author', key='auth'), 2)
+
+    def test_follow_feed(self):
+        """Лента подписок доступна только авторизованному."""
+        response = self.client.get(
+            self.url, {'feed': 'follow', 'since': 0}
+        )
+        self.assertEqual(response.status_code, 403)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.count(feed='follow', since=0), 1)
+
+    def test_cursor_uses_pub_date(self):
+        """Курсор сравнивает время публикации, а не id: пост с меньшим
+        id, но опубликованный позже, считается новым."""
+        later = Post.objects.create(author=self.author, text='Позже')
+        seen = Post.objects.create(author=self.author, text='Уже видели')
+        Post.objects.filter(pk=later.pk).update(
+            pub_date=seen.pub_date + datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(self.count(since=self.cursor(seen)), 1)
+        self.assertEqual(
+            new_posts.parse_cursor(self.cursor(self.first)),
+            (self.first.pub_date, self.first.id),
+        )
+
+    def test_bad_requests(self):
+        """Без since или с неизвестной лентой — 400."""
+        for params in ({}, {'since': 'x'}, {'since': 1, 'feed': 'nope'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(NEW_POSTS_RETRY=30)
+    def test_short_poll_by_default(self):
+        """По умолчанию запрос не ждет и сообщает клиенту паузу."""
+        with mock.patch.object(new_posts.time, 'sleep') as sleep:
+            response = self.client.get(self.url, {
+                'since': self.cursor(self.first), 'wait': 25,
+            })
+        sleep.assert_not_called()
+        self.assertEqual(response.json()['retry'], 30)
+
+    @override_settings(NEW_POSTS_MAX_WAIT=25)
+    def test_wait_returns_when_feed_changes(self):
+        """Ожидание заканчивается, как только появляется новый пост."""
+        def publish(seconds):
+            Post.objects.create(author=self.author, text='Новый')
+
+        with mock.patch.object(new_posts.time, 'sleep',
+                               side_effect=publish) as sleep:
+            self.assertEqual(self.count(wait=10), 1)
+        sleep.assert_called_once()
+
+    @override_settings(NEW_POSTS_POLL_INTERVAL=0.01)
+    def test_wait_polls_only_cache(self):
+        """Пока лента не менялась, БД не опрашивается."""
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                new_posts.wait_new(
+                    [Post.objects.all()],
+                    new_posts.parse_cursor(self.cursor(self.first)), 0.05,
+                )[0],
+                0,
+            )
+
+    def test_same_version_skips_count(self):
+        """Клиент возвращает версию лент; пока она прежняя, посты
+        не считаются."""
+        response = self.client.get(
+            self.url, {'since': self.cursor(self.first)}
+        )
+        params = {
+            'since': self.cursor(self.first),
+            'version': response.json()['version'],
+        }
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.json()['count'], 0)
+        self.assertEqual(response.json()['version'], params['version'])
+        Post.objects.create(author=self.author, text='Новый')
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertNotEqual(response.json()['version'], params['version'])
+
+    def test_feed_pages_link_endpoint(self):
+        """Первая страница ленты подписывается на новые посты."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            response.context['new_posts_since'], self.cursor(self.first)
+        )
+        self.assertContains(response, self.url)
+        page = mock.Mock(number=2)
+        self.assertIsNone(new_posts.latest_cursor(page))
@@ -0,0 +1,162 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import follows, purge
+from ..models import Group, Post
+from ..post_cache import (
+    CachedFeed, follow_feed_key, get_posts, post_key, scope_key, version
+)
+
+User = get_user_model()
+
+
+class PostCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(
+            username='auth', first_name='Лев', last_name='Толстой'
+        )
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {num}', group=cls.group
+            )
+            for num in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_get_posts_fetches_only_missing(self):
+        """Отсутствующие в кэше посты добираются одним запросом."""
+        first, second, third = self.posts
+        get_posts([first.id])
+        with self.assertNumQueries(1):
+            posts = get_posts([third.id, first.id, second.id])
+        self.assertEqual(
+            [post.id for post in posts], [third.id, first.id, second.id]
+        )
+        with self.assertNumQueries(0):
+            posts = get_posts([first.id])
+        self.assertEqual(posts[0].author.get_full_name(), 'Лев Толстой')
+        self.assertEqual(posts[0].group.slug, 'test-slug')
+
+    def test_warm_feed_needs_no_post_queries(self):
+        """Страница прогретой ленты собирается без запросов к постам."""
+        url = reverse('posts:group_list', args=(self.group.slug,))
+        self.client.get(url)
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_save_and_delete_invalidate(self):
+        """Изменение и удаление поста сразу видны в ленте."""
+        feed = CachedFeed('index', Post.objects.all())
+        self.assertEqual(len(feed[0:10]), 3)
+        post = self.posts[0]
+        post.text = 'Новый текст'
+        post.save()
+        self.assertIn('Новый текст', get_posts([post.id])[0].preview_html)
+        Post.objects.get(pk=self.posts[1].pk).delete()
+        self.assertEqual(len(feed[0:10]), 2)
+        self.assertEqual(feed.count(), 2)
+
+    def test_author_rename_invalidates(self):
+        """Смена имени автора обновляет его посты в кэше."""
+        get_posts([self.posts[0].id])
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Алексей'
+        user.save()
+        post = get_posts([self.posts[0].id])[0]
+        self.assertEqual(post.author.get_full_name(), 'Алексей Толстой')
+
+    def test_post_change_keeps_other_feeds(self):
+        """Изменение поста сбрасывает только ленты его сообщества
+        и автора, а перенос — и ленту прежнего сообщества."""
+        other_group = Group.objects.create(title='Другая', slug='other')
+        other_author = User.objects.create_user(username='other')
+        group_feed = CachedFeed(
+            'group', Post.objects.filter(group=self.group),
+            [scope_key('group', self.group.pk)],
+        )
+        other_feed = CachedFeed(
+            'other', Post.objects.filter(group=other_group),
+            [scope_key('group', other_group.pk)],
+        )
+        author_feed = CachedFeed(
+            'author', Post.objects.filter(author=other_author),
+            [scope_key('author', other_author.pk)],
+        )
+        keys = [feed.key('count') for feed in (other_feed, author_feed)]
+        group_key = group_feed.key('count')
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(
+            [feed.key('count') for feed in (other_feed, author_feed)], keys
+        )
+        self.assertNotEqual(group_feed.key('count'), group_key)
+        group_key = group_feed.key('count')
+        post.group = other_group
+        post.save()
+        self.assertNotEqual(group_feed.key('count'), group_key)
+        self.assertNotEqual(other_feed.key('count'), keys[0])
+
+    def test_follow_feed_has_one_version(self):
+        """Лента подписок читает одну версию, а пост автора сбрасывает
+        ее у подписчиков."""
+        reader, stranger = (
+            User.objects.create_user(username=name)
+            for name in ('reader', 'stranger')
+        )
+        follows.follow(stranger.pk, reader.pk)
+        for num in range(5):
+            follows.follow(
+                reader.pk, User.objects.create_user(username=f'a{num}').pk
+            )
+        follows.follow(reader.pk, self.user.pk)
+        self.client.force_login(reader)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 3)
+        self.assertEqual(
+            response.context['page_obj'].paginator.object_list.versions,
+            [follow_feed_key(reader.pk)],
+        )
+        stranger_version = version(follow_feed_key(stranger.pk))
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertIsNone(cache.get(follow_feed_key(reader.pk)))
+        self.assertEqual(
+            cache.get(follow_feed_key(stranger.pk)), stranger_version
+        )
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 4)
+        reader_version = version(follow_feed_key(reader.pk))
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertEqual(
+            cache.get(follow_feed_key(reader.pk)), reader_version
+        )
+        purge.hide_post(post)
+        self.assertIsNone(cache.get(follow_feed_key(reader.pk)))
+
+
+class PostCacheCommitTests(TransactionTestCase):
+    def test_invalidation_repeats_after_commit(self):
+        """Запись, закэшированная до фиксации изменения, сбрасывается
+        после нее."""
+        user = User.objects.create_user(username='auth')
+        post = Post.objects.create(author=user, text='Старый текст')
+        with transaction.atomic():
+            post.text = 'Новый текст'
+            post.save()
+            cache.set(post_key(post.pk), 'прежняя запись')
+        self.assertIsNone(cache.get(post_key(post.pk)))
@@ -0,0 +1,172 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import follows, purge
+from ..models import (
+    Comment, DailyPostCount, Follow, Group, GroupStats, Post, PurgeTask
+)
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+TEST_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, PURGE_PAUSE=0)
+class PurgeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='auth')
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group,
+            image=SimpleUploadedFile('purge.gif', TEST_GIF, 'image/gif'),
+        )
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, text=f'К {num}')
+            for num in range(5)
+        )
+
+    def run_tasks(self, batch_size=2):
+        reports = []
+        for task in purge.pending_tasks():
+            purge.run(task, batch_size,
+                      report=lambda task, removed: reports.append(removed))
+        return reports
+
+    def test_post_is_hidden_then_purged(self):
+        """Пост сразу скрыт и вычтен из счетчиков, строки и картинка
+        удаляются пакетами."""
+        image_path = self.post.image.path
+        purge.delete_post(self.post)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(GroupStats.objects.get(group=self.group).posts, 0)
+        self.assertFalse(DailyPostCount.objects.filter(posts__gt=0).exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+        self.assertEqual(self.run_tasks(), [2, 2, 1, 1])
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(os.path.exists(image_path))
+        self.assertEqual(GroupStats.objects.get(group=self.group).posts, 0)
+        task = PurgeTask.objects.get()
+        self.assertEqual((task.stage, task.removed), ('finish', 6))
+        self.assertIsNotNone(task.finished)
+
+    def test_user_purge(self):
+        """Пользователь удаляется со всеми постами, комментариями
+        и подписками."""
+        other = Post.objects.create(author=self.reader, text='Чужой')
+        Comment.objects.create(post=other, author=self.author, text='Мой')
+        follows.follow(self.author.pk, self.reader.pk)
+        follows.follow(self.reader.pk, self.author.pk)
+        purge.delete_user(self.author)
+        self.assertFalse(User.objects.get(pk=self.author.pk).is_active)
+
+        self.run_tasks()
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Post.all_objects.exclude(pk=other.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(follows.follow_counts(self.reader.pk), (0, 0))
+        self.assertFalse(
+            DailyPostCount.objects.filter(scope='author', key=self.author.pk)
+        )
+
+    def test_group_purge_keeps_posts(self):
+        """Удаление сообщества отвязывает посты, не удаляя их."""
+        purge.delete_group(self.group)
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,))
+        )
+        self.assertEqual(response.status_code, 404)
+        self.run_tasks()
+        self.assertFalse(Group.all_objects.exists())
+        self.assertIsNone(Post.objects.get(pk=self.post.pk).group_id)
+
+    def test_interrupted_task_resumes_stage(self):
+        """Прерванная задача продолжается с сохраненного этапа."""
+        purge.delete_post(self.post)
+        task = PurgeTask.objects.get()
+        task.stage = 'finish'
+        task.save()
+        self.run_tasks()
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(Comment.objects.count(), 0)
+
+    def test_command_and_view(self):
+        """Автор удаляет пост из view, команда дочищает."""
+        self.client.force_login(self.reader)
+        url = reverse('posts:post_delete', args=(self.post.pk,))
+        self.client.post(url)
+        self.assertTrue(Post.objects.filter(pk=self.post.pk).exists())
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.client.post(url)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        out = StringIO()
+        call_command('purge_deleted', batch_size=10, stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+
+    def test_delete_retry_keeps_purge_task(self):
+        """Блокировка SQLite при постановке задачи повторяет и скрытие:
+        пост скрыт, задача одна."""
+        do_insert = PurgeTask._do_insert
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return do_insert(*args, **kwargs)
+
+        self.client.force_login(self.author)
+        with mock.patch.object(
+            PurgeTask, '_do_insert', autospec=True, side_effect=locked_once
+        ):
+            self.client.post(
+                reverse('posts:post_delete', args=(self.post.pk,))
+            )
+        self.assertEqual(len(calls), 2)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(
+            PurgeTask.objects.filter(kind='post').count(), 1
+        )
+        self.assertEqual(GroupStats.objects.get(group=self.group).posts, 0)
@@ -0,0 +1,271 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import cold_storage, new_posts, sharding, trending
+from ..models import (
+    ColdComment, ColdPost, Comment, Follow, Group, GroupStats, Post
+)
+
+User = get_user_model()
+
+SHARDS = ['default', 'posts_1']
+
+
+@override_settings(POST_SHARDS=SHARDS, POSTS_PER_PAGE=3)
+class ShardingTests(TestCase):
+    databases = {'default', 'posts_1'}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        users = [
+            User.objects.create_user(username=f'user{num}')
+            for num in range(2)
+        ]
+        # Автор с четным id живет в 'default', с нечетным — в 'posts_1'.
+        cls.home, cls.away = sorted(
+            users, key=lambda user: user.pk % sharding.BUCKETS % 2
+        )
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def create_posts(self):
+        start = timezone.now() - datetime.timedelta(hours=1)
+        posts = []
+        for num in range(6):
+            post = Post.objects.create(
+                author=self.away if num % 2 else self.home,
+                text=f'Пост {num}', group=self.group,
+            )
+            post.pub_date = start + datetime.timedelta(minutes=num)
+            Post.objects.using(post._state.db).filter(pk=post.pk).update(
+                pub_date=post.pub_date
+            )
+            posts.append(post)
+        return posts[::-1]
+
+    def page_ids(self, url, page=1):
+        response = self.client.get(url, {'page': page})
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_posts_and_comments_live_in_author_shard(self):
+        """Пост и комментарии к нему пишутся в шард автора поста."""
+        post = Post.objects.create(author=self.away, text='Текст')
+        comment = Comment.objects.create(
+            post=post, author=self.home, text='Комментарий'
+        )
+        self.assertEqual(post._state.db, 'posts_1')
+        self.assertEqual(sharding.id_shard(post.pk), 'posts_1')
+        self.assertEqual(sharding.id_shard(comment.pk), 'posts_1')
+        self.assertTrue(
+            Comment.objects.using('posts_1').filter(pk=comment.pk).exists()
+        )
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        home_post = Post.objects.create(author=self.home, text='Текст')
+        self.assertTrue(Post.objects.filter(pk=home_post.pk).exists())
+
+    def test_ids_are_unique_across_shards(self):
+        """id постов уникальны во всех шардах."""
+        ids = [post.pk for post in self.create_posts()]
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_post_detail_and_comment(self):
+        """Страница поста и комментарий работают с постом из шарда."""
+        post = Post.objects.create(author=self.away, text='Текст')
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'},
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertEqual(response.context['post'].pk, post.pk)
+        self.assertEqual(response.context['posts_qty'], 1)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий'],
+        )
+        self.assertEqual(
+            response.context['comments'][0].author.username, 'reader'
+        )
+
+    def test_comment_retry_rolls_back_shard(self):
+        """Повтор после блокировки основной базы откатывает и запись
+        комментария в шарде."""
+        post = Post.objects.create(author=self.away, text='Текст')
+        upsert = trending.upsert
+        calls = []
+
+        def locked_once(rows):
+            calls.append(1)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return upsert(rows)
+
+        with mock.patch.object(trending, 'upsert', side_effect=locked_once):
+            self.client.post(
+                reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+                {'text': 'Комментарий'},
+            )
+        self.assertEqual(
+            Comment.objects.using('posts_1').filter(post_id=post.pk).count(),
+            1,
+        )
+
+    def test_feeds_merge_shards(self):
+        """Ленты собирают посты всех шардов по убыванию даты."""
+        expected = [post.pk for post in self.create_posts()]
+        Follow.objects.create(user=self.reader, author=self.home)
+        Follow.objects.create(user=self.reader, author=self.away)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.page_ids(url) + self.page_ids(url, 2), expected
+                )
+
+    def test_profile_reads_author_shard(self):
+        """Профиль показывает посты автора из его шарда."""
+        expected = [
+            post.pk for post in self.create_posts()
+            if post.author == self.away
+        ]
+        url = reverse(
+            'posts:profile', kwargs={'username': self.away.username}
+        )
+        self.assertEqual(self.page_ids(url), expected)
+
+    def test_new_posts_counts_every_shard(self):
+        """Счетчик новых постов видит посты всех шардов."""
+        posts = self.create_posts()
+        since = new_posts.format_cursor(posts[-1].pub_date, posts[-1].pk)
+        url = reverse('posts:new_posts')
+        for params, count in (
+            ({}, 5),
+            ({'feed': 'group', 'key': self.group.slug}, 5),
+            ({'feed': 'author', 'key': self.away.username}, 3),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, {'since': since, **params})
+                self.assertEqual(response.json()['count'], count)
+
+    def test_group_last_post_spans_shards(self):
+        """После удаления самого свежего поста время последнего поста
+        сообщества берется и из других шардов."""
+        away_post = Post.objects.create(
+            author=self.away, text='Раньше', group=self.group
+        )
+        away_post.pub_date -= datetime.timedelta(hours=1)
+        away_post.save()
+        newest = Post.objects.create(
+            author=self.home, text='Позже', group=self.group
+        )
+        newest.delete()
+        self.assertEqual(
+            GroupStats.objects.get(group=self.group).last_post,
+            away_post.pub_date,
+        )
+
+    def test_rebalance_moves_posts(self):
+        """rebalance_shards переносит посты и комментарии в шард автора,
+        а пост остается доступен по старому id."""
+        with self.settings(POST_SHARDS=['default']):
+            post = Post.objects.create(author=self.away, text='Старый пост')
+            Comment.objects.create(
+                post=post, author=self.home, text='Комментарий'
+            )
+        out = StringIO()
+        call_command('rebalance_shards', pause=0, stdout=out)
+        self.assertIn('Всего перенесено: 1', out.getvalue())
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        self.assertFalse(Comment.objects.filter(post_id=post.pk).exists())
+        self.assertEqual(
+            Comment.objects.using('posts_1').filter(post_id=post.pk).count(),
+            1,
+        )
+        self.assertEqual(sharding.get_post(post.pk)._state.db, 'posts_1')
+
+    def test_move_cold_posts_from_shard(self):
+        """move_cold_posts переносит в архив и посты других шардов."""
+        post = Post.objects.create(author=self.away, text='Старый пост')
+        Comment.objects.create(post=post, author=self.home, text='Комментарий')
+        Post.objects.using('posts_1').filter(pk=post.pk).update(
+            pub_date=timezone.now() - datetime.timedelta(days=400)
+        )
+        out = StringIO()
+        call_command('move_cold_posts', days=365, pause=0, stdout=out)
+        self.assertIn('Всего перенесено в архив: 1', out.getvalue())
+        self.assertFalse(
+            Post.objects.using('posts_1').filter(pk=post.pk).exists()
+        )
+        self.assertFalse(
+            Comment.objects.using('posts_1').filter(post_id=post.pk).exists()
+        )
+        self.assertTrue(ColdPost.objects.filter(pk=post.pk).exists())
+        self.assertEqual(
+            ColdComment.objects.filter(post_id=post.pk).count(), 1
+        )
+        self.assertEqual(cold_storage.get_post(post.pk).text, 'Старый пост')
+
+    def test_generate_load_data_fills_shards(self):
+        """generate_load_data пишет посты в шарды авторов, а комментарии
+        в шарды постов, с id из общей последовательности."""
+        call_command(
+            'generate_load_data', users=10, groups=2, posts=60,
+            comments=40, follows=5, stdout=StringIO(),
+        )
+        posts = {
+            alias: list(Post.objects.using(alias).values_list(
+                'pk', 'author_id'
+            ))
+            for alias in SHARDS
+        }
+        self.assertEqual(sum(len(rows) for rows in posts.values()), 60)
+        for alias, rows in posts.items():
+            for post_id, author_id in rows:
+                self.assertEqual(sharding.author_shard(author_id), alias)
+                self.assertEqual(sharding.id_shard(post_id), alias)
+        comments = {
+            alias: list(Comment.objects.using(alias).values_list(
+                'pk', 'post_id'
+            ))
+            for alias in SHARDS
+        }
+        self.assertEqual(sum(len(rows) for rows in comments.values()), 40)
+        for alias, rows in comments.items():
+            for comment_id, post_id in rows:
+                self.assertIn(post_id, dict(posts[alias]))
+                self.assertEqual(sharding.id_shard(comment_id), alias)
+        self.assertGreater(
+            sharding.reserve(Post, 1) * sharding.BUCKETS,
+            max(pk for rows in posts.values() for pk, _ in rows),
+        )
+
+    def test_router_migrates_only_posts_to_shards(self):
+        """В шарды попадают только таблицы постов и комментариев."""
+        router = sharding.ShardRouter()
+        self.assertTrue(router.allow_migrate('posts_1', 'posts', 'post'))
+        self.assertTrue(router.allow_migrate('posts_1', 'posts', 'comment'))
+        self.assertFalse(router.allow_migrate('posts_1', 'posts', 'group'))
+        self.assertFalse(router.allow_migrate('posts_1', 'auth', 'user'))
+        self.assertIsNone(router.allow_migrate('default', 'posts', 'group'))
@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import trending
+from ..models import Comment, Post, TrendingScore
+
+User = get_user_model()
+
+HALF_LIFE = settings.TRENDING_HALF_LIFE
+
+
+@override_settings(POSTS_PER_PAGE=2)
+class TrendingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {num}')
+            for num in range(4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_comment_updates_score(self):
+        """Новый комментарий поднимает пост в рейтинге."""
+        first, second = self.posts[:2]
+        Comment.objects.create(post=first, author=self.user, text='Раз')
+        Comment.objects.create(post=second, author=self.user, text='Два')
+        Comment.objects.create(post=second, author=self.user, text='Три')
+        self.assertEqual(
+            trending.page(None, 10)[0], [second.id, first.id]
+        )
+
+    def test_record_is_one_query(self):
+        """Событие записывается одним запросом и без кэша epoch."""
+        post = self.posts[0]
+        now = trending.epoch()
+        cache.clear()
+        with self.assertNumQueries(1):
+            trending.record([post.id, post.id], 'comment', now=now)
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(post=post).score,
+            2 * settings.TRENDING_WEIGHTS['comment'],
+        )
+
+    def test_recent_events_outweigh_old(self):
+        """Старые события затухают: свежий комментарий весит больше."""
+        old, new = self.posts[:2]
+        now = trending.epoch()
+        trending.record([old.id] * 3, 'comment', now=now)
+        trending.record([new.id], 'comment', now=now + 2 * HALF_LIFE)
+        self.assertEqual(trending.page(None, 10)[0], [new.id, old.id])
+
+    def test_cursor_pages_survive_compaction(self):
+        """Курсор ведет на следующую страницу и после сжатия."""
+        now = trending.epoch()
+        for rank, post in enumerate(self.posts):
+            trending.record([post.id] * (rank + 1), 'comment', now=now)
+        first_page, cursor = trending.page(None, 2)
+        trending.compact(now=now + HALF_LIFE)
+        second_page, last_cursor = trending.page(cursor, 2)
+        self.assertEqual(
+            first_page + second_page,
+            [post.id for post in reversed(self.posts)],
+        )
+        self.assertIsNone(last_cursor)
+
+    def test_compact_rescales_and_drops_faded(self):
+        """Сжатие делит рейтинги и удаляет затухшие."""
+        hot, faded = self.posts[:2]
+        now = trending.epoch()
+        trending.record([hot.id] * 64, 'comment', now=now)
+        trending.record([faded.id], 'comment', now=now)
+        deleted = trending.compact(now=now + 5 * HALF_LIFE)
+        self.assertEqual(deleted, 1)
+        self.assertAlmostEqual(
+            TrendingScore.objects.get(post=hot).score, 2.0
+        )
+
+    def test_rebuild_matches_incremental(self):
+        """Пересчет по комментариям дает тот же порядок."""
+        for rank, post in enumerate(self.posts):
+            for _ in range(rank):
+                Comment.objects.create(post=post, author=self.user, text='К')
+        incremental = trending.page(None, 10)[0]
+        call_command('compact_trending', rebuild=True, stdout=StringIO())
+        self.assertEqual(trending.page(None, 10)[0], incremental)
+
+    def test_view(self):
+        """Лента популярного показывает посты и ссылку на следующую
+        страницу."""
+        for post in self.posts[:3]:
+            Comment.objects.create(post=post, author=self.user, text='К')
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(len(response.context['posts']), 2)
+        cursor = response.context['next_cursor']
+        response = self.client.get(
+            reverse('posts:trending'), {'cursor': cursor}
+        )
+        self.assertEqual(len(response.context['posts']), 1)
+        self.assertIsNone(response.context['next_cursor'])
+        response = self.client.get(
+            reverse('posts:trending'), {'cursor': 'мусор'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -2,7 +2,6 @@ import shutil
 import tempfile
 
 from django import forms
-from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -13,7 +12,7 @@ from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
-TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -452,3 +451,34 @@ class PaginatorViewsTests(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.guest_client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+
+class PostListModeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.long_text = 'Длинный пост. ' * 100
+        cls.post = Post.objects.create(author=cls.user, text=cls.long_text)
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(POST_LIST_MODE='excerpt')
+    def test_excerpt_mode_shows_preview(self):
+        """В режиме отрывков лента не содержит полного текста."""
+        url = reverse('posts:profile', args=(self.user.username,))
+        response = self.client.get(url)
+        self.assertNotContains(response, self.long_text.strip())
+        self.assertContains(response, self.post.preview_html)
+        self.assertContains(
+            response, reverse('posts:post_detail', args=(self.post.id,)),
+        )
+        post = response.context['page_obj'][0]
+        self.assertIsNone(post.text_html)
+
+    @override_settings(POST_LIST_MODE='full')
+    def test_full_mode_shows_text(self):
+        """В полном режиме лента показывает весь текст."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, self.long_text.strip())
@@ -0,0 +1,155 @@
+"""Популярные посты: затухающий рейтинг, который ведется при записи.
+
+Событие веса w в момент t добавляет к рейтингу поста
+w * 2 ** ((t - epoch) / TRENDING_HALF_LIFE) (forward decay): поздние
+события весят экспоненциально больше ранних, поэтому порядок по
+сохраненному score в любой момент совпадает с порядком по рейтингу,
+затухшему к этому моменту. Запись — прибавка к одной строке, а индекс
+(score, post_id) делает таблицу отсортированной структурой: страница
+ленты — чтение нескольких строк индекса без агрегации комментариев.
+
+Сохраненные score растут со временем; compact_trending переносит epoch
+на текущий момент, пропорционально уменьшая все score, и удаляет
+затухшие строки. Курсор страницы помнит epoch и пересчитывается, если
+между запросами прошло сжатие.
+"""
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from . import sharding
+from .follows import table
+from .models import Comment, TrendingEpoch, TrendingScore
+
+EPOCH_KEY = 'trending_epoch'
+
+
+def decay(seconds):
+    """Множитель затухания за seconds секунд."""
+    return 2 ** (-seconds / settings.TRENDING_HALF_LIFE)
+
+
+def epoch():
+    value = cache.get(EPOCH_KEY)
+    if value is None:
+        state, _ = TrendingEpoch.objects.get_or_create(
+            pk=1, defaults={'epoch': time.time()}
+        )
+        value = state.epoch
+        cache.set(EPOCH_KEY, value, None)
+    return value
+
+
+def upsert(rows):
+    """Прибавляет рейтинги строк (вес, момент, post_id) в текущем epoch;
+    возвращает число записанных строк, 0 — если epoch еще не задан.
+    epoch читается тем же запросом, без отдельного чтения из БД."""
+    scores = table(TrendingScore)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {scores} (post_id, score) '
+            f'SELECT %s, %s * POWER(2, (%s - epoch) / %s) '
+            f'FROM {table(TrendingEpoch)} WHERE id = 1 '
+            'ON CONFLICT (post_id) DO UPDATE SET '
+            f'score = {scores}.score + excluded.score',
+            rows,
+        )
+        return cursor.rowcount
+
+
+def record(post_ids, kind, now=None):
+    """Учитывает по событию kind для каждого id из post_ids."""
+    counts = Counter(post_ids)
+    if not counts:
+        return
+    now = time.time() if now is None else now
+    weight = settings.TRENDING_WEIGHTS[kind]
+    rows = [
+        (post_id, weight * count, now, settings.TRENDING_HALF_LIFE)
+        for post_id, count in counts.items()
+    ]
+    if not upsert(rows):
+        epoch()
+        upsert(rows)
+
+
+def comment_created(sender, instance, created=False, **kwargs):
+    if created:
+        record([instance.post_id], 'comment')
+
+
+def post_deleted(sender, instance, **kwargs):
+    TrendingScore.objects.filter(post_id=instance.pk).delete()
+
+
+def parse_cursor(cursor):
+    """'epoch:score:post_id' -> (score в текущем epoch, post_id)."""
+    cursor_epoch, score, post_id = cursor.split(':')
+    score = float(score) * decay(epoch() - float(cursor_epoch))
+    return score, int(post_id)
+
+
+def page(cursor, size):
+    """id постов страницы по убыванию рейтинга и курсор следующей."""
+    rows = TrendingScore.objects.order_by('-score', '-post_id')
+    if cursor:
+        score, post_id = parse_cursor(cursor)
+        rows = rows.filter(score__lte=score).filter(
+            Q(score__lt=score) | Q(post_id__lt=post_id)
+        )
+    rows = list(rows.values_list('post_id', 'score')[:size + 1])
+    next_cursor = None
+    if len(rows) > size:
+        post_id, score = rows[size - 1]
+        next_cursor = f'{epoch()!r}:{score!r}:{post_id}'
+    return [post_id for post_id, _ in rows[:size]], next_cursor
+
+
+def compact(now=None):
+    """Переносит epoch на now и удаляет рейтинги ниже
+    TRENDING_MIN_SCORE; возвращает число удаленных строк."""
+    now = time.time() if now is None else now
+    with transaction.atomic():
+        state, _ = TrendingEpoch.objects.select_for_update().get_or_create(
+            pk=1, defaults={'epoch': now}
+        )
+        TrendingScore.objects.update(
+            score=F('score') * decay(now - state.epoch)
+        )
+        deleted, _ = TrendingScore.objects.filter(
+            score__lt=settings.TRENDING_MIN_SCORE
+        ).delete()
+        state.epoch = now
+        state.save(update_fields=['epoch'])
+    cache.delete(EPOCH_KEY)
+    return deleted
+
+
+def rebuild(now=None):
+    """Пересчитывает рейтинги по всем комментариям."""
+    now = time.time() if now is None else now
+    weight = settings.TRENDING_WEIGHTS['comment']
+    scores = defaultdict(float)
+    for comments in sharding.everywhere(Comment.objects.all()):
+        for post_id, created in comments.values_list(
+            'post_id', 'created'
+        ).iterator():
+            scores[post_id] += weight * decay(now - created.timestamp())
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingEpoch.objects.update_or_create(
+            pk=1, defaults={'epoch': now}
+        )
+        TrendingScore.objects.bulk_create(
+            (
+                TrendingScore(post_id=post_id, score=score)
+                for post_id, score in scores.items()
+                if score >= settings.TRENDING_MIN_SCORE
+            ),
+            batch_size=500,
+        )
+    cache.delete(EPOCH_KEY)
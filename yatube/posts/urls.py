@@ -4,16 +4,36 @@ from . import views
 
 app_name = 'posts'
 
+ARCHIVE_DATES = (
+    '',
+    '<int:year>/',
+    '<int:year>/<int:month>/',
+    '<int:year>/<int:month>/<int:day>/',
+)
+
 urlpatterns = [
     path('', views.index, name='index'),
     path('create/', views.post_create, name='post_create'),
+    path('new-posts/', views.new_posts_count, name='new_posts'),
+    path('trending/', views.trending_posts, name='trending'),
+    path('group/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
+    path(
+        'group/<slug:slug>/follow/',
+        views.group_follow,
+        name='group_follow'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/delete/',
+        views.post_delete,
+        name='post_delete'
+    ),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('follow/', views.follow_index, name='follow_index'),
     path(
@@ -28,3 +48,13 @@ urlpatterns = [
     ),
     path('profile/<str:username>/', views.profile, name='profile'),
 ]
+
+for prefix, name in (
+    ('', 'archive'),
+    ('group/<slug:slug>/', 'group_archive'),
+    ('profile/<str:username>/', 'profile_archive'),
+):
+    urlpatterns += [
+        path(f'{prefix}archive/{date}', views.archive_index, name=name)
+        for date in ARCHIVE_DATES
+    ]
@@ -1,22 +1,67 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, router
+from django.db.models import F
+from django.http import (
+    Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
+from django.urls import reverse
 from django.views.decorators.cache import cache_page
 
+from core.db.transaction import atomic_on, retry_on_locked
+from core.ratelimit import rate_limit
+
+from . import (
+    archive, cold_storage, comment_queue, follows, group_stats, new_posts,
+    purge, sharding, trending,
+)
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import ColdPost, Group, Post, User
+from .post_cache import (
+    FEEDS_VERSION_KEY, ShardedFeed, follow_feed_key, get_posts, scope_key,
+)
+
+
+def restored_post_or_404(post_id, queryset=None):
+    """Пост для записи: архивный (posts.cold_storage) сначала
+    возвращается в posts_post."""
+    post = sharding.get_post(post_id, queryset)
+    if post is None and retry_on_locked(cold_storage.restore)(post_id):
+        post = sharding.get_post(post_id, queryset)
+    if post is None:
+        raise Http404('Пост не найден.')
+    return post
+
+
+def author_feed(author_id):
+    """Посты автора из его шарда и из архива."""
+    return ShardedFeed(
+        f'author:{author_id}', Post.objects.filter(author_id=author_id),
+        shards=sharding.author_shards([author_id]),
+        versions=[scope_key('author', author_id)],
+        cold=ColdPost.objects.filter(author_id=author_id),
+    )
 
 
 @cache_page(20, key_prefix='index_page')
 def index(request):
     """Главная страница."""
-    post_list = Post.objects.select_related('group').all()
+    post_list = ShardedFeed(
+        'index', Post.objects.all(), cold=ColdPost.objects.all()
+    )
     paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     context = {
         'page_obj': page_obj,
+        'post_list_mode': settings.POST_LIST_MODE,
+        'new_posts_since': new_posts.latest_cursor(page_obj),
+        'following_ids': follows.is_following(
+            request.user, {post.author.id for post in page_obj}
+        ),
     }
     return render(request, 'posts/index.html', context)
 
@@ -24,50 +69,202 @@ def index(request):
 def group_posts(request, slug):
     """Обработка страниц сообществ отфильтрованных по группам."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = ShardedFeed(
+        f'group:{group.pk}', Post.objects.filter(group=group),
+        versions=[scope_key('group', group.pk)],
+        cold=ColdPost.objects.filter(group=group),
+    )
     paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'post_list_mode': settings.POST_LIST_MODE,
+        'new_posts_since': new_posts.latest_cursor(page_obj),
+        'following_ids': follows.is_following(
+            request.user, {post.author.id for post in page_obj}
+        ),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+def group_index(request):
+    """Каталог сообществ, недавно активные первыми."""
+    groups = Group.objects.select_related('stats').order_by(
+        F('stats__last_post').desc(nulls_last=True), 'title'
+    )
+    paginator = Paginator(groups, settings.GROUPS_PER_PAGE)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    context = {
+        'page_obj': page_obj,
+        'directory_version': group_stats.directory_version(),
+        'cache_timeout': settings.GROUP_DIRECTORY_CACHE_TIMEOUT,
+    }
+    return render(request, 'posts/group_index.html', context)
+
+
 def profile(request, username):
     """Обработка профайла пользователя."""
     author = get_object_or_404(User, username=username)
-    post_list = Post.objects.all().filter(author__username=username)
-    posts_qty = len(post_list)
+    post_list = author_feed(author.pk)
+    posts_qty = post_list.count()
     paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
-    following = False
-    user = request.user
-    if (
-        user.is_authenticated and request.user.follower.filter(
-            author=author
-        ).exists()
-    ):
-        following = True
+    following = author.pk in follows.is_following(request.user, [author.pk])
+    followers_qty, following_qty = follows.follow_counts(author.pk)
 
     context = {
         'author': author,
         'posts_qty': posts_qty,
+        'followers_qty': followers_qty,
+        'following_qty': following_qty,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'post_list_mode': settings.POST_LIST_MODE,
+        'new_posts_since': new_posts.latest_cursor(page_obj),
     }
     return render(request, 'posts/profile.html', context)
 
 
+# Уровни архива: вложенные периоды и формат их подписи.
+ARCHIVE_LEVELS = (('year', 'Y'), ('month', 'F Y'), ('day', 'd E Y'))
+DATE_PARTS = ('year', 'month', 'day')
+
+
+def archive_feed(slug, username):
+    """Лента архива: счетчики, имя URL, его аргументы, заголовок
+    и отбор постов."""
+    if slug is not None:
+        group = get_object_or_404(Group, slug=slug)
+        return ('group', group.pk, 'posts:group_archive', {'slug': slug},
+                group.title, {'group_id': group.pk})
+    if username is not None:
+        author = get_object_or_404(User, username=username)
+        return ('author', author.pk, 'posts:profile_archive',
+                {'username': username}, author.get_full_name(),
+                {'author_id': author.pk})
+    return ('all', 0, 'posts:archive', {}, 'Все посты', {})
+
+
+def archive_index(request, year=None, month=None, day=None, slug=None,
+                  username=None):
+    """Архив ленты: вложенные периоды с числом постов и посты периода."""
+    scope, key, url_name, url_kwargs, title, filters = archive_feed(
+        slug, username
+    )
+    date = [part for part in (year, month, day) if part is not None]
+    start = end = page_obj = None
+    if date:
+        try:
+            start, end = archive.period_bounds(*date)
+        except ValueError:
+            raise Http404('Такой даты нет.')
+        filters.update(
+            pub_date__gte=archive.aware(start),
+            pub_date__lt=archive.aware(end),
+        )
+        post_list = ShardedFeed(
+            f'archive:{scope}:{key}:{start}:{end}',
+            Post.objects.filter(**filters),
+            versions=[
+                FEEDS_VERSION_KEY if scope == 'all' else scope_key(scope, key)
+            ],
+            cold=ColdPost.objects.filter(**filters),
+        )
+        paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
+        page_obj = paginator.get_page(request.GET.get('page'))
+    periods = []
+    if len(date) < len(ARCHIVE_LEVELS):
+        kind = ARCHIVE_LEVELS[len(date)][0]
+        periods = [
+            (period, posts, reverse(url_name, kwargs={
+                **url_kwargs,
+                **dict(zip(DATE_PARTS, date + [getattr(period, kind)])),
+            }))
+            for period, posts in archive.periods(
+                scope, key, kind, start, end
+            )
+        ]
+    context = {
+        'title': title,
+        'start': start,
+        'period_format': ARCHIVE_LEVELS[len(date) - 1][1] if date else '',
+        'periods': periods,
+        'periods_format': ARCHIVE_LEVELS[min(len(date), 2)][1],
+        'page_obj': page_obj,
+        'post_list_mode': settings.POST_LIST_MODE,
+    }
+    return render(request, 'posts/archive.html', context)
+
+
+def trending_posts(request):
+    """Популярные посты, страницы по курсору."""
+    try:
+        post_ids, next_cursor = trending.page(
+            request.GET.get('cursor'), settings.POSTS_PER_PAGE
+        )
+    except ValueError:
+        return HttpResponseBadRequest()
+    posts = get_posts(post_ids)
+    context = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'post_list_mode': settings.POST_LIST_MODE,
+        'following_ids': follows.is_following(
+            request.user, {post.author.id for post in posts}
+        ),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def new_posts_count(request):
+    """Число постов ленты новее курсора since; с wait ждет их
+    появления. version — версия лент из прошлого ответа."""
+    feed = request.GET.get('feed', 'index')
+    try:
+        since = new_posts.parse_cursor(request.GET['since'])
+        wait = float(request.GET.get('wait', 0))
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+    if feed not in new_posts.FEEDS:
+        return HttpResponseBadRequest()
+    querysets = new_posts.feed_querysets(
+        feed, request.GET.get('key', ''), request.user
+    )
+    if querysets is None:
+        return HttpResponseForbidden()
+    wait = min(max(wait, 0), settings.NEW_POSTS_MAX_WAIT)
+    count, version = new_posts.wait_new(
+        querysets, since, wait, request.GET.get('version')
+    )
+    return JsonResponse({
+        'count': count,
+        'version': version,
+        'capped': count >= settings.NEW_POSTS_LIMIT,
+        # После долгого ожидания клиент может спросить снова сразу.
+        'retry': 0 if wait else settings.NEW_POSTS_RETRY,
+    })
+
+
 def post_detail(request, post_id):
     """Обработка страницы отдельного поста."""
-    post = get_object_or_404(Post, pk=post_id)
-    posts_qty = Post.objects.filter(author_id=post.author.id).count()
+    post = cold_storage.get_post(post_id)
+    if post is None:
+        raise Http404('Пост не найден.')
+    posts_qty = author_feed(post.author_id).count()
     form = CommentForm()
-    comments = Comment.objects.filter(post_id=post_id)
+    if post.archived:
+        comments = cold_storage.comments(post_id)
+    else:
+        comments = comment_queue.post_comments(post_id, post._state.db)
+    if (settings.COMMENT_INGESTION == 'queued' and not post.archived
+            and request.user.is_authenticated):
+        # Свои комментарии автор видит до переноса очереди в БД.
+        comments = comment_queue.pending(post_id, request.user) + comments
     context = {
         'post': post,
         'posts_qty': posts_qty,
@@ -77,7 +274,24 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def save_atomic(instance):
+    """Сохраняет instance вместе с записями его сигналов одной
+    транзакцией и повторяет ее целиком при блокировке SQLite.
+
+    Повторяется только запись в БД: картинка поста сохраняется в
+    хранилище при первой попытке, и копия файла не появляется.
+    """
+    alias = router.db_for_write(type(instance), instance=instance)
+
+    def save():
+        with atomic_on(DEFAULT_DB_ALIAS, alias):
+            instance.save()
+
+    retry_on_locked(save)()
+
+
 @login_required
+@rate_limit('post_create')
 def post_create(request):
     """Создание новой записи."""
     form = PostForm()
@@ -90,7 +304,7 @@ def post_create(request):
         if form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            save_atomic(post)
             return redirect(
                 'posts:profile',
                 username=request.user.get_username()
@@ -101,22 +315,26 @@ def post_create(request):
 
 @login_required
 def post_edit(request, post_id):
-    """Редактирование поста."""
-    post = get_object_or_404(Post, pk=post_id)
-    form = PostForm(
-        request.POST or None,
-        files=request.FILES or None,
-        instance=post
-    )
-
+    """Редактирование поста; архивный пост перед сохранением
+    возвращается из архива."""
+    post = cold_storage.get_post(post_id)
+    if post is None:
+        raise Http404('Пост не найден.')
     if request.user != post.author:
         return redirect(
             'posts:post_detail',
             post_id=post_id
         )
+    if post.archived and request.method == 'POST':
+        post = restored_post_or_404(post_id)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        instance=post
+    )
 
     if form.is_valid():
-        post.save()
+        save_atomic(post)
         return redirect(
             'posts:post_detail',
             post_id=post_id
@@ -130,15 +348,35 @@ def post_edit(request, post_id):
 
 
 @login_required
+@require_POST
+def post_delete(request, post_id):
+    """Удаление поста: пост сразу скрывается, строки удаляются в фоне."""
+    post = cold_storage.get_post(post_id)
+    if post is None:
+        raise Http404('Пост не найден.')
+    if request.user != post.author:
+        return redirect('posts:post_detail', post_id=post_id)
+    if post.archived:
+        post = restored_post_or_404(post_id)
+    purge.delete_post(post)
+    return redirect('posts:profile', username=request.user.get_username())
+
+
+@login_required
+@rate_limit('add_comment')
 def add_comment(request, post_id):
     """Добавление комментариев к поссту."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = restored_post_or_404(post_id, Post.objects.only('pk'))
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and settings.COMMENT_INGESTION == 'queued':
+        retry_on_locked(comment_queue.enqueue)(
+            post.pk, request.user.pk, form.cleaned_data['text']
+        )
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        save_atomic(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -146,12 +384,21 @@ def add_comment(request, post_id):
 def follow_index(request):
     """Вывод ленты постов автора, на которого
     подписан текущий пользователь."""
-    post_list = Post.objects.filter(author__following__user=request.user)
+    author_ids = list(follows.followed_ids(request.user.pk))
+    post_list = ShardedFeed(
+        f'follow:{request.user.pk}',
+        Post.objects.filter(author_id__in=author_ids),
+        shards=sharding.author_shards(author_ids),
+        versions=[follow_feed_key(request.user.pk)],
+        cold=ColdPost.objects.filter(author_id__in=author_ids),
+    )
     paginator = Paginator(post_list, settings.POSTS_PER_PAGE)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     context = {
         'page_obj': page_obj,
+        'post_list_mode': settings.POST_LIST_MODE,
+        'new_posts_since': new_posts.latest_cursor(page_obj),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -159,26 +406,25 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     """Подписка на интересующего автора."""
-    author = get_object_or_404(User, username=username)
-    if request.user == author:
-        return redirect('posts:follow_index')
-
-    Follow.objects.get_or_create(
-        user=request.user,
-        author=author
-    )
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    retry_on_locked(follows.follow)(request.user.pk, author.pk)
     return redirect('posts:follow_index')
 
 
 @login_required
 def profile_unfollow(request, username):
     """Отписка от неинтересующего автора."""
-    follow = (
-        Follow.objects.filter(
-            user=request.user
-        ).filter(
-            author__username=username
-        )
-    )
-    follow.delete()
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    if author_id is not None:
+        retry_on_locked(follows.unfollow)(request.user.pk, author_id)
     return redirect('posts:follow_index')
+
+
+@login_required
+def group_follow(request, slug):
+    """Подписка на всех авторов сообщества."""
+    group = get_object_or_404(Group, slug=slug)
+    retry_on_locked(follows.follow_group_authors)(request.user.pk, group)
+    return redirect('posts:group_list', slug=slug)
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend, который берет request.user из кэша.
+
+    Запись сбрасывается при сохранении и удалении пользователя,
+    в том числе при смене пароля и обновлении last_login.
+    Изменения через QuerySet.update() кэш не видит.
+    """
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
+                return None
+            cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+        return user if self.user_can_authenticate(user) else None
+
+
+def invalidate_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
@@ -0,0 +1,67 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..backends import CachedModelBackend, user_cache_key
+
+User = get_user_model()
+
+
+class CachedAuthTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth', password='old')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tables_queried(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return ' '.join(query['sql'] for query in queries.captured_queries)
+
+    def test_authenticated_request_uses_cache(self):
+        """Повторный запрос не читает ни сессию, ни пользователя из БД."""
+        url = reverse('about:author')
+        self.client.get(url)
+        sql = self.tables_queried(url)
+        self.assertNotIn('django_session', sql)
+        self.assertNotIn('auth_user', sql)
+
+    def test_profile_change_invalidates_user(self):
+        """Сохранение пользователя сбрасывает закэшированную копию."""
+        backend = CachedModelBackend()
+        backend.get_user(self.user.pk)
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.pk)))
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Новое имя'
+        user.save()
+        self.assertIsNone(cache.get(user_cache_key(self.user.pk)))
+        self.assertEqual(
+            backend.get_user(self.user.pk).first_name, 'Новое имя'
+        )
+
+    def test_password_change_logs_out_other_sessions(self):
+        """После смены пароля старые сессии больше не авторизованы."""
+        url = reverse('about:author')
+        self.client.get(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('new')
+        user.save()
+        response = self.client.get(url)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_old_sessions_stay_authenticated(self):
+        """Сессии, созданные с ModelBackend, остаются авторизованными."""
+        client = Client()
+        client.force_login(
+            self.user, backend='django.contrib.auth.backends.ModelBackend'
+        )
+        response = client.get(reverse('about:author'))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
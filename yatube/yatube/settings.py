@@ -52,14 +52,28 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
+# Сессии читаются из кэша и пишутся сквозь него в БД, request.user
+# тоже берется из кэша (users.backends). ModelBackend остается в списке
+# для сессий, созданных до включения кэша: иначе их владельцев разлогинит.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = [
+    'users.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+USER_CACHE_TIMEOUT = 60 * 15
+
 MIDDLEWARE = [
+    'core.middleware.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.replicas.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -88,14 +102,126 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# PRAGMA выполняются при каждом подключении (core.db.backends.sqlite3).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'OPTIONS': {
+            'pragmas': SQLITE_PRAGMAS,
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Реплики для чтения (core.db.routers). Локально это копия db.sqlite3,
+# которую обновляет manage.py sync_replicas --interval N.
+DATABASE_REPLICAS = []
+if os.environ.get('YATUBE_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['YATUBE_SQLITE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('replica')
+
+# Шарды постов и комментариев (posts.sharding): пост лежит в шарде
+# своего автора. YATUBE_POST_SHARDS=N добавляет к основной базе N - 1
+# файлов db_posts_<n>.sqlite3 (manage.py migrate --database=posts_<n>);
+# после смены числа шардов строки переносит manage.py rebalance_shards.
+POST_SHARDS = ['default'] + [
+    f'posts_{num}'
+    for num in range(1, int(os.environ.get('YATUBE_POST_SHARDS', 1)))
+]
+for alias in POST_SHARDS[1:]:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, f'db_{alias}.sqlite3'),
+    }
+# Общая последовательность id постов и комментариев в шардах и сколько
+# id процесс забирает из нее за раз.
+POST_ID_SEQUENCE_PATH = os.path.join(BASE_DIR, 'post_ids.sqlite3')
+POST_ID_BLOCK_SIZE = 100
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.db.routers.ReplicaRouter',
+]
+REPLICA_ROUTED_APPS = ['posts']
+REPLICA_PIN_COOKIE = 'primary_pin'
+REPLICA_PIN_SECONDS = 10
+
+# Повторы записи при "database is locked" (core.db.transaction)
+SQLITE_LOCK_RETRIES = 3
+SQLITE_LOCK_RETRY_DELAY = 0.05
+
+# Ограничение частоты запросов (core.ratelimit): лимиты на пользователя
+# и на IP по имени view, 'N/период', период — s, m, h или d.
+
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_CACHE = 'default'
+RATE_LIMITS = {
+    'post_create': {'user': '10/m', 'ip': '30/m'},
+    'add_comment': {'user': '30/m', 'ip': '60/m'},
+}
+
 POSTS_PER_PAGE = 10
+# Как показывать посты в лентах: 'excerpt' — начало текста и ссылка
+# на пост, 'full' — весь текст.
+POST_LIST_MODE = 'excerpt'
+# Кэш записей постов и списков id страниц лент (posts.post_cache)
+POST_CACHE_TIMEOUT = 60 * 60
+FEED_CACHE_TIMEOUT = 60 * 5
+# Кэш подписок пользователя (posts.follows)
+FOLLOW_CACHE_TIMEOUT = 60 * 60 * 24
+# Кэш комментариев поста на его странице
+COMMENT_CACHE_TIMEOUT = 60 * 5
+# Прием комментариев (posts.comment_queue): 'direct' — сразу в БД,
+# 'queued' — через локальную очередь, которую переносит в БД
+# команда flush_comments.
+COMMENT_INGESTION = 'direct'
+COMMENT_QUEUE_PATH = os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+COMMENT_FLUSH_BATCH_SIZE = 500
+COMMENT_FLUSH_INTERVAL = 1.0
+# Счетчик новых постов (posts.new_posts): предел счетчика, наибольшее
+# ожидание, период опроса кэша и пауза клиента между короткими
+# запросами, секунды. Ожидание держит поток воркера, поэтому по умолчанию
+# запрос отвечает сразу; long-poll (NEW_POSTS_MAX_WAIT > 0) включайте
+# только при запуске с потоками (например, gunicorn --threads 50),
+# где ждущие запросы не занимают все воркеры.
+NEW_POSTS_LIMIT = 100
+NEW_POSTS_MAX_WAIT = 0
+NEW_POSTS_POLL_INTERVAL = 0.5
+NEW_POSTS_RETRY = 30
+# Популярные посты (posts.trending): период полураспада рейтинга
+# в секундах, веса событий и порог, ниже которого compact_trending
+# удаляет рейтинг поста.
+TRENDING_HALF_LIFE = 60 * 60 * 6
+TRENDING_WEIGHTS = {'comment': 1.0}
+TRENDING_MIN_SCORE = 0.05
+# Каталог сообществ (posts.group_stats)
+GROUPS_PER_PAGE = 30
+GROUP_DIRECTORY_CACHE_TIMEOUT = 60 * 5
+# Фоновое удаление (posts.purge): строк в пакете, пауза между пакетами
+# и период проверки новых задач командой purge_deleted --loop, секунды.
+PURGE_BATCH_SIZE = 200
+PURGE_PAUSE = 0.1
+PURGE_INTERVAL = 5
+# Архив старых постов (posts.cold_storage): возраст поста в днях,
+# после которого move_cold_posts переносит его из posts_post, постов
+# в пакете и пауза между пакетами, секунды.
+COLD_POSTS_AFTER_DAYS = 90
+COLD_POSTS_BATCH_SIZE = 200
+COLD_POSTS_PAUSE = 0.1
 
 
 # Password validation
@@ -147,8 +273,79 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Двухуровневый кэш (core.cache): L1 в памяти процесса, L2 — общий
+# для процессов файл SQLite с журналом инвалидаций.
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            'INVALIDATION_INTERVAL': 0.5,
+        },
     }
 }
+# Профилирование отдельных запросов (core.middleware.profiling)
+
+PROFILING_HEADER = 'HTTP_X_PROFILE'
+PROFILING_QUERY_PARAM = '_profile'
+PROFILING_SAMPLE_RATE = 0.0
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_TOP_N = 40
+
+# Журналы
+
+LOGS_DIR = os.path.join(BASE_DIR, 'logs')
+os.makedirs(LOGS_DIR, exist_ok=True)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'core.log_formatters.JsonFormatter',
+        },
+    },
+    'handlers': {
+        'timing': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'timing.log'),
+            'formatter': 'json',
+        },
+        'slow_queries': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(LOGS_DIR, 'slow_queries.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'yatube.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'yatube.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+# Журнал медленных запросов (core.slow_queries)
+
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_EXPLAIN = True
+
+# Метрики Prometheus (core.metrics)
+
+METRICS_ENABLED = True
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+
+THUMBNAIL_BACKEND = 'core.thumbnails.TimedThumbnailBackend'
@@ -0,0 +1,22 @@
+"""Настройки для тестов: manage.py test и pytest."""
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, CACHES, DATABASES
+
+# L2, очередь комментариев и последовательность id переживают
+# перезапуск, поэтому тесты получают собственные пустые файлы.
+TEST_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+CACHES['default']['LOCATION'] = os.path.join(TEST_DIR, 'cache.sqlite3')
+COMMENT_QUEUE_PATH = os.path.join(TEST_DIR, 'comment_queue.sqlite3')
+POST_ID_SEQUENCE_PATH = os.path.join(TEST_DIR, 'post_ids.sqlite3')
+# Картинки тестовых постов не попадают в media/ проекта.
+MEDIA_ROOT = os.path.join(TEST_DIR, 'media')
+
+# Тесты шардов (posts/tests/test_sharding.py) включают второй шард
+# через override_settings(POST_SHARDS=...), поэтому он объявлен всегда.
+DATABASES.setdefault('posts_1', {
+    **DATABASES['default'],
+    'NAME': os.path.join(BASE_DIR, 'db_posts_1.sqlite3'),
+})
@@ -18,11 +18,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 urlpatterns = [
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('', include('posts.urls', namespace='posts')),
 ]
 